@@ -7,6 +7,8 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from pathlib import Path
 
+from services.cpu_executor import run_cpu
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -30,6 +32,16 @@ def verify_password(plain: str, hashed: str) -> bool:
         return False
 
 
+async def hash_password_async(plain: str) -> str:
+    """hash_password — CPU havuzunda (async handler'lar bunu kullanmalı)."""
+    return await run_cpu(hash_password, plain)
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    """verify_password — CPU havuzunda (async handler'lar bunu kullanmalı)."""
+    return await run_cpu(verify_password, plain, hashed)
+
+
 def create_token(user_id: str, username: str, role: str, display_name: str = "") -> str:
     payload = {
         "sub": user_id,
@@ -0,0 +1,151 @@
+"""
+Conditional GET Middleware — okuma ağırlıklı endpoint'ler için güçlü ETag + If-None-Match → 304.
+
+Tabletler ve paneller /machines, /jobs, /shifts/status ... endpoint'lerini mobil hat üzerinden
+sürekli yokluyor; veri değişmese de her seferinde tam (gzip'li) gövde dönüyordu. CONDITIONAL_ROUTES
+içindeki GET'ler için iki mod:
+
+  - Sürüm modu (collections dolu): ETag = hash(path, query, koleksiyon sürümleri)
+    (services/collection_versions.py). Sürümler handler'dan önce tek sorguyla okunur;
+    If-None-Match tutarsa handler çağrılmaz — sorgu, serialize, gzip ve gövde yok.
+    `auth` route'larında 304 sadece geçerli token ile döner; aksi halde istek handler'a
+    gider (401 orada üretilir).
+  - İçerik modu (collections boş): handler çalışır, 200 gövdesinin SHA-256'sı ETag olur.
+    Yazma yolları dağınık / çıktı zamana bağlı endpoint'ler için (jobs, dashboard, menü);
+    serialize yapılır ama sıkıştırma ve aktarım atlanır.
+
+Yanıtlara `Cache-Control: private, no-cache` eklenir: tarayıcı gövdeyi saklar ve her
+yoklamada kendisi If-None-Match gönderir, 304'ü XHR'a 200 olarak verir — istemci kodu değişmez.
+Middleware gzip'in içinde çalışır (server.py'de ondan önce eklenir), 304'ler sıkıştırılmaz.
+"""
+import hashlib
+from typing import Dict, NamedTuple, Tuple
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from auth import decode_token
+from services.collection_versions import get_versions
+
+CACHE_CONTROL = "private, no-cache"
+# İçerik modunda bundan büyük gövdeler tamponlanmadan olduğu gibi geçer
+MAX_HASH_BODY_BYTES = 4 * 1024 * 1024
+
+
+class Conditional(NamedTuple):
+    collections: Tuple[str, ...] = ()  # boş → içerik hash'i
+    auth: bool = True
+
+
+CONDITIONAL_ROUTES: Dict[str, Conditional] = {
+    "/api/machines": Conditional(("machines",)),
+    "/api/paints": Conditional(("paints",)),
+    "/api/bobins": Conditional(("bobins",)),
+    "/api/shifts/status": Conditional(("shifts", "shift_operator_reports")),
+    "/api/jobs": Conditional(),
+    "/api/dashboard/live": Conditional(),
+    "/api/menu/today": Conditional(auth=False),
+}
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _authorized(headers: Headers) -> bool:
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        decode_token(token)
+    except HTTPException:
+        return False
+    return True
+
+
+class ConditionalGetMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        route = CONDITIONAL_ROUTES.get(scope.get("path", "")) if scope["type"] == "http" else None
+        if route is None or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if route.collections:
+            await self._versioned(scope, receive, send, route, headers)
+        else:
+            await self._hashed(scope, receive, send, headers)
+
+    async def _not_modified(self, send: Send, etag: str):
+        await send({"type": "http.response.start", "status": 304, "headers": [
+            (b"etag", etag.encode()), (b"cache-control", CACHE_CONTROL.encode()),
+        ]})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _versioned(self, scope: Scope, receive: Receive, send: Send, route: Conditional, headers: Headers):
+        versions = await get_versions(route.collections)
+        key = f"{scope['path']}?{scope.get('query_string', b'').decode()}|" + ",".join(
+            f"{name}:{versions[name]}" for name in sorted(versions)
+        )
+        etag = f'"v-{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+        if _matches(headers.get("if-none-match", ""), etag) and (not route.auth or _authorized(headers)):
+            await self._not_modified(send, etag)
+            return
+
+        async def send_with_etag(message: Message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                out = MutableHeaders(scope=message)
+                out["ETag"] = etag
+                out["Cache-Control"] = CACHE_CONTROL
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
+
+    async def _hashed(self, scope: Scope, receive: Receive, send: Send, headers: Headers):
+        start: Message = {}
+        chunks = []
+        size = 0
+        passthrough = False
+
+        async def buffer(message: Message):
+            nonlocal start, size, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                if message["status"] != 200:
+                    passthrough = True
+                    await send(message)
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if size > MAX_HASH_BODY_BYTES:
+                passthrough = True
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(chunks),
+                            "more_body": message.get("more_body", False)})
+                return
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            etag = f'"h-{hashlib.sha256(body).hexdigest()[:32]}"'
+            if _matches(headers.get("if-none-match", ""), etag):
+                await self._not_modified(send, etag)
+                return
+            out = MutableHeaders(scope=start)
+            out["ETag"] = etag
+            out["Cache-Control"] = CACHE_CONTROL
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, buffer)
@@ -0,0 +1,31 @@
+"""
+GZip Middleware — Starlette GZipMiddleware, zaten sıkıştırılmış içerik hariç.
+
+Görseller (image/*) gzip ile küçülmez, sadece CPU harcar; 206 Range yanıtları ise
+gzip'lenirse Content-Range / Content-Length anlamını yitirir. Bu yanıtlar olduğu
+gibi geçirilir, geri kalan her şey Starlette'in davranışıyla sıkıştırılır.
+"""
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+_PASSTHROUGH_PREFIXES = ("image/", "video/", "audio/")
+
+
+class _SelectiveGZipResponder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if message.get("status") == 206 or content_type.startswith(_PASSTHROUGH_PREFIXES):
+                # Starlette'in "content-encoding zaten var" yolu: gövdeyi aynen geçir
+                self.content_encoding_set = True
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _SelectiveGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -4,23 +4,34 @@ Idempotency Middleware — POST/PUT/PATCH/DELETE çift-submit koruması.
 Akış:
 1. Frontend axios interceptor her POST/PUT/PATCH/DELETE'e benzersiz `Idempotency-Key`
    header ekler (UUID v4).
-2. Backend bu header varsa MongoDB cache'inde arar:
-   - Tamamlanmış varsa → cached response'u 200/orijinal status ile döndür
-   - "processing" durumunda → 429 (zaten çalışıyor)
-   - Yoksa → execute, response'u cache'le
+2. Backend bu header varsa:
+   - Süreç içi LRU'da tamamlanmış kayıt varsa → MongoDB'ye gitmeden cached response
+   - Yoksa tek bir upsert ile anahtarı "processing" olarak sahiplenir:
+       * Anahtar yeniydi → execute, response'u cache'le
+       * Tamamlanmış kayıt vardı → cached response'u orijinal status ile döndür
+       * "processing" durumunda → 429 (zaten çalışıyor)
 3. Header yoksa normal akış (geriye dönük tam uyumlu).
 
-TTL: 1 saat (idempotency_keys koleksiyonunda `created_at` index'i ile otomatik silinir).
+Saf ASGI middleware'dir: response gövdesi istemciye akarken bir kopyası cache için
+toplanır (tee); BaseHTTPMiddleware gibi tüm gövdeyi bekletmez. Gövde, dıştaki
+sıkıştırmadan sonraki haliyle (content-encoding dahil) saklanır ve aynen tekrar oynatılır.
+
+TTL: 1 saat (idempotency_keys koleksiyonunda `created_at` index'i ile otomatik silinir;
+LRU girişleri de aynı sürede düşer).
 
 Bu mekanizma çift-tıklamayı, ağ retry'larını, browser refresh sırasında
 yapılan kayıt requestlerini güvence altına alır.
 """
 import json
 import logging
+import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
+from typing import Optional
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from database import db
 
@@ -31,111 +42,193 @@ SKIP_PATHS = ("/api/auth/", "/api/management/login", "/api/users/login",
               "/api/dashboard/login", "/api/visitors/log",
               "/api/notifications/register-token", "/api/upload/")
 
-
-class IdempotencyMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
+TTL_SECONDS = 3600
+LRU_SIZE = int(os.environ.get("IDEMPOTENCY_LRU_SIZE", "2048"))
+# Bu boyuttan büyük gövdeler cache'lenmez: kayıt `too_large` işaretlenir, replay 409 döner
+# (anahtarı silmek başarılı mutasyonu yeniden çalıştırırdı; boş 200 ise sahte başarı olurdu)
+MAX_CACHED_BODY = int(os.environ.get("IDEMPOTENCY_MAX_BODY_BYTES", str(2 * 1024 * 1024)))
+# Replay'de korunacak response header'ları
+REPLAY_HEADERS = ("content-type", "content-encoding")
+
+_PROJECTION = {"_id": 1, "status": 1, "body": 1, "status_code": 1, "media_type": 1, "headers": 1, "too_large": 1}
+
+
+class _CompletedCache:
+    """Tamamlanmış anahtarlar için süreç içi LRU (key → kayıt, monotonic son kullanma)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        item = self._items.get(key)
+        if not item:
+            return None
+        expires, record = item
+        if expires < time.monotonic():
+            self._items.pop(key, None)
+            return None
+        self._items.move_to_end(key)
+        return record
+
+    def put(self, key: str, record: dict):
+        self._items[key] = (time.monotonic() + TTL_SECONDS, record)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def discard(self, key: str):
+        self._items.pop(key, None)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for k, v in scope.get("headers", []):
+        if k.lower() == name:
+            return v.decode("latin-1")
+    return None
+
+
+async def _send_json(send, status_code: int, payload: dict, replay: Optional[str] = None):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    if replay:
+        headers.append((b"x-idempotent-replay", replay.encode()))
+    await send({"type": "http.response.start", "status": status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_cached(send, record: dict, replay: str):
+    if record.get("too_large"):
+        return await _send_json(send, 409, {
+            "detail": "İşlem zaten tamamlandı; yanıtı tekrar gönderilemeyecek kadar büyük.",
+            "original_status": int(record.get("status_code", 200)),
+        }, replay)
+    body = record.get("body") or b""
+    if isinstance(body, str):  # eski kayıtlar gövdeyi str olarak saklıyordu
+        body = body.encode("utf-8")
+    headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in (record.get("headers") or {}).items()]
+    if not any(k == b"content-type" for k, _ in headers):
+        headers.append((b"content-type", (record.get("media_type") or "application/json").encode("latin-1")))
+    headers.append((b"content-length", str(len(body)).encode()))
+    headers.append((b"x-idempotent-replay", replay.encode()))
+    await send({"type": "http.response.start", "status": int(record.get("status_code", 200)), "headers": headers})
+    await send({"type": "http.response.body", "body": bytes(body)})
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.completed = _CompletedCache(LRU_SIZE)
+
+    async def __call__(self, scope, receive, send):
         # Sadece mutasyon metodları için
-        if request.method not in PROTECTED_METHODS:
-            return await call_next(request)
+        if scope["type"] != "http" or scope["method"] not in PROTECTED_METHODS:
+            return await self.app(scope, receive, send)
 
-        path = request.url.path
+        path = scope["path"]
         # Auth/login/upload gibi endpoint'leri atla (idempotency anlamlı değil veya bozucu)
         if any(path.startswith(p) for p in SKIP_PATHS):
-            return await call_next(request)
+            return await self.app(scope, receive, send)
 
-        key = request.headers.get("idempotency-key") or request.headers.get("Idempotency-Key")
+        key = _header(scope, b"idempotency-key")
         if not key or len(key) < 8 or len(key) > 128:
-            return await call_next(request)
+            return await self.app(scope, receive, send)
+
+        # Aynı worker'da tamamlanmış tekrar — MongoDB'ye gitme
+        record = self.completed.get(key)
+        if record:
+            return await _send_cached(send, record, "true")
 
+        # Tek round-trip sahiplenme: yoksa "processing" ekle, varsa mevcut kaydı döndür
         try:
-            cached = await db.idempotency_keys.find_one({"_id": key}, {"_id": 1, "status": 1, "body": 1, "status_code": 1, "media_type": 1})
+            existing = await db.idempotency_keys.find_one_and_update(
+                {"_id": key},
+                {"$setOnInsert": {
+                    "status": "processing",
+                    "method": scope["method"],
+                    "path": path,
+                    "created_at": datetime.now(timezone.utc),
+                }},
+                projection=_PROJECTION,
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError:
+            # Race: başka worker aynı anda upsert etti → tekrar oku
+            try:
+                existing = await db.idempotency_keys.find_one({"_id": key}, _PROJECTION)
+            except Exception:
+                existing = None
+            if not existing or existing.get("status") != "completed":
+                return await _send_json(send, 429, {"detail": "İşlem zaten devam ediyor."})
+            return await _send_cached(send, existing, "race")
         except Exception as e:
-            logger.warning(f"Idempotency cache lookup failed: {e}")
-            return await call_next(request)
+            logger.warning(f"Idempotency claim failed: {e}")
+            return await self.app(scope, receive, send)
 
-        if cached:
-            if cached.get("status") == "completed":
+        if existing:
+            if existing.get("status") == "completed":
                 # Tekrar geldi — cached response'u döndür
-                body = (cached.get("body") or "").encode("utf-8")
-                return Response(
-                    content=body,
-                    status_code=int(cached.get("status_code", 200)),
-                    media_type=cached.get("media_type") or "application/json",
-                    headers={"X-Idempotent-Replay": "true"},
-                )
+                self.completed.put(key, existing)
+                return await _send_cached(send, existing, "true")
             # processing — paralel istek
-            return Response(
-                content=json.dumps({"detail": "İşlem zaten devam ediyor, lütfen bekleyin."}, ensure_ascii=False).encode("utf-8"),
-                status_code=429,
-                media_type="application/json",
-                headers={"X-Idempotent-Replay": "processing"},
-            )
+            return await _send_json(send, 429, {"detail": "İşlem zaten devam ediyor, lütfen bekleyin."}, "processing")
+
+        await self._execute(key, scope, receive, send)
+
+    async def _execute(self, key: str, scope, receive, send):
+        state = {"status": 500, "headers": {}, "chunks": [], "size": 0, "finished": False}
+
+        async def tee_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["headers"] = {
+                    k.decode("latin-1").lower(): v.decode("latin-1")
+                    for k, v in message.get("headers", [])
+                    if k.decode("latin-1").lower() in REPLAY_HEADERS
+                }
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                if chunk and state["size"] <= MAX_CACHED_BODY:
+                    state["chunks"].append(chunk)
+                    state["size"] += len(chunk)
+                if not message.get("more_body", False):
+                    state["finished"] = True
+                    # Cache son parça istemciye gitmeden yazılır: hemen gelen retry replay alır
+                    await self._store(key, state)
+            await send(message)
 
-        # Yeni anahtar → "processing" kaydı oluştur
         try:
-            await db.idempotency_keys.insert_one({
-                "_id": key,
-                "status": "processing",
-                "method": request.method,
-                "path": path,
-                "created_at": datetime.now(timezone.utc),
-            })
-        except Exception:
-            # Race: başka worker tam anda kaydetmiş olabilir → tekrar oku
-            try:
-                cached = await db.idempotency_keys.find_one({"_id": key}, {"_id": 1, "status": 1, "body": 1, "status_code": 1, "media_type": 1})
-                if cached and cached.get("status") == "completed":
-                    body = (cached.get("body") or "").encode("utf-8")
-                    return Response(
-                        content=body,
-                        status_code=int(cached.get("status_code", 200)),
-                        media_type=cached.get("media_type") or "application/json",
-                        headers={"X-Idempotent-Replay": "race"},
-                    )
-            except Exception:
-                pass
-            return Response(
-                content=json.dumps({"detail": "İşlem zaten devam ediyor."}, ensure_ascii=False).encode("utf-8"),
-                status_code=429,
-                media_type="application/json",
-            )
-
-        # Asıl işlemi çalıştır
-        response = await call_next(request)
-
-        # Response gövdesini topla (streaming response'ları da destekler)
-        body_chunks = []
-        async for chunk in response.body_iterator:
-            body_chunks.append(chunk)
-        body = b"".join(body_chunks)
+            await self.app(scope, receive, tee_send)
+        finally:
+            if not state["finished"]:
+                # Response tamamlanmadı (exception / bağlantı koptu) → retry mümkün olsun
+                try:
+                    await db.idempotency_keys.delete_one({"_id": key, "status": "processing"})
+                except Exception as e:
+                    logger.warning(f"Idempotency cache cleanup failed: {e}")
 
-        # Cache'e yaz (sadece başarılı veya kullanıcı-hatası response'lar; 5xx tekrar denenebilsin)
+    async def _store(self, key: str, state: dict):
         try:
-            if response.status_code < 500:
-                # body decode — bazı durumlarda binary gelebilir
-                try:
-                    body_str = body.decode("utf-8")
-                except UnicodeDecodeError:
-                    body_str = ""
-                await db.idempotency_keys.update_one(
-                    {"_id": key},
-                    {"$set": {
-                        "status": "completed",
-                        "body": body_str,
-                        "status_code": response.status_code,
-                        "media_type": response.media_type or "application/json",
-                        "completed_at": datetime.now(timezone.utc),
-                    }}
-                )
-            else:
-                # 5xx → cache'i sil ki retry mümkün olsun
+            # 5xx → cache'i sil ki retry mümkün olsun
+            if state["status"] >= 500:
                 await db.idempotency_keys.delete_one({"_id": key})
+                return
+            record = {
+                "status": "completed",
+                "status_code": state["status"],
+                "completed_at": datetime.now(timezone.utc),
+            }
+            if state["size"] <= MAX_CACHED_BODY:
+                record.update({
+                    "body": b"".join(state["chunks"]),
+                    "media_type": state["headers"].get("content-type") or "application/json",
+                    "headers": state["headers"],
+                })
+            else:
+                # Gövde ve content-type/encoding saklanmaz — replay boş "başarı" üretmesin
+                record["too_large"] = True
+            self.completed.put(key, record)
+            await db.idempotency_keys.update_one({"_id": key}, {"$set": record})
         except Exception as e:
             logger.warning(f"Idempotency cache write failed: {e}")
-
-        return Response(
-            content=body,
-            status_code=response.status_code,
-            headers=dict(response.headers),
-            media_type=response.media_type,
-        )
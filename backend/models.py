@@ -29,7 +29,9 @@ class Job(BaseModel):
     delivery_address: Optional[str] = None
     delivery_phone: Optional[str] = None
     image_url: Optional[str] = None
-    has_image: Optional[bool] = None  # Liste endpoint'lerinde döner; tam URL /jobs/{id}/image ile
+    has_image: Optional[bool] = None  # image_url ile birlikte yazılır; tam URL /jobs/{id}/image ile
+    image_size: Optional[int] = None
+    image_sha256: Optional[str] = None
     status: str = "pending"
     operator_name: Optional[str] = None
     started_at: Optional[str] = None
@@ -99,6 +101,7 @@ class ShiftEndReport(BaseModel):
     produced_koli: int = 0
     remaining_koli: int = 0
     defect_kg: float = 0.0
+    operator_name: Optional[str] = None  # rapor anındaki job.operator_name (rollup kredisi)
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
 
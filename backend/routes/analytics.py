@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from typing import Optional
 from datetime import datetime, timezone, timedelta
 from io import BytesIO
@@ -7,116 +7,46 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
 
-from database import db
 from auth import get_current_user
+from services.analytics_queries import (
+    fetch_rows, machine_totals, daily_totals, date_range_days, period_activity
+)
+from services.production_rollup import rebuild_production_daily
+from services.cpu_executor import run_cpu
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
 
 
-@router.get("/analytics/weekly")
-async def get_weekly_analytics():
-    week_ago = datetime.now(timezone.utc) - timedelta(days=7)
-    week_ago_str = week_ago.isoformat()
-
-    completed_jobs = await db.jobs.find(
-        {"status": "completed", "completed_at": {"$gte": week_ago_str}}, {"_id": 0, "image_url": 0}
-    ).to_list(1000)
-
-    shift_reports = await db.shift_end_reports.find(
-        {"created_at": {"$gte": week_ago_str}}, {"_id": 0, "image_url": 0}
-    ).to_list(1000)
-
-    machine_stats = {}
-
-    # 1) Completed jobs: credit completed_koli to completion day's machine,
-    #    subtracting earlier shift_end_reports already attributed to same job to avoid double count.
-    # Here we aggregate weekly (no day split), so we simply sum completed_koli.
-    # To avoid double-count with same-week shift reports, we subtract those reports' produced_koli
-    # that belong to the same completed jobs (those earlier partials are also inside completed_koli).
-    completed_job_ids = {j["id"] for j in completed_jobs}
-    shift_produced_for_completed = {}  # job_id -> sum produced in shift reports within the week
-    for r in shift_reports:
-        jid = r.get("job_id")
-        if jid and jid in completed_job_ids:
-            shift_produced_for_completed[jid] = shift_produced_for_completed.get(jid, 0) + r.get("produced_koli", 0)
+def _require_yonetim(user: dict):
+    roles = user.get("roles") or []
+    role = user.get("role")
+    if role in ("yonetim", "management") or "yonetim" in roles or "management" in roles:
+        return
+    raise HTTPException(status_code=403, detail="Sadece Yönetim erişebilir")
 
-    for job in completed_jobs:
-        machine = job["machine_name"]
-        koli = job.get("completed_koli", job.get("koli_count", 0))
-        # subtract overlap already captured via shift reports (will be added back via reports below)
-        overlap = shift_produced_for_completed.get(job["id"], 0)
-        credit = max(0, koli - overlap)
-        machine_stats[machine] = machine_stats.get(machine, 0) + credit
-
-    # 2) All shift_end_reports in the week contribute their produced_koli
-    for report in shift_reports:
-        koli = report.get("produced_koli", 0)
-        if koli > 0:
-            machine = report.get("machine_name", "")
-            if machine:
-                machine_stats[machine] = machine_stats.get(machine, 0) + koli
 
-    return {"machine_stats": machine_stats}
+@router.get("/analytics/weekly")
+async def get_weekly_analytics():
+    # production_daily rollup: çifte sayım düzeltmesi yazma anında yapıldı
+    week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).strftime("%Y-%m-%d")
+    rows = await fetch_rows(week_ago)
+    return {"machine_stats": machine_totals(rows)}
 
 
 @router.get("/analytics/daily")
 async def get_daily_analytics():
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = await fetch_rows(date_range_days(7))
+    by_day = daily_totals(rows)
+
     daily_stats = []
     for i in range(7):
-        date = datetime.now(timezone.utc) - timedelta(days=i)
-        start_of_day = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_of_day = start_of_day + timedelta(days=1)
-
-        jobs = await db.jobs.find(
-            {"status": "completed", "completed_at": {"$gte": start_of_day.isoformat(), "$lt": end_of_day.isoformat()}},
-            {"_id": 0, "image_url": 0}
-        ).to_list(1000)
-
-        shift_reports_today = await db.shift_end_reports.find(
-            {"created_at": {"$gte": start_of_day.isoformat(), "$lt": end_of_day.isoformat()}},
-            {"_id": 0, "image_url": 0}
-        ).to_list(1000)
-
-        total_koli = 0
-        machine_breakdown = {}
-
-        # 1) Completed jobs: subtract earlier shift_end_reports' produced_koli for the same job
-        #    (those partials are already inside completed_koli and will be added via reports below).
-        # PERFORMANS: N+1 query yerine tek $in batch sorgusu
-        job_ids = [j["id"] for j in jobs]
-        prior_partials_by_job = {}
-        if job_ids:
-            all_priors = await db.shift_end_reports.find(
-                {"job_id": {"$in": job_ids}, "created_at": {"$lt": end_of_day.isoformat()}},
-                {"_id": 0, "job_id": 1, "produced_koli": 1}
-            ).to_list(10000)
-            for r in all_priors:
-                jid = r.get("job_id")
-                if jid:
-                    prior_partials_by_job[jid] = prior_partials_by_job.get(jid, 0) + r.get("produced_koli", 0)
-
-        for job in jobs:
-            machine = job["machine_name"]
-            completed_koli = job.get("completed_koli", job.get("koli_count", 0))
-            prior_partials = prior_partials_by_job.get(job["id"], 0)
-            credit = max(0, completed_koli - prior_partials)
-            if credit > 0:
-                machine_breakdown[machine] = machine_breakdown.get(machine, 0) + credit
-                total_koli += credit
-
-        # 2) All shift_end_reports created today contribute their produced_koli
-        for report in shift_reports_today:
-            koli = report.get("produced_koli", 0)
-            if koli > 0:
-                machine = report.get("machine_name", "")
-                if machine:
-                    machine_breakdown[machine] = machine_breakdown.get(machine, 0) + koli
-                    total_koli += koli
-
+        start_of_day = today - timedelta(days=i)
+        day = by_day.get(start_of_day.strftime("%Y-%m-%d"), {"total_koli": 0, "machines": {}})
         daily_stats.append({
             "date": start_of_day.strftime("%d %b"),
-            "total_koli": total_koli,
-            "machines": machine_breakdown
+            "total_koli": day["total_koli"],
+            "machines": day["machines"]
         })
 
     return {"daily_stats": list(reversed(daily_stats))}
@@ -133,25 +63,11 @@ async def get_daily_detail_analytics(date: str):
     start_of_day = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
     end_of_day = start_of_day + timedelta(days=1)
 
-    completed_jobs = await db.jobs.find(
-        {"status": "completed", "completed_at": {"$gte": start_of_day.isoformat(), "$lt": end_of_day.isoformat()}},
-        {"_id": 0, "image_url": 0}
-    ).to_list(1000)
-
-    started_jobs = await db.jobs.find(
-        {"started_at": {"$gte": start_of_day.isoformat(), "$lt": end_of_day.isoformat()}},
-        {"_id": 0, "image_url": 0}
-    ).to_list(1000)
-
-    shift_reports = await db.shift_end_reports.find(
-        {"created_at": {"$gte": start_of_day.isoformat(), "$lt": end_of_day.isoformat()}},
-        {"_id": 0, "image_url": 0}
-    ).to_list(1000)
-
-    defects = await db.defect_logs.find(
-        {"created_at": {"$gte": start_of_day.isoformat(), "$lt": end_of_day.isoformat()}},
-        {"_id": 0, "image_url": 0}
-    ).to_list(1000)
+    activity = await period_activity(start_of_day.isoformat(), end_of_day.isoformat())
+    completed_jobs = activity["completed_jobs"]
+    started_jobs = activity["started_jobs"]
+    shift_reports = activity["shift_reports"]
+    defects = activity["defects"]
 
     machine_breakdown = {}
     operator_breakdown = {}
@@ -239,65 +155,17 @@ async def get_daily_detail_analytics(date: str):
 @router.get("/analytics/monthly")
 async def get_monthly_analytics(year: Optional[int] = None, month: Optional[int] = None):
     if year and month:
+        start_date = datetime(year, month, 1, tzinfo=timezone.utc)
         if month == 12:
-            start_date = datetime(year, month, 1, tzinfo=timezone.utc)
             end_date = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
         else:
-            start_date = datetime(year, month, 1, tzinfo=timezone.utc)
             end_date = datetime(year, month + 1, 1, tzinfo=timezone.utc)
-        start_date_str = start_date.isoformat()
-        end_date_str = end_date.isoformat()
-
-        jobs = await db.jobs.find(
-            {"status": "completed", "completed_at": {"$gte": start_date_str, "$lt": end_date_str}},
-            {"_id": 0, "image_url": 0}
-        ).to_list(1000)
-
-        shift_reports = await db.shift_end_reports.find(
-            {"created_at": {"$gte": start_date_str, "$lt": end_date_str}},
-            {"_id": 0, "image_url": 0}
-        ).to_list(1000)
+        rows = await fetch_rows(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
     else:
         month_ago = datetime.now(timezone.utc) - timedelta(days=30)
-        month_ago_str = month_ago.isoformat()
-
-        jobs = await db.jobs.find(
-            {"status": "completed", "completed_at": {"$gte": month_ago_str}},
-            {"_id": 0, "image_url": 0}
-        ).to_list(1000)
-
-        shift_reports = await db.shift_end_reports.find(
-            {"created_at": {"$gte": month_ago_str}},
-            {"_id": 0, "image_url": 0}
-        ).to_list(1000)
-
-    machine_stats = {}
-
-    # 1) Completed jobs: subtract prior-period shift_reports (if any) not present in 'shift_reports' list
-    #    to avoid double-counting. Here shift_reports already filter to this period,
-    #    so we subtract overlap for the same job.
-    shift_overlap = {}  # job_id -> sum produced_koli within this period
-    for r in shift_reports:
-        jid = r.get("job_id")
-        if jid:
-            shift_overlap[jid] = shift_overlap.get(jid, 0) + r.get("produced_koli", 0)
-
-    for job in jobs:
-        machine = job["machine_name"]
-        koli = job.get("completed_koli", job.get("koli_count", 0))
-        overlap = shift_overlap.get(job["id"], 0)
-        credit = max(0, koli - overlap)
-        machine_stats[machine] = machine_stats.get(machine, 0) + credit
-
-    # 2) All shift_end_reports in this period contribute produced_koli.
-    for report in shift_reports:
-        koli = report.get("produced_koli", 0)
-        if koli > 0:
-            machine = report.get("machine_name", "")
-            if machine:
-                machine_stats[machine] = machine_stats.get(machine, 0) + koli
+        rows = await fetch_rows(month_ago.strftime("%Y-%m-%d"))
 
-    return {"machine_stats": machine_stats}
+    return {"machine_stats": machine_totals(rows)}
 
 
 @router.get("/analytics/daily-by-week")
@@ -309,71 +177,22 @@ async def get_daily_analytics_by_week(week_offset: int = 0):
     target_monday = this_monday + timedelta(weeks=week_offset)
     target_sunday = target_monday + timedelta(days=6)
 
+    week_start = target_monday.replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = await fetch_rows(week_start.strftime("%Y-%m-%d"), (week_start + timedelta(days=7)).strftime("%Y-%m-%d"))
+    by_day = daily_totals(rows)
+
+    day_names = ["Pzt", "Sal", "Çar", "Per", "Cum", "Cmt", "Paz"]
     daily_stats = []
     for i in range(7):
-        date = target_monday + timedelta(days=i)
-        start_of_day = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_of_day = start_of_day + timedelta(days=1)
-
-        jobs = await db.jobs.find(
-            {"status": "completed", "completed_at": {"$gte": start_of_day.isoformat(), "$lt": end_of_day.isoformat()}},
-            {"_id": 0, "image_url": 0}
-        ).to_list(1000)
-
-        shift_reports_today = await db.shift_end_reports.find(
-            {"created_at": {"$gte": start_of_day.isoformat(), "$lt": end_of_day.isoformat()}},
-            {"_id": 0, "image_url": 0}
-        ).to_list(1000)
-
-        total_koli = 0
-        machine_breakdown = {}
-
-        # 1) Completed jobs: credit only the final delta (completed_koli - prior shift_end_reports' produced_koli).
-        # PERFORMANS: N+1 query yerine tek $in batch sorgusu
-        job_ids = [j["id"] for j in jobs]
-        prior_partials_by_job = {}
-        if job_ids:
-            all_priors = await db.shift_end_reports.find(
-                {"job_id": {"$in": job_ids}, "created_at": {"$lt": start_of_day.isoformat()}},
-                {"_id": 0, "job_id": 1, "produced_koli": 1}
-            ).to_list(10000)
-            for r in all_priors:
-                jid = r.get("job_id")
-                if jid:
-                    prior_partials_by_job[jid] = prior_partials_by_job.get(jid, 0) + r.get("produced_koli", 0)
-
-        for job in jobs:
-            machine = job["machine_name"]
-            completed_koli = job.get("completed_koli", job.get("koli_count", 0))
-            prior_partials = prior_partials_by_job.get(job["id"], 0)
-            credit = max(0, completed_koli - prior_partials)
-            if credit > 0:
-                machine_breakdown[machine] = machine_breakdown.get(machine, 0) + credit
-                total_koli += credit
-
-        # 2) All shift_end_reports created TODAY contribute produced_koli.
-        #    Skip those that belong to a job completed today (already counted in step 1).
-        completed_today_ids = {j["id"] for j in jobs}
-        for report in shift_reports_today:
-            produced = report.get("produced_koli", 0)
-            if produced <= 0:
-                continue
-            job_id = report.get("job_id")
-            # If the job was completed today, completed_koli already includes this partial -> skip.
-            if job_id and job_id in completed_today_ids:
-                continue
-            machine = report.get("machine_name", "")
-            if machine:
-                machine_breakdown[machine] = machine_breakdown.get(machine, 0) + produced
-                total_koli += produced
-
-        day_names = ["Pzt", "Sal", "Çar", "Per", "Cum", "Cmt", "Paz"]
+        start_of_day = week_start + timedelta(days=i)
+        full_date = start_of_day.strftime("%Y-%m-%d")
+        day = by_day.get(full_date, {"total_koli": 0, "machines": {}})
         daily_stats.append({
             "date": start_of_day.strftime("%d %b"),
             "day_name": day_names[i],
-            "full_date": start_of_day.strftime("%Y-%m-%d"),
-            "total_koli": total_koli,
-            "machines": machine_breakdown
+            "full_date": full_date,
+            "total_koli": day["total_koli"],
+            "machines": day["machines"]
         })
 
     return {
@@ -384,6 +203,24 @@ async def get_daily_analytics_by_week(week_offset: int = 0):
     }
 
 
+@router.post("/admin/analytics/rebuild-rollup")
+async def rebuild_production_rollup(start: Optional[str] = None, end: Optional[str] = None,
+                                    current_user: dict = Depends(get_current_user)):
+    """production_daily rollup'ını ham jobs/shift_end_reports verisinden yeniden oluştur.
+
+    start/end: YYYY-MM-DD (start dahil, end hariç). İkisi de boşsa tüm geçmiş.
+    """
+    _require_yonetim(current_user)
+    for value in (start, end):
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Geçersiz tarih formatı. YYYY-MM-DD kullanın.")
+    result = await rebuild_production_daily(start, end)
+    return {"success": True, **result}
+
+
 @router.get("/analytics/export")
 async def export_analytics(period: str = "weekly", week_offset: int = 0):
     if period == "weekly":
@@ -404,18 +241,10 @@ async def export_analytics(period: str = "weekly", week_offset: int = 0):
     start_str = start_date.isoformat()
     end_str = end_date.isoformat()
 
-    completed_jobs = await db.jobs.find(
-        {"status": "completed", "completed_at": {"$gte": start_str, "$lt": end_str}}, {"_id": 0, "image_url": 0}
-    ).to_list(1000)
-    started_jobs = await db.jobs.find(
-        {"started_at": {"$gte": start_str, "$lt": end_str}}, {"_id": 0, "image_url": 0}
-    ).to_list(1000)
-    shift_reports = await db.shift_end_reports.find(
-        {"created_at": {"$gte": start_str, "$lt": end_str}}, {"_id": 0, "image_url": 0}
-    ).to_list(1000)
-    defects = await db.defect_logs.find(
-        {"created_at": {"$gte": start_str, "$lt": end_str}}, {"_id": 0, "image_url": 0}
-    ).to_list(1000)
+    activity = await period_activity(start_str, end_str)
+    completed_jobs = activity["completed_jobs"]
+    started_jobs = activity["started_jobs"]
+    defects = activity["defects"]
 
     # Stiller
     wb = Workbook()
@@ -619,7 +448,8 @@ async def export_analytics(period: str = "weekly", week_offset: int = 0):
     auto_width(ws4, 5)
 
     output = BytesIO()
-    wb.save(output)
+    # xlsx sıkıştırma CPU-yoğun — event loop'u bloklamasın
+    await run_cpu(wb.save, output)
     output.seek(0)
 
     filename = f"buse_kagit_rapor_{period}_{start_date.strftime('%d%m%Y')}.xlsx"
@@ -1,14 +1,14 @@
 """
 Yedekleme Servisi — Günlük otomatik MongoDB dump.
-- /app/backups/ dizinine `mongodump --gzip --archive` formatında yazıyor.
+- /app/backups/ dizinine `mongodump --gzip --archive` formatında yazıyor
+  (motor: services/backup_engine.py — event loop dışında, akışlı).
 - Son 7 günü saklıyor, eski dosyaları siliyor.
 - (Opsiyonel) Google Drive Service Account ile otomatik off-site upload.
 - Sadece Yönetim rolü endpoint'lere erişebiliyor.
 """
 import os
+import asyncio
 import logging
-import subprocess
-from pathlib import Path
 from datetime import datetime, timezone
 from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends
@@ -17,63 +17,14 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 from auth import get_current_user
-from database import db
-
-# Google Drive (Service Account)
-try:
-    from google.oauth2 import service_account
-    from googleapiclient.discovery import build
-    from googleapiclient.http import MediaFileUpload
-    DRIVE_AVAILABLE = True
-except Exception:
-    DRIVE_AVAILABLE = False
+from services.backup_engine import (
+    BACKUP_DIR, RETENTION_DAYS, _drive_service, upload_to_drive, run_backup, get_progress,
+)
+from services.audit_archive import archive_old_logs
+from services.leader_lock import run_once
 
 logger = logging.getLogger(__name__)
 
-BACKUP_DIR = Path(os.environ.get("BACKUP_DIR", "/app/backups"))
-BACKUP_DIR.mkdir(parents=True, exist_ok=True)
-RETENTION_DAYS = int(os.environ.get("BACKUP_RETENTION_DAYS", "30"))
-
-DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive.file"]
-
-
-def _drive_service():
-    """Google Drive servisi (Service Account ile). None döner eğer config yoksa/hatalıysa."""
-    if not DRIVE_AVAILABLE:
-        return None, None
-    creds_path = os.environ.get("GOOGLE_DRIVE_CREDENTIALS_PATH")
-    folder_id = os.environ.get("GOOGLE_DRIVE_FOLDER_ID")
-    if not creds_path or not folder_id or not os.path.exists(creds_path):
-        return None, None
-    try:
-        creds = service_account.Credentials.from_service_account_file(creds_path, scopes=DRIVE_SCOPES)
-        svc = build("drive", "v3", credentials=creds, cache_discovery=False)
-        return svc, folder_id
-    except Exception as e:
-        logger.error(f"Drive servisi kurulamadı: {e}")
-        return None, None
-
-
-def upload_to_drive(local_path: Path) -> dict:
-    """Bir dosyayı Drive klasörüne yükle. Sonuç: {success, file_id, web_link, error?}"""
-    svc, folder_id = _drive_service()
-    if not svc:
-        return {"success": False, "error": "Drive yapılandırması yok (env veya credentials.json eksik)"}
-    try:
-        media = MediaFileUpload(str(local_path), mimetype="application/gzip", resumable=True)
-        meta = {"name": local_path.name, "parents": [folder_id]}
-        result = svc.files().create(body=meta, media_body=media,
-                                    fields="id, name, webViewLink, size, createdTime").execute()
-        logger.info(f"Drive'a yüklendi: {result.get('name')} ({result.get('id')})")
-        return {
-            "success": True, "file_id": result.get("id"),
-            "name": result.get("name"), "web_link": result.get("webViewLink"),
-            "size": int(result.get("size", 0)),
-        }
-    except Exception as e:
-        logger.exception("Drive upload hatası")
-        return {"success": False, "error": str(e)}
-
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
 _scheduler: Optional[AsyncIOScheduler] = None
@@ -87,111 +38,14 @@ def _require_yonetim(user: dict):
     raise HTTPException(status_code=403, detail="Sadece Yönetim erişebilir")
 
 
-def _mongo_uri() -> str:
-    uri = os.environ.get("MONGO_URL")
-    if not uri:
-        raise RuntimeError("MONGO_URL ayarlı değil")
-    return uri
-
-
-def _db_name() -> str:
-    return os.environ.get("DB_NAME", "")
+async def scheduled_backup():
+    """Gece yedeği — her worker'ın scheduler'ı tetikler, sadece biri çalıştırır."""
+    await run_once("nightly_backup", run_backup, cooldown_seconds=3600)
 
 
-def _python_bson_backup(out_path: Path) -> dict:
-    """
-    mongodump binary'si yoksa Python fallback. Her collection'ı BSON olarak
-    tar.gz içine yazar. Geri yükleme için /admin/backups/restore_python kullanılır
-    veya pymongo ile manual restore yapılır.
-    """
-    import io
-    import gzip
-    import tarfile
-    from pymongo import MongoClient
-    from bson import BSON
-
-    uri = _mongo_uri()
-    dbn = _db_name()
-    client = MongoClient(uri)
-    database = client[dbn] if dbn else client.get_default_database()
-    if database is None:
-        return {"success": False, "error": "Veritabanı adı belirlenemedi"}
-
-    try:
-        with gzip.open(out_path, "wb") as gz, tarfile.open(fileobj=gz, mode="w|") as tar:
-            for coll_name in database.list_collection_names():
-                buf = io.BytesIO()
-                for doc in database[coll_name].find({}):
-                    buf.write(BSON.encode(doc))
-                data = buf.getvalue()
-                info = tarfile.TarInfo(name=f"{coll_name}.bson")
-                info.size = len(data)
-                info.mtime = int(datetime.now(timezone.utc).timestamp())
-                tar.addfile(info, io.BytesIO(data))
-        return {"success": True}
-    except Exception as e:
-        logger.exception("Python backup failed")
-        return {"success": False, "error": str(e)}
-    finally:
-        client.close()
-
-
-def run_backup_sync(upload_drive: bool = True) -> dict:
-    """Senkron yedekleme — mongodump varsa onu, yoksa Python fallback'ı kullanır."""
-    ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-    filename = f"backup_{ts}.archive.gz"
-    out_path = BACKUP_DIR / filename
-    uri = _mongo_uri()
-    dbn = _db_name()
-    cmd = ["mongodump", f"--uri={uri}"]
-    if dbn:
-        cmd.append(f"--db={dbn}")
-    cmd += ["--gzip", f"--archive={out_path}"]
-
-    used_fallback = False
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-        if result.returncode != 0:
-            logger.error(f"mongodump failed: {result.stderr}")
-            return {"success": False, "error": result.stderr[:500]}
-    except FileNotFoundError:
-        # mongodump binary yok — Python fallback
-        logger.warning("mongodump bulunamadı, Python fallback kullanılıyor")
-        used_fallback = True
-        fb = _python_bson_backup(out_path)
-        if not fb["success"]:
-            return fb
-    except subprocess.TimeoutExpired:
-        return {"success": False, "error": "Yedekleme zaman aşımına uğradı (>5dk)"}
-    except Exception as e:
-        logger.exception("Backup failed")
-        return {"success": False, "error": str(e)}
-
-    size_mb = round(out_path.stat().st_size / 1024 / 1024, 2) if out_path.exists() else 0
-    _cleanup_old()
-
-    response = {"success": True, "filename": filename, "size_mb": size_mb,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "method": "python_bson" if used_fallback else "mongodump"}
-
-    if upload_drive:
-        # Sadece Drive yapılandırması varsa upload denenir
-        svc, _ = _drive_service()
-        if svc is not None:
-            drive_res = upload_to_drive(out_path)
-            response["drive"] = drive_res
-
-    return response
-
-
-def _cleanup_old():
-    files = sorted(BACKUP_DIR.glob("backup_*.archive.gz"), key=lambda p: p.stat().st_mtime, reverse=True)
-    for old in files[RETENTION_DAYS:]:
-        try:
-            old.unlink()
-            logger.info(f"Silindi: {old.name}")
-        except Exception as e:
-            logger.warning(f"Silinemedi {old}: {e}")
+async def scheduled_audit_archive():
+    """Eski audit kayıtlarını aylık arşivlere taşı (services/audit_archive.py)."""
+    await run_once("audit_archive", archive_old_logs, cooldown_seconds=3600)
 
 
 def start_scheduler():
@@ -200,14 +54,21 @@ def start_scheduler():
         return
     _scheduler = AsyncIOScheduler(timezone="UTC")
     _scheduler.add_job(
-        run_backup_sync,
+        scheduled_backup,
         CronTrigger(hour=3, minute=0),
         id="nightly_backup",
         replace_existing=True,
         misfire_grace_time=3600,
     )
+    _scheduler.add_job(
+        scheduled_audit_archive,
+        CronTrigger(hour=2, minute=30),
+        id="audit_archive",
+        replace_existing=True,
+        misfire_grace_time=3600,
+    )
     _scheduler.start()
-    logger.info("Backup scheduler başlatıldı (her gün 03:00 UTC)")
+    logger.info("Backup scheduler başlatıldı (her gün 03:00 UTC; audit arşivi 02:30 UTC)")
 
 
 @router.get("/admin/backups")
@@ -228,7 +89,7 @@ async def list_backups(current_user: dict = Depends(get_current_user)):
             next_run = job.next_run_time.isoformat()
 
     # Drive durumu
-    svc, folder_id = _drive_service()
+    svc, folder_id = await asyncio.to_thread(_drive_service)
     drive_status = {
         "enabled": svc is not None,
         "folder_id": folder_id,
@@ -245,6 +106,7 @@ async def list_backups(current_user: dict = Depends(get_current_user)):
 
     return {
         "backups": files,
+        "progress": await get_progress(),
         "retention_days": RETENTION_DAYS,
         "next_run_utc": next_run,
         "backup_dir": str(BACKUP_DIR),
@@ -255,7 +117,9 @@ async def list_backups(current_user: dict = Depends(get_current_user)):
 @router.post("/admin/backups/run")
 async def trigger_backup(current_user: dict = Depends(get_current_user)):
     _require_yonetim(current_user)
-    result = run_backup_sync(upload_drive=True)
+    result = await run_backup(upload_drive=True)
+    if result.get("busy"):
+        raise HTTPException(status_code=409, detail=result["error"])
     if not result["success"]:
         raise HTTPException(status_code=500, detail=result.get("error", "Yedekleme başarısız"))
     return result
@@ -295,7 +159,7 @@ async def manual_drive_upload(filename: str, current_user: dict = Depends(get_cu
     path = BACKUP_DIR / filename
     if not path.exists():
         raise HTTPException(status_code=404, detail="Lokal yedek bulunamadı")
-    result = upload_to_drive(path)
+    result = await asyncio.to_thread(upload_to_drive, path)
     if not result.get("success"):
         raise HTTPException(status_code=500, detail=result.get("error", "Drive yükleme başarısız"))
     return result
@@ -305,15 +169,15 @@ async def manual_drive_upload(filename: str, current_user: dict = Depends(get_cu
 async def list_drive_backups(current_user: dict = Depends(get_current_user)):
     """Google Drive klasöründeki tüm yedekleri listele."""
     _require_yonetim(current_user)
-    svc, folder_id = _drive_service()
+    svc, folder_id = await asyncio.to_thread(_drive_service)
     if not svc:
         return {"enabled": False, "files": []}
     try:
         q = f"'{folder_id}' in parents and trashed = false"
-        results = svc.files().list(
+        results = await asyncio.to_thread(svc.files().list(
             q=q, fields="files(id, name, size, createdTime, webViewLink)",
             orderBy="createdTime desc", pageSize=100
-        ).execute()
+        ).execute)
         files = []
         for f in results.get("files", []):
             files.append({
@@ -332,11 +196,11 @@ async def list_drive_backups(current_user: dict = Depends(get_current_user)):
 @router.delete("/admin/backups/drive/{file_id}")
 async def delete_drive_backup(file_id: str, current_user: dict = Depends(get_current_user)):
     _require_yonetim(current_user)
-    svc, _ = _drive_service()
+    svc, _ = await asyncio.to_thread(_drive_service)
     if not svc:
         raise HTTPException(status_code=400, detail="Drive yapılandırması yok")
     try:
-        svc.files().delete(fileId=file_id).execute()
+        await asyncio.to_thread(svc.files().delete(fileId=file_id).execute)
         return {"success": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
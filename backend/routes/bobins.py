@@ -12,6 +12,9 @@ from database import db
 from models import Bobin, BobinMovement
 from auth import get_current_user
 from services.audit import log_audit
+from services.collection_versions import bump_version
+from services.search_index import index_document, remove_document
+from services.cpu_executor import run_cpu
 from pymongo import ReturnDocument
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
@@ -91,6 +94,9 @@ async def create_bobin(data: dict = Body(...)):
         if barcode and not existing.get("barcode"):
             update_data["barcode"] = barcode
         await db.bobins.update_one({"id": existing["id"]}, {"$set": update_data})
+        await bump_version("bobins")
+        if "barcode" in update_data:
+            await index_document("bobins", {**existing, **update_data})
         label = bobin_label(existing)
         movement = BobinMovement(
             bobin_id=existing["id"], bobin_label=label,
@@ -111,7 +117,10 @@ async def create_bobin(data: dict = Body(...)):
             quantity=quantity, total_weight_kg=round(total_weight_kg, 2),
             weight_per_piece_kg=weight_per_piece, supplier=supplier, notes=notes
         )
-        await db.bobins.insert_one(bobin.model_dump())
+        bobin_doc = bobin.model_dump()
+        await db.bobins.insert_one(bobin_doc)
+        await bump_version("bobins")
+        await index_document("bobins", bobin_doc)
         label = bobin_label(bobin.model_dump())
         movement = BobinMovement(
             bobin_id=bobin.id, bobin_label=label,
@@ -166,7 +175,9 @@ async def update_bobin(bobin_id: str, data: dict = Body(...)):
     update_fields["updated_at"] = datetime.now(timezone.utc).isoformat()
 
     await db.bobins.update_one({"id": bobin_id}, {"$set": update_fields})
+    await bump_version("bobins")
     updated = await db.bobins.find_one({"id": bobin_id}, {"_id": 0})
+    await index_document("bobins", updated)
 
     label_old = bobin_label(bobin)
     label_new = bobin_label(updated)
@@ -185,6 +196,8 @@ async def delete_bobin(bobin_id: str, data: dict = Body(None)):
     if (bobin.get("total_weight_kg", 0) or 0) > 0:
         raise HTTPException(status_code=400, detail="Stokta agirlik varken silinemez")
     await db.bobins.delete_one({"id": bobin_id})
+    await bump_version("bobins")
+    await remove_document("bobins", bobin_id)
     user_name = data.get("user_name", "Depo") if data else "Depo"
     await log_audit(user_name, "delete", "bobin", bobin_label(bobin))
     return {"message": "Bobin silindi"}
@@ -220,6 +233,7 @@ async def purchase_bobin(bobin_id: str, data: dict = Body(...)):
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await bump_version("bobins")
 
     label = bobin_label(bobin)
     movement = BobinMovement(
@@ -276,6 +290,7 @@ async def give_bobin_to_machine(bobin_id: str, data: dict = Body(...)):
         projection={"_id": 0},
         return_document=ReturnDocument.AFTER,
     )
+    await bump_version("bobins")
     if not updated:
         # Yarış sonrası stok yetersiz
         fresh = await db.bobins.find_one({"id": bobin_id}, {"_id": 0, "total_weight_kg": 1})
@@ -291,6 +306,7 @@ async def give_bobin_to_machine(bobin_id: str, data: dict = Body(...)):
             {"id": bobin_id},
             {"$set": {"quantity": new_qty, "total_weight_kg": new_weight, "weight_per_piece_kg": new_wpp}},
         )
+        await bump_version("bobins")
 
     movement = BobinMovement(
         bobin_id=bobin_id, bobin_label=label,
@@ -346,6 +362,7 @@ async def sell_bobin(bobin_id: str, data: dict = Body(...)):
         projection={"_id": 0},
         return_document=ReturnDocument.AFTER,
     )
+    await bump_version("bobins")
     if not updated:
         fresh = await db.bobins.find_one({"id": bobin_id}, {"_id": 0, "total_weight_kg": 1})
         cur = (fresh or {}).get("total_weight_kg", 0) or 0
@@ -359,6 +376,7 @@ async def sell_bobin(bobin_id: str, data: dict = Body(...)):
             {"id": bobin_id},
             {"$set": {"quantity": new_qty, "total_weight_kg": new_weight, "weight_per_piece_kg": new_wpp}},
         )
+        await bump_version("bobins")
 
     movement = BobinMovement(
         bobin_id=bobin_id, bobin_label=label,
@@ -454,6 +472,7 @@ async def recalculate_bobin_stock(current_user: dict = Depends(get_current_user)
                     "updated_at": datetime.now(timezone.utc).isoformat(),
                 }},
             )
+            await bump_version("bobins")
             fixed.append({
                 "id": bid,
                 "label": bobin_label(b),
@@ -762,7 +781,8 @@ async def export_bobins(month: Optional[str] = None, data: dict = Depends(get_cu
     auto_width(ws4, [28, 22, 16, 22])
 
     output = BytesIO()
-    wb.save(output)
+    # xlsx sıkıştırma CPU-yoğun — event loop'u bloklamasın
+    await run_cpu(wb.save, output)
     output.seek(0)
 
     if is_archive:
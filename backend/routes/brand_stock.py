@@ -15,6 +15,8 @@ from database import db
 from models import BrandStock, BrandStockMovement
 from auth import get_current_user
 from services.audit import log_audit
+from services.search_index import index_document, remove_document
+from services.cpu_executor import run_cpu
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
 logger = logging.getLogger(__name__)
@@ -116,6 +118,7 @@ async def add_brand_stock(data: dict = Body(...)):
         )
         stock_doc = stock.model_dump()
         await db.brand_stock.insert_one(stock_doc)
+        await index_document("brand_stock", stock_doc)
         stock_id = stock.id
         stock_doc.pop("_id", None)
 
@@ -222,6 +225,7 @@ async def edit_brand_stock(stock_id: str, data: dict = Body(...)):
     )
 
     new_stock = await db.brand_stock.find_one({"id": stock_id}, {"_id": 0})
+    await index_document("brand_stock", new_stock)
     return {"success": True, "stock": new_stock}
 
 
@@ -234,6 +238,7 @@ async def delete_brand_stock(stock_id: str, data: dict = Body(None)):
         raise HTTPException(status_code=404, detail="Stok bulunamadı")
 
     await db.brand_stock.delete_one({"id": stock_id})
+    await remove_document("brand_stock", stock_id)
     await log_audit(
         user_name, "delete", "brand_stock", stock_id,
         f"Silindi: {stock_label(stock)} (son adet: {stock.get('quantity', 0)})"
@@ -347,7 +352,8 @@ async def export_brand_stock():
         ws2.column_dimensions[ws2.cell(row=1, column=col_idx).column_letter].width = 16
 
     buf = BytesIO()
-    wb.save(buf)
+    # xlsx sıkıştırma CPU-yoğun — event loop'u bloklamasın
+    await run_cpu(wb.save, buf)
     buf.seek(0)
     filename = f"marka_stok_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
     return StreamingResponse(
@@ -0,0 +1,25 @@
+"""
+Görsel Servisi — içerik adresli blob'ları sunar (services/image_store.py).
+
+URL sha256 içerdiği için içerik asla değişmez: uzun süreli public cache + ETag.
+`?w=320` ile küçültülmüş WebP/JPEG varyantı döner (services/image_variants.py).
+Kimlik doğrulama yok — <img src> header gönderemez; sha tahmin edilemez.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+
+from services.image_store import get_meta
+from services.image_variants import image_response
+
+router = APIRouter()
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+@router.get("/images/{sha}")
+async def get_image(sha: str, request: Request, w: Optional[int] = Query(None, ge=1, le=4096)):
+    meta = await get_meta(sha)
+    if not meta:
+        raise HTTPException(status_code=404, detail="Görsel bulunamadı")
+    return await image_response(request, meta, w, IMMUTABLE_CACHE)
@@ -1,20 +1,28 @@
-from fastapi import APIRouter, HTTPException, Body, UploadFile, File, Depends
+from fastapi import APIRouter, HTTPException, Body, UploadFile, File, Depends, Query, Request, Response
+from fastapi.responses import JSONResponse
 from typing import List, Optional
 from datetime import datetime, timezone
 from pathlib import Path
-import uuid
 import asyncio
 import logging
-import base64
 
 from database import db
 from models import Job
 from services.audit import log_audit
+from services.change_feed import record_change
+from services.production_rollup import record_job_completion, record_job_change
+from services.image_store import (
+    save_stream, ImageTooLarge, sha_from_url, get_meta, image_fields, copy_image_fields, IMAGE_FIELDS,
+)
+from services.image_variants import image_response, bucket_for
+from services.search_index import search_documents, index_document, remove_document
+from services.job_queue import apply_reorder, bump_queue_version, get_queue_version, QueueVersionConflict
+from services.job_state import transition, TransitionError, MachineBusy
 from services.notifications import (
     send_notification_to_operators, send_notification_to_managers,
     send_notification_to_plan_users
 )
-from websocket_manager import ws_manager, ws_manager_mgmt
+from websocket_manager import ws_manager, ws_manager_mgmt, machine_topic
 from auth import get_current_user
 
 router = APIRouter()
@@ -23,7 +31,10 @@ router = APIRouter()
 # Dosya Yükleme Endpoint'i
 @router.post("/upload/image")
 async def upload_image(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
-    """Görsel yükle ve Base64 olarak MongoDB'ye kaydet — tüm yaygın resim formatlarını destekler"""
+    """Görsel yükle — içerik adresli depoya (services/image_store.py) akıtılır, tüm yaygın resim formatları.
+
+    Dönen `url` kısa referanstır (/api/images/<sha256>); aynı içerik tekrar yüklenirse aynı referans döner.
+    """
     try:
         allowed_extensions = [
             ".jpg", ".jpeg", ".jfif", ".pjpeg", ".pjp",
@@ -41,12 +52,6 @@ async def upload_image(file: UploadFile = File(...), current_user: dict = Depend
         if file_ext not in allowed_extensions and not ct.startswith("image/"):
             raise HTTPException(status_code=400, detail="Sadece resim dosyaları yüklenebilir")
 
-        content = await file.read()
-        if len(content) > 10 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="Dosya boyutu 10MB'dan küçük olmalı")
-
-        base64_data = base64.b64encode(content).decode('utf-8')
-
         mime_types = {
             ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".jfif": "image/jpeg",
             ".pjpeg": "image/jpeg", ".pjp": "image/jpeg",
@@ -62,16 +67,16 @@ async def upload_image(file: UploadFile = File(...), current_user: dict = Depend
         }
         # Once uzantidan deneyelim, sonra content-type fallback
         mime_type = mime_types.get(file_ext) or ct or "image/jpeg"
-        data_url = f"data:{mime_type};base64,{base64_data}"
 
-        image_id = str(uuid.uuid4())
-        await db.images.insert_one({
-            "id": image_id, "filename": file.filename,
-            "mime_type": mime_type, "data": data_url,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        })
+        try:
+            stored = await save_stream(file.read, mime_type, file.filename)
+        except ImageTooLarge:
+            raise HTTPException(status_code=400, detail="Dosya boyutu 10MB'dan küçük olmalı")
 
-        return {"success": True, "filename": file.filename, "url": data_url, "image_id": image_id}
+        return {
+            "success": True, "filename": file.filename, "url": stored["url"],
+            "image_id": stored["sha256"], "sha256": stored["sha256"],
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -79,30 +84,84 @@ async def upload_image(file: UploadFile = File(...), current_user: dict = Depend
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Liste sayfalama: sıralama (created_at, id) — {status, created_at, id} index'i ile hizalı
+JOBS_PAGE_MAX = 1000
+_JOB_FIELDS = set(Job.model_fields)
+
+
+def _parse_after(after: str) -> tuple:
+    """'<created_at>,<id>' keyset imlecini ayır."""
+    created_at, sep, job_id = after.rpartition(",")
+    if not sep or not created_at or not job_id:
+        raise HTTPException(status_code=400, detail="Geçersiz 'after' — beklenen: <created_at>,<id>")
+    return created_at, job_id
+
+
+def _parse_fields(fields: str) -> set:
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - _JOB_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Bilinmeyen alan(lar): {', '.join(sorted(unknown))}")
+    # İmleç için id + created_at her zaman döner
+    return requested | {"id", "created_at"}
+
+
 @router.get("/jobs", response_model=List[Job])
-async def get_jobs(status: Optional[str] = None, machine_id: Optional[str] = None, search: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_jobs(
+    response: Response,
+    status: Optional[str] = None,
+    machine_id: Optional[str] = None,
+    search: Optional[str] = None,
+    after: Optional[str] = Query(None, description="Keyset imleci: <created_at>,<id> (önceki sayfanın X-Next-After'ı)"),
+    limit: Optional[int] = Query(None, ge=1, le=JOBS_PAGE_MAX),
+    fields: Optional[str] = Query(None, description="Virgülle ayrılmış alan listesi (ör. id,name,status)"),
+    current_user: dict = Depends(get_current_user),
+):
+    """İş listesi (created_at, id artan).
+
+    `limit` / `after` verilirse keyset sayfalama: sayfa doluysa sonraki imleç
+    `X-Next-After` header'ında döner. `fields` ile sadece istenen kolonlar döner
+    (Job şemasıyla doğrulanmaz). Parametresiz çağrı eskisi gibi ilk 1000 işi döner.
+    `search` verilirse sonuçlar alaka sırasıyla döner (services/search_index.py);
+    bu modda `after` kullanılamaz.
+    """
+    if search and after:
+        raise HTTPException(status_code=400, detail="'search' ile 'after' birlikte kullanılamaz")
     query = {}
     if status:
         query["status"] = status
     if machine_id:
         query["machine_id"] = machine_id
+    if after:
+        created_at, last_id = _parse_after(after)
+        keyset = {"$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "id": {"$gt": last_id}},
+        ]}
+        query = {"$and": [query, keyset]} if query else keyset
+
+    # Liste image_url taşımaz; has_image dokümanda tutulur (image_store.image_fields),
+    # detay için /api/jobs/{id}/image kullan.
+    selected = _parse_fields(fields) if fields else None
+    if selected:
+        projection = {"_id": 0, **{f: 1 for f in selected}}
+    else:
+        projection = {"_id": 0, "image_url": 0}
+    page_size = limit or JOBS_PAGE_MAX
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"colors": {"$regex": search, "$options": "i"}}
-        ]
-    # PERFORMANS: image_url base64 payload'ı şişiriyor (10x). Listede çıkarıp
-    # has_image flag bırak; detay için /api/jobs/{id}/image kullan.
-    projection = {"_id": 0, "image_url": 0}
-    jobs = await db.jobs.find(query, projection).sort("created_at", 1).to_list(1000)
-    # has_image alanını sonradan ekle (Pydantic image_url None döner)
-    img_ids = await db.jobs.find(
-        {"image_url": {"$exists": True, "$nin": [None, ""]}},
-        {"_id": 0, "id": 1},
-    ).to_list(1000)
-    with_img = {x["id"] for x in img_ids}
-    for j in jobs:
-        j["has_image"] = j.get("id") in with_img
+        jobs = await search_documents("jobs", search, filters=query, projection=projection, limit=page_size)
+        return JSONResponse(jobs) if selected else jobs
+    cursor = db.jobs.find(query, projection).sort([("created_at", 1), ("id", 1)]).limit(page_size)
+    jobs = await cursor.to_list(page_size)
+
+    next_after = None
+    if (limit or after) and len(jobs) == page_size:
+        last = jobs[-1]
+        next_after = f"{last.get('created_at', '')},{last['id']}"
+    if selected:
+        return JSONResponse(jobs, headers={"X-Next-After": next_after} if next_after else None)
+    if next_after:
+        response.headers["X-Next-After"] = next_after
     return jobs
 
 
@@ -187,18 +246,52 @@ async def get_expected_koli_summary(
 
 
 @router.get("/jobs/{job_id}/image")
-async def get_job_image(job_id: str, current_user: dict = Depends(get_current_user)):
-    """Yalnızca işin image_url'unu döndürür — liste payload'ını şişirmemek için."""
+async def get_job_image(
+    job_id: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=4096),
+    current_user: dict = Depends(get_current_user),
+):
+    """İşin görseli — liste payload'ını şişirmemek için ayrı endpoint.
+
+    Varsayılan (axios, */*) → {id, image_url} referansı; `w` verilirse referans
+    küçük varyantı gösterir (/api/images/<sha>?w=320), <img> doğrudan kullanabilir.
+    Accept image/* ise (ve application/json değilse) görselin kendisi (w ile varyantı):
+    ETag + If-None-Match → 304, Range → 206.
+    """
     job = await db.jobs.find_one({"id": job_id}, {"_id": 0, "id": 1, "image_url": 1})
     if not job:
         raise HTTPException(status_code=404, detail="İş bulunamadı")
-    return {"id": job.get("id"), "image_url": job.get("image_url") or None}
+    image_url = job.get("image_url") or None
+    if image_url and image_url.startswith("data:"):
+        # Migration'dan kaçmış eski kayıt — ilk erişimde depoya taşı
+        fields = await image_fields(image_url)
+        image_url = fields["image_url"]
+        await db.jobs.update_one({"id": job_id}, {"$set": fields})
+        await record_change("jobs", [job_id])
+
+    accept = request.headers.get("accept", "")
+    if "image/" not in accept or "application/json" in accept:
+        if w and sha_from_url(image_url):
+            image_url = f"{image_url}?w={bucket_for(w)}"
+        return {"id": job.get("id"), "image_url": image_url}
+
+    meta = await get_meta(sha_from_url(image_url))
+    if not meta:
+        raise HTTPException(status_code=404, detail="Görsel bulunamadı")
+    return await image_response(request, meta, w, "private, max-age=0, must-revalidate")
 
 
 @router.post("/jobs", response_model=Job)
 async def create_job(job: Job, created_by: str = None, current_user: dict = Depends(get_current_user)):
+    # Eski istemciler data URL gönderebilir — depoya taşı, işte sadece referans kalsın
+    for key, value in (await image_fields(job.image_url)).items():
+        setattr(job, key, value)
     doc = job.model_dump()
     await db.jobs.insert_one(doc)
+    await record_change("jobs", [job.id])
+    await index_document("jobs", doc)
+    await bump_queue_version(job.machine_id)
 
     await log_audit(created_by or "Plan", "create", "job", job.name, f"Makine: {job.machine_name}, Koli: {job.koli_count}")
 
@@ -207,7 +300,8 @@ async def create_job(job: Job, created_by: str = None, current_user: dict = Depe
             machine_id=job.machine_id,
             title="Yeni Is Atandi",
             body=f"{job.name} - {job.machine_name}\n{job.koli_count} koli",
-            data={"type": "new_job", "job_id": job.id, "machine_id": job.machine_id}
+            data={"type": "new_job", "job_id": job.id, "machine_id": job.machine_id},
+            dedupe_key=f"new_job:{job.id}"
         )
     except Exception as e:
         logging.error(f"FCM notification error for new job: {e}")
@@ -231,9 +325,18 @@ async def clone_job(job_id: str, updates: dict = Body(...), current_user: dict =
         notes=updates.get("notes", original_job.get("notes")),
         delivery_date=updates.get("delivery_date", original_job.get("delivery_date"))
     )
+    if "image_url" in updates:
+        image = await image_fields(updates["image_url"])
+    else:
+        image = copy_image_fields(original_job)
+    for key, value in image.items():
+        setattr(new_job, key, value)
 
     doc = new_job.model_dump()
     await db.jobs.insert_one(doc)
+    await record_change("jobs", [new_job.id])
+    await index_document("jobs", doc)
+    await bump_queue_version(new_job.machine_id)
 
     cloned_by = updates.get("created_by", "Plan")
     await log_audit(cloned_by, "create", "job", new_job.name, f"Kopyalandi - Makine: {new_job.machine_name}")
@@ -244,14 +347,38 @@ async def clone_job(job_id: str, updates: dict = Body(...), current_user: dict =
 # Batch reorder - MUST be before /jobs/{job_id} to avoid wildcard conflict
 @router.put("/jobs/reorder-batch")
 async def reorder_jobs_batch(data: dict = Body(...), current_user: dict = Depends(get_current_user)):
-    """Birden fazla işin sırasını değiştir"""
+    """Birden fazla işin sırasını tek bulk_write ile değiştir (services/job_queue.py).
+
+    Body: {"jobs": [{job_id, order}], "expected_version": int | {machine_id: int}}
+    expected_version verilirse makinenin kuyruk sürümü hâlâ o değilse 409 + güncel sürüm.
+    Yanıt makine başına yeni sürümleri döndürür; tek makinede `version` da gelir.
+    """
     job_orders = data.get("jobs", [])
-    for item in job_orders:
-        await db.jobs.update_one(
-            {"id": item["job_id"]},
-            {"$set": {"order": item["order"]}}
-        )
-    return {"success": True}
+    try:
+        items = [{"job_id": str(item["job_id"]), "order": int(item["order"])} for item in job_orders]
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Her öğe job_id ve sayısal order içermeli")
+    expected = data.get("expected_version")
+    if expected is not None and not isinstance(expected, (int, dict)):
+        raise HTTPException(status_code=400, detail="expected_version sayı veya {machine_id: sayı} olmalı")
+
+    try:
+        versions = await apply_reorder(items, expected)
+    except QueueVersionConflict as e:
+        return JSONResponse(status_code=409, content={
+            "detail": "Sıra başka biri tarafından değiştirildi, liste yenilenmeli",
+            "machine_id": e.machine_id, "current_version": e.current,
+        })
+    result = {"success": True, "versions": versions}
+    if len(versions) == 1:
+        result["version"] = next(iter(versions.values()))
+    return result
+
+
+@router.get("/jobs/queue-version")
+async def get_job_queue_version(machine_id: str, current_user: dict = Depends(get_current_user)):
+    """Makinenin güncel kuyruk sürümü — reorder-batch'e expected_version olarak gönderilir."""
+    return {"machine_id": machine_id, "version": await get_queue_version(machine_id)}
 
 
 # Müşteri Sipariş Takip (güvenli link)
@@ -308,10 +435,8 @@ async def get_operators_list(current_user: dict = Depends(get_current_user)):
 @router.get("/jobs/paused")
 async def get_paused_jobs(current_user: dict = Depends(get_current_user)):
     """Durdurulmuş işleri listele"""
-    paused = await db.jobs.find({"status": "paused"}, {"_id": 0, "image_url": 0}).to_list(100)
-    for j in paused:
-        j["has_image"] = False  # paused listede ihtiyaç yok; lazy load /jobs/{id}/image ile
-    return paused
+    # image_url yerine dokümandaki has_image döner; görsel lazy load /jobs/{id}/image ile
+    return await db.jobs.find({"status": "paused"}, {"_id": 0, "image_url": 0}).to_list(100)
 
 
 @router.put("/jobs/{job_id}", response_model=Job)
@@ -321,11 +446,24 @@ async def update_job(job_id: str, updates: dict = Body(...), current_user: dict
         raise HTTPException(status_code=404, detail="Job not found")
 
     updated_by = updates.pop("updated_by", None) or "Yonetim"
+    # has_image / image_size / image_sha256 sadece image_url'dan türetilir
+    for key in IMAGE_FIELDS[1:]:
+        updates.pop(key, None)
+    if "image_url" in updates:
+        updates.update(await image_fields(updates["image_url"]))
     await db.jobs.update_one({"id": job_id}, {"$set": updates})
+    await record_change("jobs", [job_id])
 
     await log_audit(updated_by, "update", "job", job.get("name", ""), f"Guncellenen: {', '.join(updates.keys())}")
 
     updated_job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
+    await record_job_change(job, updated_job)
+    if {"name", "colors"} & updates.keys():
+        await index_document("jobs", updated_job)
+    if {"machine_id", "order", "status"} & updates.keys():
+        await bump_queue_version(job.get("machine_id"))
+        if updated_job.get("machine_id") != job.get("machine_id"):
+            await bump_queue_version(updated_job.get("machine_id"))
     return Job(**updated_job)
 
 
@@ -335,63 +473,69 @@ async def delete_job(job_id: str, deleted_by: str = None, current_user: dict = D
     result = await db.jobs.delete_one({"id": job_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Job not found")
+    await record_change("jobs", [job_id], deleted=True)
+    await remove_document("jobs", job_id)
+    if job:
+        await bump_queue_version(job.get("machine_id"))
+        await record_job_change(job, None)
     await log_audit(deleted_by or "Yonetim", "delete", "job", job.get("name", "") if job else job_id)
     return {"message": "Job deleted"}
 
 
+# Geçiş ön koşulu tutmazsa dönen hata: (not found detayı, status kodu, detay)
+_TRANSITION_ERRORS = {
+    "start": ("Job not found", 409, "İş başlatılamaz (durum: {status})"),
+    "complete": ("Job not found", 409, "İş zaten tamamlanmış"),
+    "pause": ("İş bulunamadı", 400, "Sadece devam eden işler durdurulabilir"),
+    "resume": ("İş bulunamadı", 400, "Sadece durdurulmuş işlere devam edilebilir"),
+    "transfer": ("İş bulunamadı", 400, "Sadece bekleyen veya durdurulmuş işler aktarılabilir"),
+}
+
+
+async def _transition(job_id: str, action: str, error_key: Optional[str] = None, **kwargs):
+    """services.job_state.transition + HTTP hata eşlemesi."""
+    try:
+        return await transition(job_id, action, **kwargs)
+    except MachineBusy:
+        raise HTTPException(status_code=400, detail="Bu makinede zaten aktif bir iş var")
+    except TransitionError as e:
+        not_found, code, detail = _TRANSITION_ERRORS[error_key or action]
+        if e.status is None:
+            raise HTTPException(status_code=404, detail=not_found)
+        raise HTTPException(status_code=code, detail=detail.format(status=e.status))
+
+
 @router.put("/jobs/{job_id}/start")
 async def start_job(job_id: str, data: dict = Body(...), current_user: dict = Depends(get_current_user)):
     operator_name = data.get("operator_name")
-    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
-
-    await db.jobs.update_one(
-        {"id": job_id},
-        {"$set": {
-            "status": "in_progress",
-            "operator_name": operator_name,
-            "started_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
-
-    await db.machines.update_one(
-        {"id": job["machine_id"]},
-        {"$set": {"status": "working", "current_job_id": job_id}}
-    )
+    _, job = await _transition(job_id, "start", fields={
+        "operator_name": operator_name,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+    })
 
     await log_audit(operator_name or "Operator", "start", "job", job.get("name", ""), f"Makine: {job.get('machine_name', '')}")
 
-    return {"message": "Job started"}
+    return {"message": "Job started", "job": job}
 
 
 @router.put("/jobs/{job_id}/complete")
 async def complete_job(job_id: str, data: dict = Body(None), current_user: dict = Depends(get_current_user)):
-    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
-
-    completed_koli = data.get("completed_koli", job["koli_count"]) if data else job["koli_count"]
-
-    await db.jobs.update_one(
-        {"id": job_id},
-        {"$set": {
-            "status": "completed",
-            "completed_at": datetime.now(timezone.utc).isoformat(),
-            "completed_koli": completed_koli
-        }}
-    )
-
-    await db.machines.update_one(
-        {"id": job["machine_id"]},
-        {"$set": {"status": "idle", "current_job_id": None}}
-    )
+    completed_at = datetime.now(timezone.utc).isoformat()
+    fields = {"completed_at": completed_at}
+    copy_fields = {}
+    if data and data.get("completed_koli") is not None:
+        fields["completed_koli"] = data["completed_koli"]
+    else:
+        copy_fields["completed_koli"] = "koli_count"
+    before, job = await _transition(job_id, "complete", fields=fields, copy_fields=copy_fields)
+    completed_koli = job["completed_koli"]
+    await record_job_completion(before, completed_koli, completed_at)
 
     await log_audit(job.get("operator_name", "Operator"), "complete", "job", job.get("name", ""), f"Koli: {completed_koli}")
 
     asyncio.create_task(_send_completion_notifications(job, job_id, completed_koli))
 
-    return {"success": True, "message": "İş tamamlandı"}
+    return {"success": True, "message": "İş tamamlandı", "job": job}
 
 
 async def _send_completion_notifications(job: dict, job_id: str, completed_koli: int):
@@ -404,11 +548,13 @@ async def _send_completion_notifications(job: dict, job_id: str, completed_koli:
         await asyncio.gather(
             send_notification_to_managers(
                 title=notification_title, body=notification_body,
-                data={"type": "job_completed", "job_id": job_id}
+                data={"type": "job_completed", "job_id": job_id},
+                dedupe_key=f"job_completed:{job_id}:managers"
             ),
             send_notification_to_plan_users(
                 title=notification_title, body=notification_body,
-                data={"type": "job_completed", "job_id": job_id}
+                data={"type": "job_completed", "job_id": job_id},
+                dedupe_key=f"job_completed:{job_id}:plan"
             ),
             return_exceptions=True
         )
@@ -428,27 +574,11 @@ async def pause_job(job_id: str, data: dict = Body(...), current_user: dict = De
     pause_reason = data.get("pause_reason", "")
     produced_koli = data.get("produced_koli", 0)
 
-    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
-    if not job:
-        raise HTTPException(status_code=404, detail="İş bulunamadı")
-
-    if job["status"] != "in_progress":
-        raise HTTPException(status_code=400, detail="Sadece devam eden işler durdurulabilir")
-
-    await db.jobs.update_one(
-        {"id": job_id},
-        {"$set": {
-            "status": "paused",
-            "paused_at": datetime.now(timezone.utc).isoformat(),
-            "pause_reason": pause_reason,
-            "produced_before_pause": produced_koli
-        }}
-    )
-
-    await db.machines.update_one(
-        {"id": job["machine_id"]},
-        {"$set": {"status": "idle", "current_job_id": None}}
-    )
+    _, job = await _transition(job_id, "pause", fields={
+        "paused_at": datetime.now(timezone.utc).isoformat(),
+        "pause_reason": pause_reason,
+        "produced_before_pause": produced_koli
+    })
 
     await ws_manager.broadcast({
         "type": "job_paused",
@@ -456,11 +586,11 @@ async def pause_job(job_id: str, data: dict = Body(...), current_user: dict = De
             "job_id": job_id, "job_name": job["name"],
             "machine_id": job["machine_id"], "pause_reason": pause_reason
         }
-    })
+    }, topics=[machine_topic(job["machine_id"])])
 
     await log_audit(job.get("operator_name", "Operator"), "pause", "job", job.get("name", ""), f"Sebep: {pause_reason}")
 
-    return {"message": "İş durduruldu", "job_id": job_id}
+    return {"message": "İş durduruldu", "job_id": job_id, "job": job}
 
 
 @router.put("/jobs/{job_id}/resume")
@@ -468,44 +598,27 @@ async def resume_job(job_id: str, data: dict = Body(...), current_user: dict = D
     """Durdurulan işe devam et"""
     operator_name = data.get("operator_name", "")
 
-    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
-    if not job:
-        raise HTTPException(status_code=404, detail="İş bulunamadı")
-
-    if job["status"] != "paused":
-        raise HTTPException(status_code=400, detail="Sadece durdurulmuş işlere devam edilebilir")
-
-    active_on_machine = await db.jobs.find_one({
-        "machine_id": job["machine_id"], "status": "in_progress"
-    })
-    if active_on_machine:
-        raise HTTPException(status_code=400, detail="Bu makinede zaten aktif bir iş var")
-
-    await db.jobs.update_one(
-        {"id": job_id},
-        {"$set": {
-            "status": "in_progress",
-            "operator_name": operator_name or job.get("operator_name"),
-            "started_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
-
-    await db.machines.update_one(
-        {"id": job["machine_id"]},
-        {"$set": {"status": "working", "current_job_id": job_id}}
-    )
+    fields = {"started_at": datetime.now(timezone.utc).isoformat()}
+    if operator_name:
+        fields["operator_name"] = operator_name
+    _, job = await _transition(job_id, "resume", fields=fields)
 
     await log_audit(operator_name or "Operator", "resume", "job", job.get("name", ""), f"Makine: {job.get('machine_name', '')}")
 
-    return {"message": "İşe devam edildi", "job_id": job_id}
+    return {"message": "İşe devam edildi", "job_id": job_id, "job": job}
 
 
 @router.put("/jobs/{job_id}/reorder")
 async def reorder_job(job_id: str, data: dict = Body(...), current_user: dict = Depends(get_current_user)):
     """İşin sırasını değiştir"""
     new_order = data.get("order", 0)
-    await db.jobs.update_one({"id": job_id}, {"$set": {"order": new_order}})
-    return {"success": True}
+    job = await db.jobs.find_one_and_update(
+        {"id": job_id}, {"$set": {"order": new_order}}, projection={"_id": 0, "machine_id": 1},
+    )
+    if job:
+        await record_change("jobs", [job_id])
+    version = await bump_queue_version(job.get("machine_id")) if job else None
+    return {"success": True, "version": version}
 
 
 @router.post("/jobs/{job_id}/quick-transfer")
@@ -532,6 +645,8 @@ async def quick_transfer_job(job_id: str, data: dict = Body(...), current_user:
     already_produced = job.get("produced_before_pause", 0)
     total_produced = already_produced + produced_koli
     original_koli = job["koli_count"]
+    # Karar okunan dokümana göre verildi: arada durdur/devam ile değiştiyse geçiş reddedilir
+    expect = {"produced_before_pause": job.get("produced_before_pause"), "koli_count": original_koli}
 
     transfer_entry = {
         "from_machine": job.get("machine_name", ""),
@@ -546,15 +661,7 @@ async def quick_transfer_job(job_id: str, data: dict = Body(...), current_user:
     updated_history = existing_history + [transfer_entry]
 
     if total_produced > 0 and total_produced < original_koli:
-        await db.jobs.update_one(
-            {"id": job_id},
-            {"$set": {
-                "status": "completed",
-                "completed_at": datetime.now(timezone.utc).isoformat(),
-                "completed_koli": total_produced,
-                "transfer_history": updated_history
-            }}
-        )
+        completed_at = datetime.now(timezone.utc).isoformat()
         remaining_koli = original_koli - total_produced
         new_job = Job(
             name=job["name"], koli_count=remaining_koli,
@@ -563,10 +670,20 @@ async def quick_transfer_job(job_id: str, data: dict = Body(...), current_user:
             notes=job.get("notes", ""), delivery_date=job.get("delivery_date"),
             delivery_address=job.get("delivery_address"),
             delivery_phone=job.get("delivery_phone"),
-            image_url=job.get("image_url"), status="pending", order=0,
+            status="pending", order=0,
             transfer_history=updated_history,
+            **copy_image_fields(job),
         )
-        await db.jobs.insert_one(new_job.model_dump())
+        new_doc = new_job.model_dump()
+        # Eski işin tamamlanması ve kalan için yeni iş aynı geçişte yazılır
+        before, _ = await _transition(job_id, "transfer_complete", error_key="transfer", expect=expect, fields={
+            "completed_at": completed_at,
+            "completed_koli": total_produced,
+            "transfer_history": updated_history
+        }, insert=new_doc)
+        await record_job_completion(before, total_produced, completed_at)
+        await index_document("jobs", new_doc)
+        await bump_queue_version(target_machine_id)
 
         await log_audit(
             user_name, "quick_transfer", "job", job.get("name", ""),
@@ -579,31 +696,26 @@ async def quick_transfer_job(job_id: str, data: dict = Body(...), current_user:
         }
     else:
         if total_produced >= original_koli and total_produced > 0:
-            await db.jobs.update_one(
-                {"id": job_id},
-                {"$set": {
-                    "status": "completed",
-                    "completed_at": datetime.now(timezone.utc).isoformat(),
-                    "completed_koli": original_koli
-                }}
-            )
+            completed_at = datetime.now(timezone.utc).isoformat()
+            before, _ = await _transition(job_id, "transfer_complete", error_key="transfer", expect=expect, fields={
+                "completed_at": completed_at,
+                "completed_koli": original_koli
+            })
+            await record_job_completion(before, original_koli, completed_at)
             await log_audit(
                 user_name, "quick_complete", "job", job.get("name", ""),
                 f"Makine: {job.get('machine_name','')}, Koli: {original_koli}"
             )
             return {"success": True, "message": f"İş tamamlandı ({original_koli} koli)", "split": False}
         else:
-            await db.jobs.update_one(
-                {"id": job_id},
-                {"$set": {
-                    "machine_id": target_machine_id,
-                    "machine_name": target_machine["name"],
-                    "status": "pending", "paused_at": None,
-                    "pause_reason": None, "produced_before_pause": 0,
-                    "queued_at": datetime.now(timezone.utc).isoformat(),
-                    "transfer_history": updated_history
-                }}
-            )
+            await _transition(job_id, "transfer", expect=expect, fields={
+                "machine_id": target_machine_id,
+                "machine_name": target_machine["name"],
+                "paused_at": None,
+                "pause_reason": None, "produced_before_pause": 0,
+                "queued_at": datetime.now(timezone.utc).isoformat(),
+                "transfer_history": updated_history
+            })
             await log_audit(
                 user_name, "quick_transfer", "job", job.get("name", ""),
                 f"Eski makine: {job.get('machine_name','')}, Yeni makine: {target_machine['name']}, Koli: {original_koli}"
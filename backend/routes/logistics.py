@@ -7,7 +7,8 @@ from rate_limit_utils import get_real_client_ip
 
 from database import db
 from models import Vehicle, Shipment, Driver
-from auth import get_current_user, hash_password, verify_password, create_token
+from auth import get_current_user, hash_password_async, verify_password_async, create_token
+from services.change_feed import record_change
 
 router = APIRouter()
 limiter = Limiter(key_func=get_real_client_ip)
@@ -47,6 +48,7 @@ async def create_shipment(data: dict = Body(...), current_user: dict = Depends(g
         await db.pallets.update_many(
             {"id": {"$in": pallet_ids}}, {"$set": {"status": "in_shipment"}}
         )
+        await record_change("pallets", pallet_ids)
 
     shipment = Shipment(
         vehicle_id=data.get("vehicle_id"), vehicle_plate=data.get("vehicle_plate"),
@@ -94,6 +96,7 @@ async def update_shipment(shipment_id: str, data: dict = Body(...), current_user
         await db.pallets.update_many(
             {"id": {"$in": data["pallet_ids"]}}, {"$set": {"status": "in_shipment"}}
         )
+        await record_change("pallets", data["pallet_ids"])
 
     await db.shipments.update_one({"id": shipment_id}, {"$set": update_data})
     return {"success": True}
@@ -119,6 +122,7 @@ async def update_shipment_status(shipment_id: str, data: dict = Body(...), curre
                 {"id": {"$in": shipment.get("pallets", [])}},
                 {"$set": {"status": pallet_status}}
             )
+            await record_change("pallets", shipment.get("pallets", []))
 
     await db.shipments.update_one({"id": shipment_id}, {"$set": update_data})
     return {"success": True}
@@ -132,6 +136,7 @@ async def delete_shipment(shipment_id: str, current_user: dict = Depends(get_cur
             {"id": {"$in": shipment.get("pallets", [])}},
             {"$set": {"status": "in_warehouse"}}
         )
+        await record_change("pallets", shipment.get("pallets", []))
     await db.shipments.delete_one({"id": shipment_id})
     return {"success": True}
 
@@ -140,7 +145,7 @@ async def delete_shipment(shipment_id: str, current_user: dict = Depends(get_cur
 
 @router.post("/drivers", response_model=Driver)
 async def create_driver(data: dict = Body(...), current_user: dict = Depends(get_current_user)):
-    driver = Driver(name=data.get("name"), password=hash_password(data.get("password")), phone=data.get("phone"))
+    driver = Driver(name=data.get("name"), password=await hash_password_async(data.get("password")), phone=data.get("phone"))
     doc = driver.model_dump()
     await db.drivers.insert_one(doc)
     doc.pop("password", None)
@@ -161,7 +166,7 @@ async def driver_login(request: Request, data: dict = Body(...)):
     driver = await db.drivers.find_one(
         {"name": name, "is_active": True}, {"_id": 0}
     )
-    if not driver or not verify_password(password, driver.get("password", "")):
+    if not driver or not await verify_password_async(password, driver.get("password", "")):
         raise HTTPException(status_code=401, detail="Geçersiz kullanıcı adı veya şifre")
     token = create_token(driver.get("id", ""), name, "sofor", name)
     driver.pop("password", None)
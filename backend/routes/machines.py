@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Body, Depends
+from fastapi import APIRouter, Body, Depends, Query
 from typing import List
 from datetime import datetime, timezone
 
 from database import db
 from models import Machine, MaintenanceLog
 from auth import get_current_user
+from services.change_feed import record_change
+from services.dashboard_snapshot import mark_dashboard_dirty
+from services.job_queue import machine_queue
 
 router = APIRouter()
 
@@ -16,6 +19,7 @@ async def init_machines(current_user: dict = Depends(get_current_user)):
     if existing == 0:
         machines = [Machine(name=name).model_dump() for name in machine_names]
         await db.machines.insert_many(machines)
+        await record_change("machines", [m["id"] for m in machines])
     return {"message": "Machines initialized"}
 
 
@@ -25,6 +29,19 @@ async def get_machines(current_user: dict = Depends(get_current_user)):
     return machines
 
 
+@router.get("/machines/{machine_id}/queue")
+async def get_machine_queue(
+    machine_id: str,
+    limit: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(get_current_user),
+):
+    """Operatör ekranı kuyruğu: aktif iş, sıradaki iş(ler), duraklatılanlar, kalan koli/ETA.
+
+    `order`, sonra `queued_at` sırasıyla; `version` reorder-batch'e expected_version olarak gönderilir.
+    """
+    return await machine_queue(machine_id, limit)
+
+
 @router.put("/machines/{machine_id}/maintenance")
 async def toggle_maintenance(machine_id: str, data: dict = Body(...), current_user: dict = Depends(get_current_user)):
     maintenance = data.get("maintenance", False)
@@ -51,6 +68,8 @@ async def toggle_maintenance(machine_id: str, data: dict = Body(...), current_us
         )
 
     await db.machines.update_one({"id": machine_id}, {"$set": update_data})
+    await record_change("machines", [machine_id])
+    mark_dashboard_dirty()
     return {"message": "Maintenance status updated"}
 
 
@@ -74,5 +93,6 @@ async def cleanup_duplicate_machines(current_user: dict = Depends(get_current_us
 
     if duplicates_to_delete:
         await db.machines.delete_many({"id": {"$in": duplicates_to_delete}})
+        await record_change("machines", duplicates_to_delete, deleted=True)
 
     return {"message": f"Cleaned up {len(duplicates_to_delete)} duplicate machines"}
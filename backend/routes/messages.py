@@ -4,7 +4,8 @@ import logging
 
 from database import db
 from models import MachineMessage
-from websocket_manager import ws_manager
+from websocket_manager import ws_manager, machine_topic
+from services.change_feed import record_change
 from services.notifications import send_notification_to_operators
 from auth import get_current_user
 
@@ -29,6 +30,7 @@ async def send_message(data: dict = Body(...)):
     )
 
     await db.machine_messages.insert_one(message.model_dump())
+    await record_change("machine_messages", [message.id])
 
     await ws_manager.broadcast({
         "type": "new_message",
@@ -37,14 +39,15 @@ async def send_message(data: dict = Body(...)):
             "sender_role": sender_role, "sender_name": sender_name,
             "message": message_text, "created_at": message.created_at
         }
-    })
+    }, topics=[machine_topic(machine_id)])
 
     try:
         await send_notification_to_operators(
             machine_id=machine_id,
             title=f"Yeni Mesaj - {sender_name}",
             body=message_text[:100],
-            data={"type": "new_message", "machine_id": machine_id}
+            data={"type": "new_message", "machine_id": machine_id},
+            dedupe_key=f"message:{message.id}"
         )
     except Exception as e:
         logging.error(f"FCM notification error for message: {e}")
@@ -70,10 +73,10 @@ async def get_unread_messages(machine_id: str):
 
 @router.put("/messages/{machine_id}/mark-read")
 async def mark_messages_read(machine_id: str):
-    result = await db.machine_messages.update_many(
-        {"machine_id": machine_id, "is_read": False},
-        {"$set": {"is_read": True}}
-    )
+    unread = {"machine_id": machine_id, "is_read": False}
+    ids = await db.machine_messages.distinct("id", unread)
+    result = await db.machine_messages.update_many(unread, {"$set": {"is_read": True}})
+    await record_change("machine_messages", ids)
     return {"marked_read": result.modified_count}
 
 
@@ -98,4 +101,6 @@ async def mark_single_message_read(message_id: str):
     result = await db.machine_messages.update_one(
         {"id": message_id}, {"$set": {"is_read": True}}
     )
+    if result.modified_count:
+        await record_change("machine_messages", [message_id])
     return {"success": result.modified_count > 0}
@@ -1,19 +1,92 @@
-from fastapi import APIRouter, HTTPException, Body, Depends
+from fastapi import APIRouter, HTTPException, Body, Depends, Query, Response
+from typing import Optional
 from datetime import datetime, timezone
 import logging
 
 from database import db
 from auth import get_current_user
+from services.audit import audit_sink
+from services.audit_archive import archive_name, list_archives
+from services.fcm_registry import register_token
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
 
 
+@router.get("/audit-logs/stats")
+async def get_audit_sink_stats():
+    """Audit tamponu metrikleri (bu worker süreci için)"""
+    return audit_sink.stats()
+
+
+@router.get("/audit-logs/archives")
+async def get_audit_archives():
+    """Arşive taşınmış aylar (services/audit_archive.py)"""
+    return {"archives": await list_archives()}
+
+
 @router.get("/audit-logs")
-async def get_audit_logs(limit: int = 100, skip: int = 0):
-    """Kullanici hareket loglarini getir"""
-    logs = await db.audit_logs.find({}, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    total = await db.audit_logs.count_documents({})
-    return {"logs": logs, "total": total}
+async def get_audit_logs(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    skip: int = 0,
+    user: Optional[str] = None,
+    entity_type: Optional[str] = None,
+    action: Optional[str] = None,
+    since: Optional[str] = Query(None, description="created_at >= (ISO)"),
+    until: Optional[str] = Query(None, description="created_at < (ISO)"),
+    after: Optional[str] = Query(None, description="Keyset imleci: <created_at>,<id> (önceki sayfanın next_after'ı)"),
+    archive: Optional[str] = Query(None, description="Arşiv ayı (YYYY-MM); verilmezse son AUDIT_HOT_DAYS gün"),
+):
+    """Kullanici hareket loglarini getir (created_at, id azalan).
+
+    Filtreler (user / entity_type / action + tarih aralığı) compound index'lerle karşılanır.
+    `after` verilirse keyset sayfalama: `total` hesaplanmaz, sayfa doluysa sonraki imleç
+    `next_after` alanında ve `X-Next-After` header'ında döner. `skip` eski istemciler için
+    duruyor.
+    """
+    if after and skip:
+        raise HTTPException(status_code=400, detail="'after' ile 'skip' birlikte kullanılamaz")
+    if archive:
+        name = archive_name(archive)
+        if name is None:
+            raise HTTPException(status_code=400, detail="Geçersiz 'archive' — beklenen: YYYY-MM")
+        collection = db[name]
+    else:
+        collection = db.audit_logs
+        # Bu worker'ın tamponundaki kayıtlar da listede görünsün
+        await audit_sink.flush()
+
+    query = {}
+    for field, value in (("user", user), ("entity_type", entity_type), ("action", action)):
+        if value:
+            query[field] = value
+    if since or until:
+        query["created_at"] = {**({"$gte": since} if since else {}), **({"$lt": until} if until else {})}
+    base = dict(query)
+    if after:
+        created_at, sep, last_id = after.rpartition(",")
+        if not sep or not created_at or not last_id:
+            raise HTTPException(status_code=400, detail="Geçersiz 'after' — beklenen: <created_at>,<id>")
+        keyset = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": last_id}},
+        ]}
+        query = {"$and": [query, keyset]} if query else keyset
+
+    cursor = collection.find(query, {"_id": 0}).sort([("created_at", -1), ("id", -1)])
+    if skip:
+        cursor = cursor.skip(skip)
+    logs = await cursor.limit(limit).to_list(limit)
+
+    result = {"logs": logs}
+    if not after:
+        result["total"] = await collection.count_documents(base)
+    next_after = None
+    if len(logs) == limit:
+        next_after = f"{logs[-1].get('created_at', '')},{logs[-1].get('id', '')}"
+        response.headers["X-Next-After"] = next_after
+    result["next_after"] = next_after
+    return result
 
 
 @router.post("/managers/register")
@@ -42,14 +115,13 @@ async def register_fcm_token(data: dict = Body(...)):
     if not token:
         raise HTTPException(status_code=400, detail="token required")
 
-    await db.fcm_tokens.update_one(
-        {"token": token},
-        {"$set": {
-            "token": token, "user_type": user_type,
-            "user_id": user_id,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }},
-        upsert=True
+    # machine_id / machine_ids: operatör cihazını makineye bağla (yoksa mevcut eşleşme korunur)
+    machine_ids = data.get("machine_ids")
+    if machine_ids is None and "machine_id" in data:
+        machine_ids = [data["machine_id"]] if data["machine_id"] else []
+    await register_token(
+        token, user_type, user_id, device_id=data.get("device_id", ""),
+        platform=data.get("platform", ""), machine_ids=machine_ids,
     )
     logging.info(f"FCM token registered for {user_type}: {token[:20]}...")
     return {"status": "registered"}
@@ -9,6 +9,7 @@ from database import db
 from models import Paint, PaintMovement, ActivePaintToMachine
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 from auth import get_current_user
+from services.collection_versions import bump_version
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
 
@@ -28,6 +29,7 @@ async def init_paints():
     if existing == 0:
         paints = [Paint(name=name).model_dump() for name in INITIAL_PAINTS]
         await db.paints.insert_many(paints)
+        await bump_version("paints")
         return {"message": f"{len(INITIAL_PAINTS)} boya eklendi"}
     return {"message": "Boyalar zaten mevcut"}
 
@@ -42,12 +44,14 @@ async def get_paints():
 async def create_paint(paint: Paint):
     doc = paint.model_dump()
     await db.paints.insert_one(doc)
+    await bump_version("paints")
     return paint
 
 
 @router.delete("/paints/{paint_id}")
 async def delete_paint(paint_id: str):
     result = await db.paints.delete_one({"id": paint_id})
+    await bump_version("paints")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Boya bulunamadı")
     return {"message": "Boya silindi"}
@@ -85,6 +89,7 @@ async def paint_transaction(data: dict = Body(...)):
         raise HTTPException(status_code=400, detail="Geçersiz hareket tipi")
 
     await db.paints.update_one({"id": paint_id}, {"$set": {"stock_kg": new_stock}})
+    await bump_version("paints")
 
     movement = PaintMovement(
         paint_id=paint_id, paint_name=paint["name"],
@@ -133,6 +138,7 @@ async def give_paint_to_machine(data: dict = Body(...)):
 
     new_stock = current_stock - given_amount_kg
     await db.paints.update_one({"id": paint_id}, {"$set": {"stock_kg": new_stock}})
+    await bump_version("paints")
 
     movement = PaintMovement(
         paint_id=paint_id, paint_name=paint["name"],
@@ -190,6 +196,7 @@ async def return_paint_from_machine(data: dict = Body(...)):
     if paint:
         new_stock = paint.get("stock_kg", 0) + returned_amount_kg
         await db.paints.update_one({"id": active_paint["paint_id"]}, {"$set": {"stock_kg": new_stock}})
+        await bump_version("paints")
 
     movement_return = PaintMovement(
         paint_id=active_paint["paint_id"], paint_name=active_paint["paint_name"],
@@ -4,6 +4,8 @@ from typing import Optional
 from database import db
 from models import Pallet, PalletScan
 from services.audit import log_audit
+from services.change_feed import record_change
+from services.search_index import search_documents, index_document
 from auth import get_current_user
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
@@ -26,6 +28,8 @@ async def create_pallet(data: dict = Body(...)):
         )
         doc = pallet.model_dump()
         await db.pallets.insert_one(doc)
+        await record_change("pallets", [doc["id"]])
+        await index_document("pallets", doc)
         await log_audit(data.get("operator_name", "Depo"), "create", "pallet", pallet_code, f"Is: {data.get('job_name', '')}")
         return {k: v for k, v in doc.items() if k != "_id"}
     else:
@@ -37,6 +41,8 @@ async def create_pallet(data: dict = Body(...)):
         )
         doc = scan.model_dump()
         await db.pallets.insert_one(doc)
+        await record_change("pallets", [doc["id"]])
+        await index_document("pallets", doc)
         await log_audit(data.get("operator_name", "Depo"), "create", "pallet", pallet_code, f"Tarama - Is: {data.get('job_name', '')}")
         return {k: v for k, v in doc.items() if k != "_id"}
 
@@ -61,17 +67,13 @@ async def get_pallets_by_job(job_id: str):
 
 @router.get("/pallets/search")
 async def search_pallets(q: str):
-    pallets = await db.pallets.find({
-        "$or": [
-            {"code": {"$regex": q, "$options": "i"}},
-            {"job_name": {"$regex": q, "$options": "i"}}
-        ]
-    }, {"_id": 0}).to_list(50)
-    return pallets
+    """Palet kodu / iş adı araması — Türkçe normalize önek eşleşmesi, alaka sırasıyla (en fazla 50)."""
+    return await search_documents("pallets", q, limit=50)
 
 
 @router.put("/pallets/{pallet_id}/status")
 async def update_pallet_status(pallet_id: str, data: dict = Body(...)):
     status = data.get("status")
     await db.pallets.update_one({"id": pallet_id}, {"$set": {"status": status}})
+    await record_change("pallets", [pallet_id])
     return {"success": True}
@@ -6,11 +6,13 @@ import logging
 from database import db
 from models import Shift, ShiftEndOperatorReport, ShiftEndReport, DefectLog
 from services.audit import log_audit
-from services.notifications import (
-    send_notification_to_operators, send_notification_to_all_workers,
-    send_whatsapp_notification
-)
-from websocket_manager import ws_manager
+from services.change_feed import record_change
+from services.collection_versions import bump_version
+from services.dashboard_snapshot import mark_dashboard_dirty
+from services.production_rollup import record_job_completion, record_shift_report
+from services.shift_approval import approve_reports
+from services.notifications import send_notification_to_operators, send_notification_to_all_workers
+from websocket_manager import ws_manager, ws_manager_mgmt, machine_topic
 from auth import get_current_user
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
@@ -27,6 +29,7 @@ async def request_shift_end():
         {"id": active_shift["id"]},
         {"$set": {"status": "pending_reports", "pending_approval": True}}
     )
+    await bump_version("shifts")
 
     active_jobs = await db.jobs.find({"status": "in_progress"}, {"_id": 0}).to_list(100)
 
@@ -43,7 +46,8 @@ async def request_shift_end():
             "message": "Vardiya bitti! Lütfen işinizi tamamlayın veya üretim bilgilerinizi girin."
         }
         notifications_sent.append(notification)
-        await ws_manager.broadcast({"type": "shift_end_request", "data": notification})
+        await ws_manager.broadcast({"type": "shift_end_request", "data": notification},
+                                   topics=[machine_topic(job["machine_id"])])
 
     return {
         "message": "Vardiya sonu bildirimi gönderildi",
@@ -72,8 +76,10 @@ async def submit_operator_report(data: dict = Body(...)):
     )
 
     await db.shift_operator_reports.insert_one(report.model_dump())
+    await bump_version("shift_operator_reports")
 
-    await ws_manager.broadcast({
+    # Onay yönetimde — operatör/depo tabletlerine değil yöneticilere gider
+    await ws_manager_mgmt.broadcast_to_managers({
         "type": "new_operator_report",
         "data": {
             "report_id": report.id,
@@ -100,89 +106,11 @@ async def approve_operator_report(report_id: str, data: dict = Body(None)):
     """Operatör raporunu onayla"""
     approved_by = data.get("approved_by", "Yönetim") if data else "Yönetim"
 
-    report = await db.shift_operator_reports.find_one({"id": report_id}, {"_id": 0})
-    if not report:
-        raise HTTPException(status_code=404, detail="Rapor bulunamadı")
-
-    await db.shift_operator_reports.update_one(
-        {"id": report_id},
-        {"$set": {
-            "status": "approved",
-            "approved_at": datetime.now(timezone.utc).isoformat(),
-            "approved_by": approved_by
-        }}
-    )
-
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-
-    if report.get("is_completed"):
-        job_id = report.get("job_id")
-        if job_id:
-            job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
-            if job:
-                completed_koli = report.get("target_koli", job.get("koli_count", 0))
-                await db.jobs.update_one(
-                    {"id": job_id},
-                    {"$set": {
-                        "status": "completed",
-                        "completed_at": datetime.now(timezone.utc).isoformat(),
-                        "completed_koli": completed_koli
-                    }}
-                )
-                await db.machines.update_one(
-                    {"id": report["machine_id"]},
-                    {"$set": {"status": "idle", "current_job_id": None}}
-                )
-                try:
-                    message = f"Is Tamamlandi!\n\nIs: {job['name']}\nMakine: {job['machine_name']}\nKoli: {completed_koli}\nOperator: {report.get('operator_name', '-')}"
-                    await send_whatsapp_notification(message)
-                except Exception as e:
-                    logging.error(f"WhatsApp error: {e}")
-    else:
-        shift_report = ShiftEndReport(
-            shift_id=report["shift_id"],
-            machine_id=report["machine_id"],
-            machine_name=report["machine_name"],
-            job_id=report.get("job_id"),
-            job_name=report.get("job_name"),
-            target_koli=report.get("target_koli", 0),
-            produced_koli=report.get("produced_koli", 0),
-            remaining_koli=report.get("target_koli", 0) - report.get("produced_koli", 0),
-            defect_kg=report.get("defect_kg", 0)
-        )
-        await db.shift_end_reports.insert_one(shift_report.model_dump())
-
-        if report.get("job_id"):
-            job = await db.jobs.find_one({"id": report["job_id"]}, {"_id": 0})
-            if job:
-                prev_completed = job.get("completed_koli", 0)
-                new_produced = report.get("produced_koli", 0)
-                total_completed = prev_completed + new_produced
-                original_koli = job.get("koli_count", 0)
-                remaining = original_koli - total_completed
-                await db.jobs.update_one(
-                    {"id": report["job_id"]},
-                    {"$set": {
-                        "remaining_koli": remaining if remaining > 0 else 0,
-                        "completed_koli": total_completed,
-                        "status": "pending"
-                    }}
-                )
-
-        if report.get("defect_kg", 0) > 0:
-            defect_log = DefectLog(
-                machine_id=report["machine_id"],
-                machine_name=report["machine_name"],
-                shift_id=report["shift_id"],
-                defect_kg=report["defect_kg"],
-                date=today
-            )
-            await db.defect_logs.insert_one(defect_log.model_dump())
-
-        await db.machines.update_one(
-            {"id": report["machine_id"]},
-            {"$set": {"status": "idle", "current_job_id": None}}
-        )
+    result = await approve_reports({"id": report_id}, approved_by)
+    if not result["approved"]:
+        if not await db.shift_operator_reports.find_one({"id": report_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Rapor bulunamadı")
+        return {"message": "Rapor zaten onaylanmış", "already_approved": True}
 
     return {"message": "Rapor onaylandı"}
 
@@ -190,12 +118,7 @@ async def approve_operator_report(report_id: str, data: dict = Body(None)):
 @router.post("/shifts/approve-all")
 async def approve_all_reports_and_end_shift():
     """Tüm raporları onayla ve vardiyayı bitir"""
-    pending_reports = await db.shift_operator_reports.find(
-        {"status": "pending"}, {"_id": 0}
-    ).to_list(100)
-
-    for report in pending_reports:
-        await approve_operator_report(report["id"], {"approved_by": "Yönetim (Toplu)"})
+    result = await approve_reports({}, "Yönetim (Toplu)")
 
     active_shift = await db.shifts.find_one({"status": "pending_reports"}, {"_id": 0}, sort=[("started_at", -1)])
     if active_shift:
@@ -207,8 +130,9 @@ async def approve_all_reports_and_end_shift():
                 "pending_approval": False
             }}
         )
+        await bump_version("shifts")
 
-    return {"message": f"{len(pending_reports)} rapor onaylandı ve vardiya bitirildi"}
+    return {"message": f"{result['approved']} rapor onaylandı ve vardiya bitirildi", **result}
 
 
 @router.get("/shifts/status")
@@ -254,17 +178,19 @@ async def end_shift_with_report(data: dict = Body(...)):
         # remaining_koli for THIS shift's report record (display purposes)
         shift_remaining = max(0, target_koli - produced_koli)
 
+        job = await db.jobs.find_one({"id": job_id}, {"_id": 0}) if job_id else None
         shift_report = ShiftEndReport(
             shift_id=shift_id, machine_id=machine_id, machine_name=machine_name,
             job_id=job_id, job_name=job_name, target_koli=target_koli,
             produced_koli=produced_koli,
             remaining_koli=shift_remaining,
-            defect_kg=defect_kg
+            defect_kg=defect_kg,
+            operator_name=(job or {}).get("operator_name", ""),
         )
         await db.shift_end_reports.insert_one(shift_report.model_dump())
+        await record_shift_report(shift_report.model_dump(), shift_report.operator_name)
 
         if job_id:
-            job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
             if job:
                 prev_completed = job.get("completed_koli", 0)
                 total_completed = prev_completed + produced_koli
@@ -273,15 +199,18 @@ async def end_shift_with_report(data: dict = Body(...)):
 
                 if new_remaining <= 0 and original_koli > 0:
                     # Job tamamen bitti — otomatik tamamla
+                    completed_at = datetime.now(timezone.utc).isoformat()
                     await db.jobs.update_one(
                         {"id": job_id},
                         {"$set": {
                             "status": "completed",
-                            "completed_at": datetime.now(timezone.utc).isoformat(),
+                            "completed_at": completed_at,
                             "completed_koli": total_completed,
                             "remaining_koli": 0
                         }}
                     )
+                    await record_change("jobs", [job_id])
+                    await record_job_completion(job, total_completed, completed_at)
                 else:
                     # Yarım kalan iş — yeni vardiyada devam etmesi için "pending"
                     # started_at korunuyor (start_shift bunu kontrol edecek)
@@ -293,6 +222,7 @@ async def end_shift_with_report(data: dict = Body(...)):
                             "status": "pending"
                         }}
                     )
+                    await record_change("jobs", [job_id])
 
         if defect_kg > 0:
             defect_log = DefectLog(
@@ -305,12 +235,15 @@ async def end_shift_with_report(data: dict = Body(...)):
             {"id": machine_id},
             {"$set": {"status": "idle", "current_job_id": None}}
         )
+        await record_change("machines", [machine_id])
 
     await db.shifts.update_one(
         {"id": shift_id},
         {"$set": {"status": "ended", "ended_at": datetime.now(timezone.utc).isoformat()}}
     )
+    await bump_version("shifts")
 
+    mark_dashboard_dirty()
     return {"message": "Vardiya raporu kaydedildi ve vardiya bitirildi"}
 
 
@@ -322,6 +255,7 @@ async def start_shift(started_by: str = None):
 
     shift = Shift()
     await db.shifts.insert_one(shift.model_dump())
+    await bump_version("shifts")
 
     # Onceki vardiyada baslamis ama tamamlanmamis tum isleri devam ettir
     # Kriter: pending durumda + onceden baslamis (started_at var) + henuz tamamlanmamis
@@ -352,7 +286,11 @@ async def start_shift(started_by: str = None):
             {"id": job["machine_id"]},
             {"$set": {"status": "working", "current_job_id": job["id"]}}
         )
+        await record_change("jobs", [job["id"]])
+        await record_change("machines", [job["machine_id"]])
         resumed_count += 1
+    if resumed_count:
+        mark_dashboard_dirty()
 
     try:
         await send_notification_to_all_workers(
@@ -379,6 +317,7 @@ async def end_shift():
         {"id": active_shift["id"]},
         {"$set": {"status": "ended", "ended_at": datetime.now(timezone.utc).isoformat()}}
     )
+    await bump_version("shifts")
     return {"message": "Shift ended"}
 
 
@@ -424,6 +363,7 @@ async def cleanup_stuck_shifts():
         {"status": "pending_reports"},
         {"$set": {"status": "ended", "ended_at": now, "pending_approval": False}}
     )
+    await bump_version("shifts")
     cleaned = result.modified_count
 
     if cleaned > 0:
@@ -431,6 +371,7 @@ async def cleanup_stuck_shifts():
             {"status": "pending"},
             {"$set": {"status": "expired", "approved_at": now, "approved_by": "Sistem (Temizlik)"}}
         )
+        await bump_version("shift_operator_reports")
 
     return {"message": f"{cleaned} takili vardiya temizlendi", "cleaned": cleaned}
 
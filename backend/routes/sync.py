@@ -0,0 +1,32 @@
+"""
+Delta Senkronizasyon — GET /api/sync?since=<seq> (services/change_feed.py).
+
+İstemci akışı:
+  1. İlk açılışta (veya reset: true gelince) since=0 ile seq al, listeleri tam yükle.
+  2. Sonra periyodik olarak since=<son seq> ile sadece değişenleri çek:
+     upserted dokümanları yerel duruma yaz, deleted id'leri sil, seq'i sakla.
+  3. has_more true ise hemen tekrar çağır.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+
+from auth import get_current_user
+from services.change_feed import changes_since, SYNC_COLLECTIONS, SYNC_PAGE_MAX
+
+router = APIRouter(dependencies=[Depends(get_current_user)])
+
+
+@router.get("/sync")
+async def sync_changes(
+    since: int = Query(0, ge=0, description="Önceki yanıtın seq'i; 0 → tam yükleme gerekli (reset)"),
+    collections: Optional[str] = Query(None, description="Virgülle ayrılmış: jobs,machines,machine_messages,pallets"),
+    limit: int = Query(SYNC_PAGE_MAX, ge=1, le=SYNC_PAGE_MAX),
+):
+    """since'ten sonra eklenen/güncellenen/silinen dokümanlar"""
+    names = None
+    if collections:
+        names = [c.strip() for c in collections.split(",") if c.strip()]
+        unknown = set(names) - set(SYNC_COLLECTIONS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Bilinmeyen koleksiyon(lar): {', '.join(sorted(unknown))}")
+    return await changes_since(since, names, limit)
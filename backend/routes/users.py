@@ -7,7 +7,7 @@ from rate_limit_utils import get_real_client_ip
 
 from database import db
 from models import User
-from auth import hash_password, verify_password, create_token, get_current_user, MANAGEMENT_PASSWORD
+from auth import hash_password_async, verify_password_async, create_token, get_current_user, MANAGEMENT_PASSWORD
 from services.audit import log_audit
 
 router = APIRouter()
@@ -51,7 +51,7 @@ async def create_user(data: dict = Body(...), current_user: dict = Depends(get_c
         raise HTTPException(status_code=400, detail="Bu kullanıcı adı zaten kullanılıyor")
 
     user = User(
-        username=username, password=hash_password(password),
+        username=username, password=await hash_password_async(password),
         role=primary_role, roles=roles,
         display_name=display_name, phone=phone
     )
@@ -113,7 +113,7 @@ async def user_login(request: Request, data: dict = Body(...)):
     if not user:
         raise HTTPException(status_code=401, detail="Geçersiz kullanıcı adı veya şifre")
 
-    if not verify_password(password, user.get("password", "")):
+    if not await verify_password_async(password, user.get("password", "")):
         raise HTTPException(status_code=401, detail="Geçersiz kullanıcı adı veya şifre")
 
     # Kullanıcının rolleri (roles varsa onu, yoksa [role])
@@ -4,7 +4,7 @@ from datetime import datetime, timezone
 
 from database import db
 from models import WarehouseRequest, WarehouseShipmentLog
-from websocket_manager import ws_manager
+from websocket_manager import ws_manager, ROLE_WAREHOUSE
 from auth import get_current_user
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
@@ -22,7 +22,7 @@ async def create_warehouse_request(request: WarehouseRequest):
             "machine_name": request.machine_name, "item_type": request.item_type,
             "quantity": request.quantity, "created_at": request.created_at
         }
-    })
+    }, topics=[ROLE_WAREHOUSE])
 
     return request
 
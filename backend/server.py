@@ -1,6 +1,7 @@
-from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, Request
+from fastapi import FastAPI, APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Request
 from starlette.middleware.cors import CORSMiddleware
-from starlette.middleware.gzip import GZipMiddleware
+from middleware.gzip import SelectiveGZipMiddleware
+from middleware.conditional_get import ConditionalGetMiddleware
 from middleware.idempotency import IdempotencyMiddleware
 from fastapi.staticfiles import StaticFiles
 from slowapi import Limiter
@@ -26,8 +27,22 @@ limiter = Limiter(key_func=get_real_client_ip)
 
 # Core modules
 from database import client, db
-from auth import hash_password
-from websocket_manager import ws_manager, ws_manager_mgmt
+from auth import decode_token, hash_password_async
+from services.production_rollup import rebuild_production_daily
+from services.broadcast_bus import get_bus
+from services.cpu_executor import shutdown_executor
+from services.notification_outbox import start_outbox_workers, stop_outbox_workers
+from services.audit import audit_sink
+from services.audit_archive import ensure_audit_indexes
+from services.change_feed import RETENTION_DAYS as CHANGE_LOG_RETENTION_DAYS, record_change
+from services.dashboard_snapshot import dashboard_snapshot
+from services.leader_lock import cluster_once
+from services.image_store import migrate_job_images
+from services.search_index import backfill_search_index
+from websocket_manager import (
+    ws_manager, ws_manager_mgmt, attach_bus, encode_frame, machine_topic,
+    ROLE_DASHBOARD, ROLE_OPERATOR, ROLE_WAREHOUSE,
+)
 
 # Route modules
 from routes.health import router as health_router
@@ -51,6 +66,8 @@ from routes.bobins import router as bobins_router
 from routes.menu import router as menu_router
 from routes.brand_stock import router as brand_stock_router
 from routes.koli_stock import router as koli_stock_router
+from routes.images import router as images_router
+from routes.sync import router as sync_router
 from routes.backups import router as backups_router, start_scheduler as start_backup_scheduler
 
 app = FastAPI()
@@ -103,6 +120,8 @@ api_router.include_router(menu_router)
 api_router.include_router(brand_stock_router)
 api_router.include_router(koli_stock_router)
 api_router.include_router(backups_router)
+api_router.include_router(images_router)
+api_router.include_router(sync_router)
 
 
 @app.on_event("startup")
@@ -112,6 +131,36 @@ async def _on_startup():
     except Exception as e:
         logging.warning(f"Backup scheduler başlatılamadı: {e}")
 
+
+@app.on_event("startup")
+async def start_audit_sink():
+    """log_audit kayıtlarını toplu yazan arka plan task'ı."""
+    audit_sink.start()
+
+
+@app.on_event("startup")
+async def start_notification_outbox():
+    """Bildirim outbox worker'larını başlat (her worker süreci; kayıtlar kira ile sahiplenilir)."""
+    try:
+        start_outbox_workers()
+    except Exception as e:
+        logging.error(f"Notification outbox başlatılamadı: {e}")
+
+
+@app.on_event("startup")
+async def start_broadcast_bus():
+    """WebSocket yayınlarını worker'lar arası dağıtan bus'ı başlat."""
+    try:
+        await attach_bus().start()
+    except Exception as e:
+        logging.error(f"Broadcast bus başlatılamadı: {e}")
+
+
+@app.on_event("startup")
+async def start_dashboard_snapshot():
+    """Canlı pano snapshot'ı: dirty olaylarını dinle, izleyen varsa periyodik yenile."""
+    dashboard_snapshot.start()
+
 app.include_router(api_router)
 
 # ==================== WebSocket Endpoints ====================
@@ -124,7 +173,7 @@ async def manager_websocket(websocket: WebSocket, manager_id: str):
         while True:
             data = await websocket.receive_text()
             if data == "ping":
-                await websocket.send_text("pong")
+                ws_manager_mgmt.send_text(manager_id, "pong")
     except WebSocketDisconnect:
         ws_manager_mgmt.disconnect(manager_id)
         logging.info(f"Manager WebSocket disconnected: {manager_id}")
@@ -135,12 +184,12 @@ async def manager_websocket(websocket: WebSocket, manager_id: str):
 
 @app.websocket("/api/ws/warehouse")
 async def warehouse_websocket(websocket: WebSocket):
-    await ws_manager.connect(websocket)
+    await ws_manager.connect(websocket, topics=[ROLE_WAREHOUSE])
     try:
         while True:
             data = await websocket.receive_text()
             if data == "ping":
-                await websocket.send_text("pong")
+                ws_manager.send_text(websocket, "pong")
     except WebSocketDisconnect:
         ws_manager.disconnect(websocket)
     except Exception as e:
@@ -148,15 +197,39 @@ async def warehouse_websocket(websocket: WebSocket):
         ws_manager.disconnect(websocket)
 
 
+@app.websocket("/api/ws/dashboard")
+async def dashboard_websocket(websocket: WebSocket, token: str = ""):
+    """Canlı pano: bağlanınca tam snapshot, sonra diff'ler (services/dashboard_snapshot.py)."""
+    try:
+        decode_token(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await ws_manager.connect(websocket, topics=[ROLE_DASHBOARD])
+    try:
+        ws_manager.send_text(websocket, encode_frame(await dashboard_snapshot.snapshot_message()))
+        while True:
+            data = await websocket.receive_text()
+            if data == "ping":
+                ws_manager.send_text(websocket, "pong")
+            elif data == "snapshot":
+                ws_manager.send_text(websocket, encode_frame(await dashboard_snapshot.snapshot_message()))
+    except WebSocketDisconnect:
+        ws_manager.disconnect(websocket)
+    except Exception as e:
+        logging.error(f"Dashboard WebSocket error: {e}")
+        ws_manager.disconnect(websocket)
+
+
 @app.websocket("/api/ws/operator/{machine_id}")
 async def operator_websocket(websocket: WebSocket, machine_id: str):
-    await ws_manager.connect(websocket)
+    await ws_manager.connect(websocket, topics=[ROLE_OPERATOR, machine_topic(machine_id)])
     logging.info(f"Operator WebSocket connected for machine: {machine_id}")
     try:
         while True:
             data = await websocket.receive_text()
             if data == "ping":
-                await websocket.send_text("pong")
+                ws_manager.send_text(websocket, "pong")
     except WebSocketDisconnect:
         ws_manager.disconnect(websocket)
         logging.info(f"Operator WebSocket disconnected for machine: {machine_id}")
@@ -165,8 +238,12 @@ async def operator_websocket(websocket: WebSocket, machine_id: str):
         ws_manager.disconnect(websocket)
 
 # ==================== Startup Events ====================
+# Tek seferlik görevler @cluster_once ile her açılışta kümede tek worker'da çalışır
+# (services/leader_lock.py). Hata loglanıp yeniden fırlatılır: kilit cooldown'suz bırakılır,
+# cluster_once hatayı yutar ve startup devam eder.
 
 @app.on_event("startup")
+@cluster_once("startup:backfill_tracking_codes")
 async def backfill_tracking_codes():
     try:
         jobs_to_update = await db.jobs.find(
@@ -178,13 +255,16 @@ async def backfill_tracking_codes():
         for job in jobs_to_update:
             code = str(uuid.uuid4())
             await db.jobs.update_one({"id": job["id"]}, {"$set": {"tracking_code": code}})
+            await record_change("jobs", [job["id"]])
         if jobs_to_update:
             logger.info(f"Backfilled/upgraded tracking codes for {len(jobs_to_update)} jobs")
     except Exception as e:
         logger.error(f"Tracking code backfill error: {e}")
+        raise
 
 
 @app.on_event("startup")
+@cluster_once("startup:migrate_passwords_to_bcrypt")
 async def migrate_passwords_to_bcrypt():
     try:
         # Users tablosu
@@ -195,7 +275,7 @@ async def migrate_passwords_to_bcrypt():
             updates = {}
             pwd = user.get("password", "")
             if pwd and not pwd.startswith("$2b$") and not pwd.startswith("$2a$"):
-                updates["password"] = hash_password(pwd)
+                updates["password"] = await hash_password_async(pwd)
                 migrated += 1
             # roles array yoksa role'den türet
             if not user.get("roles") and user.get("role"):
@@ -214,18 +294,58 @@ async def migrate_passwords_to_bcrypt():
         for driver in drivers:
             pwd = driver.get("password", "")
             if pwd and not pwd.startswith("$2b$") and not pwd.startswith("$2a$"):
-                hashed = hash_password(pwd)
+                hashed = await hash_password_async(pwd)
                 await db.drivers.update_one({"id": driver["id"]}, {"$set": {"password": hashed}})
                 driver_migrated += 1
         if driver_migrated:
             logger.info(f"Migrated {driver_migrated} plain-text driver passwords to bcrypt")
     except Exception as e:
         logger.error(f"Password migration error: {e}")
+        raise
+
+
+@app.on_event("startup")
+@cluster_once("startup:backfill_production_daily")
+async def backfill_production_daily():
+    """production_daily rollup boşsa (ilk kurulum) tüm geçmişten oluştur."""
+    try:
+        if await db.production_daily.estimated_document_count() == 0:
+            result = await rebuild_production_daily()
+            logger.info(f"production_daily backfilled: {result['rows']} rows")
+    except Exception as e:
+        logger.error(f"production_daily backfill error: {e}")
+        raise
+
+
+@app.on_event("startup")
+@cluster_once("startup:migrate_job_images")
+async def migrate_job_images_to_store():
+    """jobs.image_url içindeki base64 data URL'leri depoya taşı, has_image/image_size/image_sha256 backfill."""
+    try:
+        migrated = await migrate_job_images()
+        if migrated:
+            logger.info(f"Job image fields backfilled: {migrated}")
+    except Exception as e:
+        logger.error(f"Job image migration error: {e}")
+        raise
+
+
+@app.on_event("startup")
+@cluster_once("startup:backfill_search_index")
+async def backfill_search():
+    """search_index kaydı eksik koleksiyonları (ilk kurulum / elle eklenen veri) indeksle."""
+    try:
+        await backfill_search_index()
+    except Exception as e:
+        logger.error(f"Search index backfill error: {e}")
+        raise
 
 
 from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
 
 @app.on_event("startup")
+@cluster_once("startup:ensure_indexes")
 async def ensure_indexes():
     """Tum koleksiyonlar icin MongoDB indekslerini olustur (idempotent)"""
     try:
@@ -233,9 +353,17 @@ async def ensure_indexes():
         await db.jobs.create_index("id", unique=True)
         await db.jobs.create_index([("status", ASCENDING), ("machine_id", ASCENDING)])
         await db.jobs.create_index([("status", ASCENDING), ("completed_at", DESCENDING)])
+        await db.jobs.create_index("started_at")  # period_activity: aralıkta başlayan işler
         await db.jobs.create_index("tracking_code", unique=True)
-        await db.jobs.create_index([("machine_id", ASCENDING), ("status", ASCENDING)])
-        await db.jobs.create_index("created_at")
+        # GET /jobs keyset sayfalama: status filtresi + (created_at, id) sıralaması
+        # (created_at, id) tek alanlı created_at index'inin yerini de tutar
+        await db.jobs.create_index([("status", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)])
+        await db.jobs.create_index([("created_at", ASCENDING), ("id", ASCENDING)])
+        # Makine kuyruğu (GET /machines/{id}/queue): makine + durum eşitliği, order/queued_at sıralı
+        # (eski (machine_id, status) index'inin yerini de tutar)
+        await db.jobs.create_index([
+            ("machine_id", ASCENDING), ("status", ASCENDING), ("order", ASCENDING), ("queued_at", ASCENDING),
+        ])
 
         # users
         await db.users.create_index("id", unique=True)
@@ -246,8 +374,13 @@ async def ensure_indexes():
         await db.machines.create_index("id", unique=True)
         await db.machines.create_index("name", unique=True)
 
-        # audit_logs
-        await db.audit_logs.create_index([("created_at", DESCENDING)])
+        # audit_logs — filtre + keyset sıralaması (created_at, id); arşivlerde de aynı index'ler.
+        # (created_at, id) eski tek alanlı created_at index'inin yerini tutar.
+        await ensure_audit_indexes(db.audit_logs)
+        try:
+            await db.audit_logs.drop_index([("created_at", DESCENDING)])
+        except OperationFailure:
+            pass
 
         # shifts
         await db.shifts.create_index("id", unique=True)
@@ -256,6 +389,7 @@ async def ensure_indexes():
         # defect_logs
         await db.defect_logs.create_index("date")
         await db.defect_logs.create_index([("machine_id", ASCENDING), ("created_at", DESCENDING)])
+        await db.defect_logs.create_index([("created_at", DESCENDING)])
 
         # paint_movements
         await db.paint_movements.create_index([("movement_type", ASCENDING), ("created_at", DESCENDING)])
@@ -265,10 +399,13 @@ async def ensure_indexes():
         await db.shift_end_reports.create_index([("created_at", DESCENDING)])
         await db.shift_end_reports.create_index("shift_id")
         await db.shift_end_reports.create_index([("machine_id", ASCENDING), ("created_at", DESCENDING)])
+        # production_rollup: tamamlanan işin önceki kısmi raporları (job_id $in)
+        await db.shift_end_reports.create_index("job_id")
 
         # shift_operator_reports
         await db.shift_operator_reports.create_index("id", unique=True)
         await db.shift_operator_reports.create_index([("status", ASCENDING), ("shift_id", ASCENDING)])
+        await db.shift_operator_reports.create_index("approval_batch", sparse=True)
 
         # machine_messages
         await db.machine_messages.create_index([("machine_id", ASCENDING), ("created_at", DESCENDING)])
@@ -281,6 +418,16 @@ async def ensure_indexes():
         # operator_sessions
         await db.operator_sessions.create_index([("device_id", ASCENDING), ("expires_at", DESCENDING)])
 
+        # search_index (services/search_index.py): koleksiyon + önek, yeni kayıt önce;
+        # _id sayfalama (keyset) eşitlik kırıcısı; eski (collection, prefixes, sort_key) index'i kaldırılır
+        await db.search_index.create_index(
+            [("collection", ASCENDING), ("prefixes", ASCENDING), ("sort_key", DESCENDING), ("_id", DESCENDING)]
+        )
+        try:
+            await db.search_index.drop_index([("collection", ASCENDING), ("prefixes", ASCENDING), ("sort_key", DESCENDING)])
+        except OperationFailure:
+            pass
+
         # pallets
         await db.pallets.create_index("id", unique=True)
         await db.pallets.create_index("job_id")
@@ -298,7 +445,8 @@ async def ensure_indexes():
 
         # fcm_tokens
         await db.fcm_tokens.create_index("token", unique=True)
-        await db.fcm_tokens.create_index("user_type")
+        await db.fcm_tokens.create_index([("user_type", ASCENDING), ("machine_ids", ASCENDING)])
+        await db.fcm_tokens.create_index("user_id")
 
         # shipments
         await db.shipments.create_index("id", unique=True)
@@ -326,18 +474,47 @@ async def ensure_indexes():
         await db.bobin_movements.create_index([("movement_type", ASCENDING), ("created_at", DESCENDING)])
         await db.bobin_movements.create_index([("created_at", DESCENDING)])
 
+        # production_daily — analitik rollup (date, machine_id, operator_name)
+        await db.production_daily.create_index(
+            [("date", ASCENDING), ("machine_id", ASCENDING), ("operator_name", ASCENDING)], unique=True
+        )
+
         # idempotency_keys — TTL index: 1 saat sonra otomatik silinir
         # Bu, ağ retry'ları ve hızlı çift-tıklama için yeterli pencere
         await db.idempotency_keys.create_index("created_at", expireAfterSeconds=3600)
 
+        # notification_outbox — worker sahiplenme sorgusu, dedupe, RETENTION_DAYS sonra TTL
+        await db.notification_outbox.create_index(
+            [("channel", ASCENDING), ("status", ASCENDING), ("next_attempt_at", ASCENDING)]
+        )
+        await db.notification_outbox.create_index([("status", ASCENDING), ("locked_until", ASCENDING)])
+        await db.notification_outbox.create_index(
+            "dedupe_key", unique=True, partialFilterExpression={"dedupe_key": {"$type": "string"}}
+        )
+        await db.notification_outbox.create_index("expires_at", expireAfterSeconds=0)
+
+        # change_log — /sync imleç taraması (seq), RETENTION_DAYS sonra TTL
+        await db.change_log.create_index("seq", unique=True)
+        await db.change_log.create_index("at", expireAfterSeconds=CHANGE_LOG_RETENTION_DAYS * 86400)
+
+        # leases — açılışa özel startup kilitleri (name@BOOT_ID) süresi dolduktan 1 gün sonra silinir
+        await db.leases.create_index("expires_at", expireAfterSeconds=86400)
+
         logger.info("MongoDB indexes ensured for all collections")
     except Exception as e:
         logger.error(f"Index creation error: {e}")
+        raise
+
+# ==================== Conditional GET (ETag / 304) ====================
+# Okuma ağırlıklı listelerde If-None-Match → 304 (middleware/conditional_get.py).
+# gzip'ten önce eklenir: içte çalışır, 304 yanıtları sıkıştırmaya girmez.
+app.add_middleware(ConditionalGetMiddleware)
 
 # ==================== Compression Middleware (Mobil Veri Optimizasyonu) ====================
 # JSON yanıtları gzip ile sıkıştırır (>500B). Mobil bağlantılarda yanıt boyutunu %70-85 düşürür.
 # Bu sadece taşıma katmanını değiştirir — saklanan veride sıfır değişiklik.
-app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=6)
+# Görseller ve Range (206) yanıtları sıkıştırılmadan geçer (middleware/gzip.py).
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=500, compresslevel=6)
 
 # ==================== Idempotency Middleware (Çift-Submit Koruması) ====================
 # POST/PUT/PATCH/DELETE isteklerinde "Idempotency-Key" header varsa, response 1 saat cache'lenir
@@ -353,8 +530,20 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-After", "ETag"],
 )
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    try:
+        await get_bus().stop()
+    except Exception as e:
+        logging.warning(f"Broadcast bus durdurulamadı: {e}")
+    await stop_outbox_workers()
+    await dashboard_snapshot.stop()
+    try:
+        await audit_sink.stop()
+    except Exception as e:
+        logging.warning(f"Audit tamponu boşaltılamadı: {e}")
+    shutdown_executor()
     client.close()
@@ -0,0 +1,191 @@
+"""
+Analitik Sorgu Motoru — analytics/dashboard/export endpoint'lerinin ortak okuma katmanı.
+
+Tarih aralığı ne kadar geniş olursa olsun gün/makine/operatör kırılımı sunucu
+tarafında ($unionWith + $group) hesaplanır. Ham doküman listeleri (period_activity,
+live_sources) tek $facet belgesine toplanmaz — 16MB BSON sınırını aşabilir ve
+$facet sonrası aşamalar index kullanamaz; her liste kendi indexli sorgusuyla,
+asyncio.gather ile paralel okunur. Python tarafında sadece yanıt şekillendirme kalır.
+
+- production_rows   : ham jobs + shift_end_reports'tan çifte sayım düzeltilmiş
+                      (date, machine_id, operator_name) satırları. Önceki kısmi
+                      üretimler $lookup ile sunucu tarafında düşülür.
+- fetch_rows        : production_daily rollup satırları (günlük/haftalık/aylık ekranlar)
+- period_activity   : bir aralıktaki tamamlanan/başlayan işler, vardiya raporları, defolar
+- live_sources      : canlı pano için makineler, aktif kuyruk ve 7 günlük rollup
+"""
+import asyncio
+from datetime import datetime, timezone, timedelta
+from typing import Iterable, Optional
+
+from database import db
+
+
+def _range(start: Optional[str], end: Optional[str]) -> dict:
+    rng = {}
+    if start:
+        rng["$gte"] = start
+    if end:
+        rng["$lt"] = end
+    return rng
+
+
+# ==================== HAM VERİDEN ÜRETİM ====================
+
+async def production_rows(start: Optional[str] = None, end: Optional[str] = None) -> list:
+    """Ham veriden rollup satırları — tek aggregate.
+
+    Tamamlanan iş kredisi: completed_koli - (işin TÜM shift_end_report toplamı).
+    Vardiya raporu kredisi: produced_koli, operatör raporda saklanan job.operator_name
+    (eski raporlarda yoksa job'tan türetilir) — artımlı yollarla aynı kaynak.
+    """
+    rng = _range(start, end)
+    job_match = {"status": "completed"}
+    report_match = {"produced_koli": {"$gt": 0}}
+    if rng:
+        job_match["completed_at"] = rng
+        report_match["created_at"] = rng
+
+    pipeline = [
+        {"$match": job_match},
+        {"$lookup": {
+            "from": "shift_end_reports", "localField": "id", "foreignField": "job_id",
+            "pipeline": [{"$group": {"_id": None, "total": {"$sum": "$produced_koli"}}}],
+            "as": "prior",
+        }},
+        {"$project": {
+            "_id": 0,
+            "date": {"$substrBytes": ["$completed_at", 0, 10]},
+            "machine_id": {"$ifNull": ["$machine_id", ""]},
+            "machine_name": {"$ifNull": ["$machine_name", ""]},
+            "operator_name": {"$ifNull": ["$operator_name", ""]},
+            "koli": {"$max": [0, {"$subtract": [
+                {"$ifNull": ["$completed_koli", {"$ifNull": ["$koli_count", 0]}]},
+                {"$ifNull": [{"$first": "$prior.total"}, 0]},
+            ]}]},
+            "partial_koli": {"$literal": 0},
+            "completed_jobs": {"$literal": 1},
+        }},
+        {"$unionWith": {"coll": "shift_end_reports", "pipeline": [
+            {"$match": report_match},
+            {"$lookup": {
+                "from": "jobs", "localField": "job_id", "foreignField": "id",
+                "pipeline": [{"$project": {"_id": 0, "operator_name": 1}}],
+                "as": "job",
+            }},
+            {"$project": {
+                "_id": 0,
+                "date": {"$substrBytes": ["$created_at", 0, 10]},
+                "machine_id": {"$ifNull": ["$machine_id", ""]},
+                "machine_name": {"$ifNull": ["$machine_name", ""]},
+                "operator_name": {"$ifNull": ["$operator_name", {"$ifNull": [{"$first": "$job.operator_name"}, ""]}]},
+                "koli": "$produced_koli",
+                "partial_koli": "$produced_koli",
+                "completed_jobs": {"$literal": 0},
+            }},
+        ]}},
+        {"$group": {
+            "_id": {"date": "$date", "machine_id": "$machine_id", "operator_name": "$operator_name"},
+            "machine_name": {"$last": "$machine_name"},
+            "koli": {"$sum": "$koli"},
+            "partial_koli": {"$sum": "$partial_koli"},
+            "completed_jobs": {"$sum": "$completed_jobs"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "date": "$_id.date", "machine_id": "$_id.machine_id", "operator_name": "$_id.operator_name",
+            "machine_name": 1, "koli": 1, "partial_koli": 1, "completed_jobs": 1,
+        }},
+    ]
+    return await db.jobs.aggregate(pipeline).to_list(None)
+
+
+async def period_activity(start: str, end: str, limit: int = 1000) -> dict:
+    """[start, end) ISO aralığındaki ham hareketler — dört liste, paralel sorgular.
+
+    Dönen anahtarlar: completed_jobs, started_jobs, shift_reports, defects
+    """
+    rng = _range(start, end)
+    projection = {"_id": 0, "image_url": 0}
+    completed_jobs, started_jobs, shift_reports, defects = await asyncio.gather(
+        db.jobs.find({"status": "completed", "completed_at": rng}, projection).to_list(limit),
+        db.jobs.find({"started_at": rng}, projection).to_list(limit),
+        db.shift_end_reports.find({"created_at": rng}, projection).to_list(limit),
+        db.defect_logs.find({"created_at": rng}, projection).to_list(limit),
+    )
+    return {
+        "completed_jobs": completed_jobs, "started_jobs": started_jobs,
+        "shift_reports": shift_reports, "defects": defects,
+    }
+
+
+async def live_sources(rollup_start: str) -> dict:
+    """Canlı pano kaynakları — paralel sorgular.
+
+    Dönen anahtarlar: machines, active_jobs, pending_jobs, paused_jobs, rollup
+    """
+    # PERF: image_url base64 dashboard'da gerekmiyor — exclude.
+    projection = {"_id": 0, "image_url": 0}
+    machines, active_jobs, pending_jobs, paused_jobs, rollup = await asyncio.gather(
+        db.machines.find({}, {"_id": 0}).to_list(50),
+        db.jobs.find({"status": "in_progress"}, projection).to_list(50),
+        db.jobs.find({"status": "pending"}, projection).to_list(200),
+        db.jobs.find({"status": "paused"}, projection).to_list(100),
+        db.production_daily.find({"date": {"$gte": rollup_start}}, {"_id": 0}).to_list(None),
+    )
+    return {
+        "machines": machines, "active_jobs": active_jobs, "pending_jobs": pending_jobs,
+        "paused_jobs": paused_jobs, "rollup": rollup,
+    }
+
+
+# ==================== ROLLUP OKUMA ====================
+
+def date_range_days(days: int) -> str:
+    """Bugün dahil son `days` günün başlangıç anahtarı."""
+    return (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+
+
+async def fetch_rows(start_date: str, end_date: Optional[str] = None) -> list:
+    """[start_date, end_date) aralığındaki production_daily satırları (YYYY-MM-DD)."""
+    return await db.production_daily.find(
+        {"date": _range(start_date, end_date)}, {"_id": 0}
+    ).to_list(None)
+
+
+def machine_totals(rows: Iterable[dict]) -> dict:
+    """machine_name -> koli (sadece pozitif krediler)."""
+    totals = {}
+    for r in rows:
+        koli = r.get("koli", 0)
+        name = r.get("machine_name", "")
+        if koli > 0 and name:
+            totals[name] = totals.get(name, 0) + koli
+    return totals
+
+
+def daily_totals(rows: Iterable[dict]) -> dict:
+    """date -> {"total_koli", "machines": {machine_name: koli}}"""
+    days = {}
+    for r in rows:
+        koli = r.get("koli", 0)
+        name = r.get("machine_name", "")
+        if koli <= 0 or not name:
+            continue
+        day = days.setdefault(r["date"], {"total_koli": 0, "machines": {}})
+        day["total_koli"] += koli
+        day["machines"][name] = day["machines"].get(name, 0) + koli
+    return days
+
+
+def operator_totals(rows: Iterable[dict]) -> dict:
+    """operator_name -> {"jobs", "koli"} (isimsiz satırlar hariç)."""
+    ops = {}
+    for r in rows:
+        op = r.get("operator_name", "")
+        if not op:
+            continue
+        entry = ops.setdefault(op, {"jobs": 0, "koli": 0})
+        entry["jobs"] += r.get("completed_jobs", 0)
+        entry["koli"] += r.get("koli", 0)
+    return ops
@@ -1,14 +1,157 @@
+"""
+Denetim Logu — tamponlu, toplu yazan audit sink.
+
+log_audit neredeyse her yazma endpoint'inde await ediliyordu ve kendi insert_one'ını
+yapıyordu: her mutasyonun kullanıcıya dönen süresine bir DB round-trip ekleniyordu.
+Artık:
+
+  - log_audit kaydı süreç içi tampona ekler ve hemen döner.
+  - Arka plan task'ı tamponu AUDIT_FLUSH_INTERVAL_MS'de bir veya AUDIT_BATCH_SIZE kayıt
+    birikince insert_many(ordered=False) ile yazar.
+  - Tampon AUDIT_QUEUE_MAX'a ulaşırsa (ör. DB uzun süre erişilemez) yeni kayıtlar
+    düşürülür ve `dropped` sayacı artar — istek yolu hiçbir zaman bloklanmaz.
+  - Kayıtların _id'si kendi `id`'sidir: yazma hatasında parti tampona geri konur ve
+    tekrar denenir; sunucunun önceki denemede zaten yazdığı kayıtlar duplicate key (11000)
+    verir ve yok sayılır (services/audit_archive._copy ile aynı) — kayıt çoğalmaz.
+  - Kapanışta (server.py shutdown) tampon boşaltılır.
+  - Sink çalışmıyorsa (CLI / script) log_audit eskisi gibi doğrudan yazar.
+
+Metrikler: audit_sink.stats() → queue_depth, dropped, written, failed_batches
+(GET /api/audit-logs/stats).
+"""
+import asyncio
 import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from pymongo.errors import BulkWriteError
+
 from database import db
-from models import AuditLog
 
 logger = logging.getLogger(__name__)
 
+AUDIT_FLUSH_INTERVAL_MS = int(os.environ.get("AUDIT_FLUSH_INTERVAL_MS", "200"))
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "100"))
+AUDIT_QUEUE_MAX = int(os.environ.get("AUDIT_QUEUE_MAX", "10000"))
+
+
+class AuditSink:
+    def __init__(self, flush_interval_ms: int = AUDIT_FLUSH_INTERVAL_MS, batch_size: int = AUDIT_BATCH_SIZE,
+                 queue_max: int = AUDIT_QUEUE_MAX):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.queue_max = queue_max
+        self._buffer: List[dict] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.written = 0
+        self.failed_batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def submit(self, doc: dict):
+        if len(self._buffer) >= self.queue_max:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"Audit tamponu dolu ({self.queue_max}) — {self.dropped} kayıt düşürüldü")
+            return
+        self._buffer.append(doc)
+        if len(self._buffer) >= self.batch_size and self._wakeup:
+            self._wakeup.set()
+
+    def _requeue(self, docs: List[dict], error: Exception):
+        self.failed_batches += 1
+        logger.error(f"Audit flush error ({len(docs)} kayıt): {error}")
+        room = max(0, self.queue_max - len(self._buffer))
+        self.dropped += max(0, len(docs) - room)
+        self._buffer[:0] = docs[:room]
+
+    async def flush(self):
+        """Tampondaki her şeyi yaz. Hata olursa kayıtlar (kapasite varsa) tampona geri konur."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                try:
+                    await db.audit_logs.insert_many(batch, ordered=False)
+                    self.written += len(batch)
+                except BulkWriteError as e:
+                    # Duplicate key = önceki denemede yazılmış; sadece gerçekten yazılamayanlar geri döner
+                    failed = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != 11000}
+                    self.written += len(batch) - len(failed)
+                    if failed:
+                        self._requeue([d for i, d in enumerate(batch) if i in failed], e)
+                        return
+                except Exception as e:
+                    # Ağ hatası: sunucu yazmış olabilir — _id sabit olduğu için tekrar deneme güvenli
+                    self._requeue(batch, e)
+                    return
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Audit sink error: {e}")
+
+    def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="audit-sink")
+        logger.info(f"Audit sink started ({int(self.flush_interval * 1000)} ms / {self.batch_size} kayıt)")
+
+    async def stop(self):
+        """Task'ı durdur ve tamponu boşalt (shutdown)."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self._buffer),
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed_batches": self.failed_batches,
+            "running": self.running,
+        }
+
+
+audit_sink = AuditSink()
+
 
 async def log_audit(user: str, action: str, entity_type: str, entity_name: str = "", details: str = ""):
-    """Kullanici hareket logu kaydet"""
+    """Kullanici hareket logu kaydet (tampona; sink kapalıysa doğrudan)"""
+    doc_id = str(uuid.uuid4())
+    doc = {
+        "_id": doc_id, "id": doc_id,
+        "user": user, "action": action, "entity_type": entity_type,
+        "entity_name": entity_name or "", "details": details or "",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if audit_sink.running:
+        audit_sink.submit(doc)
+        return
     try:
-        log = AuditLog(user=user, action=action, entity_type=entity_type, entity_name=entity_name, details=details)
-        await db.audit_logs.insert_one(log.model_dump())
+        await db.audit_logs.insert_one(doc)
     except Exception as e:
         logger.error(f"Audit log error: {e}")
@@ -0,0 +1,112 @@
+"""
+Denetim Logu Arşivi — eski kayıtları aylık arşiv koleksiyonlarına taşır.
+
+`audit_logs` her mutasyonda büyüyor; yönetim paneli sadece son haftalara bakıyor.
+Sıcak koleksiyon (ve index'leri) küçük kalsın diye:
+
+  - AUDIT_HOT_DAYS günden eski kayıtlar `audit_logs_archive_YYYY_MM` koleksiyonlarına
+    taşınır (ay, created_at'ten). Her gece backup scheduler'ı üzerinden run_once ile
+    tek worker'da çalışır (routes/backups.py).
+  - Taşıma ARCHIVE_BATCH_SIZE'lık partiler halinde: önce arşive insert_many(ordered=False),
+    sonra aynı _id'ler sıcak koleksiyondan silinir. Yarıda kesilirse bir sonraki çalışma
+    kaldığı yerden devam eder; arşivde zaten olan _id'ler (duplicate key) yok sayılır.
+  - Arşivler aynı sorgu index'lerine sahip; GET /api/audit-logs?archive=YYYY-MM ile okunur.
+
+Sıkıştırılmış dosya yerine koleksiyon: arşiv aynı API ile filtrelenip sayfalanabiliyor,
+mongodump yedeklerine de otomatik giriyor.
+"""
+import logging
+import os
+import re
+from datetime import datetime, timezone, timedelta
+from typing import List, Optional
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+AUDIT_HOT_DAYS = int(os.environ.get("AUDIT_HOT_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_PREFIX = "audit_logs_archive_"
+
+_MONTH_RE = re.compile(r"^(\d{4})-(\d{2})$")
+
+# (alanlar) — sıcak koleksiyon ve arşivlerde aynı; sıralama her zaman (created_at, id) azalan
+QUERY_INDEXES = [
+    [("created_at", DESCENDING), ("id", DESCENDING)],
+    [("user", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+    [("entity_type", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+    [("action", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+]
+
+
+async def ensure_audit_indexes(collection):
+    for keys in QUERY_INDEXES:
+        await collection.create_index(keys)
+
+
+def archive_name(month: str) -> Optional[str]:
+    """'YYYY-MM' → arşiv koleksiyon adı; geçersizse None."""
+    m = _MONTH_RE.match(month or "")
+    if not m or not 1 <= int(m.group(2)) <= 12:
+        return None
+    return f"{ARCHIVE_PREFIX}{m.group(1)}_{m.group(2)}"
+
+
+async def list_archives() -> List[dict]:
+    """Mevcut arşiv ayları (yeniden eskiye) ve yaklaşık kayıt sayıları."""
+    names = await db.list_collection_names(filter={"name": {"$regex": f"^{ARCHIVE_PREFIX}"}})
+    archives = []
+    for name in sorted(names, reverse=True):
+        year, month = name[len(ARCHIVE_PREFIX):].split("_", 1)
+        archives.append({
+            "month": f"{year}-{month}",
+            "count": await db[name].estimated_document_count(),
+        })
+    return archives
+
+
+async def _copy(name: str, docs: List[dict]):
+    try:
+        await db[name].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Önceki yarım kalmış çalışmadan kalanlar — zaten arşivde
+        other = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+        if other:
+            raise
+
+
+async def archive_old_logs(hot_days: int = AUDIT_HOT_DAYS) -> dict:
+    """hot_days'ten eski audit kayıtlarını aylık arşivlere taşı. Dönüş: {ay: taşınan}"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=hot_days)).isoformat()
+    moved = {}
+    indexed = set()
+    while True:
+        docs = await db.audit_logs.find(
+            {"created_at": {"$lt": cutoff}}
+        ).sort([("created_at", ASCENDING), ("id", ASCENDING)]).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+        if not docs:
+            break
+        by_month, progressed = {}, False
+        for doc in docs:
+            by_month.setdefault(str(doc.get("created_at", ""))[:7], []).append(doc)
+        for month, batch in by_month.items():
+            name = archive_name(month)
+            if name is None:
+                logger.warning(f"Audit arşivi: created_at'i bozuk {len(batch)} kayıt atlandı")
+                continue
+            if name not in indexed:
+                await ensure_audit_indexes(db[name])
+                indexed.add(name)
+            await _copy(name, batch)
+            await db.audit_logs.delete_many({"_id": {"$in": [d["_id"] for d in batch]}})
+            moved[month] = moved.get(month, 0) + len(batch)
+            progressed = True
+        if len(docs) < ARCHIVE_BATCH_SIZE or not progressed:
+            break
+    if moved:
+        logger.info(f"Audit arşivi: {sum(moved.values())} kayıt taşındı ({', '.join(sorted(moved))})")
+    return moved
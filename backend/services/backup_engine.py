@@ -0,0 +1,327 @@
+"""
+Yedekleme Motoru — event loop'u bloklamadan MongoDB dump.
+
+- mongodump varsa `asyncio.create_subprocess_exec` ile çalışır; stderr satırları
+  okunarak koleksiyon bazında ilerleme kaydedilir.
+- mongodump yoksa Python fallback: her koleksiyon Motor cursor'ından RawBSONDocument
+  olarak (decode/encode yok) geçici bir .bson dosyasına akıtılır. Koleksiyonlar
+  BACKUP_CONCURRENCY kadar paralel dökülür; bellek kullanımı batch boyutuyla sınırlıdır.
+  Ardından dosyalar thread'de tar.gz arşivine akıtılır (format değişmedi:
+  `<koleksiyon>.bson` girdileri).
+- Arşiv önce `.partial` uzantısıyla yazılır, başarıda yeniden adlandırılır.
+- Drive upload ve eski dosya temizliği thread'de çalışır.
+- İlerleme `backup_status` koleksiyonunda tutulur (tüm worker'lar aynı durumu görür);
+  GET /admin/backups yanıtındaki `progress` alanı buradan gelir.
+"""
+import asyncio
+import logging
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+from database import db
+from services.leader_lock import lease
+
+# Google Drive (Service Account)
+try:
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+    from googleapiclient.http import MediaFileUpload
+    DRIVE_AVAILABLE = True
+except Exception:
+    DRIVE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = Path(os.environ.get("BACKUP_DIR", "/app/backups"))
+BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+RETENTION_DAYS = int(os.environ.get("BACKUP_RETENTION_DAYS", "30"))
+BACKUP_TIMEOUT_SECONDS = int(os.environ.get("BACKUP_TIMEOUT_SECONDS", "300"))
+BACKUP_CONCURRENCY = int(os.environ.get("BACKUP_CONCURRENCY", "4"))
+BACKUP_BATCH_SIZE = 1000
+
+DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive.file"]
+
+STATUS_COLLECTION = "backup_status"
+STATUS_ID = "current"
+PROGRESS_FLUSH_SECONDS = 1.0
+
+_RAW = CodecOptions(document_class=RawBSONDocument)
+# mongodump stderr: "done dumping buse.jobs (1234 documents)"
+_DONE_RE = re.compile(r"done dumping [^.\s]+\.(\S+) \((\d+) documents?\)")
+
+_run_lock = asyncio.Lock()
+
+
+def _drive_service():
+    """Google Drive servisi (Service Account ile). None döner eğer config yoksa/hatalıysa."""
+    if not DRIVE_AVAILABLE:
+        return None, None
+    creds_path = os.environ.get("GOOGLE_DRIVE_CREDENTIALS_PATH")
+    folder_id = os.environ.get("GOOGLE_DRIVE_FOLDER_ID")
+    if not creds_path or not folder_id or not os.path.exists(creds_path):
+        return None, None
+    try:
+        creds = service_account.Credentials.from_service_account_file(creds_path, scopes=DRIVE_SCOPES)
+        svc = build("drive", "v3", credentials=creds, cache_discovery=False)
+        return svc, folder_id
+    except Exception as e:
+        logger.error(f"Drive servisi kurulamadı: {e}")
+        return None, None
+
+
+def upload_to_drive(local_path: Path) -> dict:
+    """Bir dosyayı Drive klasörüne yükle. Sonuç: {success, file_id, web_link, error?}"""
+    svc, folder_id = _drive_service()
+    if not svc:
+        return {"success": False, "error": "Drive yapılandırması yok (env veya credentials.json eksik)"}
+    try:
+        media = MediaFileUpload(str(local_path), mimetype="application/gzip", resumable=True)
+        meta = {"name": local_path.name, "parents": [folder_id]}
+        result = svc.files().create(body=meta, media_body=media,
+                                    fields="id, name, webViewLink, size, createdTime").execute()
+        logger.info(f"Drive'a yüklendi: {result.get('name')} ({result.get('id')})")
+        return {
+            "success": True, "file_id": result.get("id"),
+            "name": result.get("name"), "web_link": result.get("webViewLink"),
+            "size": int(result.get("size", 0)),
+        }
+    except Exception as e:
+        logger.exception("Drive upload hatası")
+        return {"success": False, "error": str(e)}
+
+
+def _mongo_uri() -> str:
+    uri = os.environ.get("MONGO_URL")
+    if not uri:
+        raise RuntimeError("MONGO_URL ayarlı değil")
+    return uri
+
+
+def _db_name() -> str:
+    return os.environ.get("DB_NAME", "")
+
+
+def cleanup_old():
+    files = sorted(BACKUP_DIR.glob("backup_*.archive.gz"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[RETENTION_DAYS:]:
+        try:
+            old.unlink()
+            logger.info(f"Silindi: {old.name}")
+        except Exception as e:
+            logger.warning(f"Silinemedi {old}: {e}")
+
+
+# ==================== İLERLEME ====================
+
+class _Progress:
+    """Çalışan yedeğin durumu — throttled olarak backup_status'a yazılır."""
+
+    def __init__(self, filename: str):
+        self.state = {
+            "running": True, "filename": filename, "method": None, "phase": "starting",
+            "started_at": datetime.now(timezone.utc).isoformat(), "finished_at": None,
+            "collections": {}, "documents": 0, "error": None,
+        }
+        self._last_flush = 0.0
+
+    def collection(self, name: str, docs: int = 0, done: bool = False):
+        c = self.state["collections"].setdefault(name, {"documents": 0, "done": False})
+        c["documents"] = max(c["documents"], docs)
+        c["done"] = c["done"] or done
+        self.state["documents"] = sum(x["documents"] for x in self.state["collections"].values())
+
+    async def flush(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < PROGRESS_FLUSH_SECONDS:
+            return
+        self._last_flush = now
+        try:
+            await db[STATUS_COLLECTION].replace_one({"_id": STATUS_ID}, self.state, upsert=True)
+        except Exception as e:
+            logger.warning(f"Backup progress yazılamadı: {e}")
+
+
+async def get_progress() -> Optional[dict]:
+    """Son/çalışan yedeğin durumu (yoksa None)."""
+    return await db[STATUS_COLLECTION].find_one({"_id": STATUS_ID}, {"_id": 0})
+
+
+# ==================== MONGODUMP ====================
+
+async def _mongodump(out_path: Path, progress: _Progress) -> dict:
+    cmd = ["mongodump", f"--uri={_mongo_uri()}"]
+    dbn = _db_name()
+    if dbn:
+        cmd.append(f"--db={dbn}")
+    cmd += ["--gzip", f"--archive={out_path}"]
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    progress.state["method"] = "mongodump"
+    progress.state["phase"] = "dumping"
+    tail = []
+
+    async def read_stderr():
+        async for raw in proc.stderr:
+            line = raw.decode("utf-8", "replace").rstrip()
+            tail.append(line)
+            del tail[:-20]
+            m = _DONE_RE.search(line)
+            if m:
+                progress.collection(m.group(1), int(m.group(2)), done=True)
+                await progress.flush()
+
+    try:
+        await asyncio.wait_for(asyncio.gather(read_stderr(), proc.wait()), BACKUP_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return {"success": False, "error": f"Yedekleme zaman aşımına uğradı (>{BACKUP_TIMEOUT_SECONDS // 60}dk)"}
+    if proc.returncode != 0:
+        err = "\n".join(tail)
+        logger.error(f"mongodump failed: {err}")
+        return {"success": False, "error": err[-500:]}
+    return {"success": True}
+
+
+# ==================== PYTHON FALLBACK ====================
+
+def _write_raw(fh, chunks: list):
+    for raw in chunks:
+        fh.write(raw)
+
+
+async def _dump_collection(name: str, work_dir: Path, progress: _Progress):
+    """Bir koleksiyonu cursor → .bson dosyasına akıt (sabit bellek)."""
+    path = work_dir / f"{name}.bson"
+    coll = db.get_collection(name, codec_options=_RAW)
+    fh = await asyncio.to_thread(open, path, "wb")
+    count = 0
+    try:
+        batch = []
+        async for doc in coll.find({}, batch_size=BACKUP_BATCH_SIZE):
+            batch.append(doc.raw)
+            if len(batch) >= BACKUP_BATCH_SIZE:
+                await asyncio.to_thread(_write_raw, fh, batch)
+                count += len(batch)
+                batch = []
+                progress.collection(name, count)
+                await progress.flush()
+        if batch:
+            await asyncio.to_thread(_write_raw, fh, batch)
+            count += len(batch)
+    finally:
+        await asyncio.to_thread(fh.close)
+    progress.collection(name, count, done=True)
+    await progress.flush()
+
+
+def _write_tar(out_path: Path, work_dir: Path, names: list):
+    """Geçici .bson dosyalarını tar.gz'ye akıt (thread'de çalışır)."""
+    mtime = int(datetime.now(timezone.utc).timestamp())
+    with tarfile.open(out_path, mode="w:gz") as tar:
+        for name in names:
+            path = work_dir / f"{name}.bson"
+            info = tarfile.TarInfo(name=f"{name}.bson")
+            info.size = path.stat().st_size
+            info.mtime = mtime
+            with open(path, "rb") as fh:
+                tar.addfile(info, fh)
+
+
+async def _python_bson_backup(out_path: Path, progress: _Progress) -> dict:
+    """
+    mongodump binary'si yoksa Python fallback. Her collection'ı BSON olarak
+    tar.gz içine yazar. Geri yükleme için pymongo ile manual restore yapılır.
+    """
+    progress.state["method"] = "python_bson"
+    progress.state["phase"] = "dumping"
+    work_dir = Path(await asyncio.to_thread(tempfile.mkdtemp, prefix="backup_", dir=str(BACKUP_DIR)))
+    try:
+        names = [n for n in await db.list_collection_names() if not n.startswith("system.")]
+        for n in names:
+            progress.collection(n)
+        sem = asyncio.Semaphore(BACKUP_CONCURRENCY)
+
+        async def guarded(name):
+            async with sem:
+                await _dump_collection(name, work_dir, progress)
+
+        await asyncio.gather(*(guarded(n) for n in names))
+        progress.state["phase"] = "compressing"
+        await progress.flush(force=True)
+        await asyncio.to_thread(_write_tar, out_path, work_dir, names)
+        return {"success": True}
+    except Exception as e:
+        logger.exception("Python backup failed")
+        return {"success": False, "error": str(e)}
+    finally:
+        await asyncio.to_thread(shutil.rmtree, work_dir, True)
+
+
+# ==================== ANA GİRİŞ ====================
+
+async def run_backup(upload_drive: bool = True) -> dict:
+    """Async yedekleme — mongodump varsa onu, yoksa Python fallback'ı kullanır."""
+    if _run_lock.locked():
+        return {"success": False, "busy": True, "error": "Yedekleme zaten çalışıyor"}
+    async with _run_lock, lease("backup_run", ttl_seconds=60) as held:
+        if not held:
+            # Başka bir worker yedek alıyor — aynı anda ikinci arşiv oluşturma
+            return {"success": False, "busy": True, "error": "Yedekleme zaten çalışıyor"}
+        ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+        filename = f"backup_{ts}.archive.gz"
+        out_path = BACKUP_DIR / filename
+        tmp_path = BACKUP_DIR / f"{filename}.partial"
+        progress = _Progress(filename)
+        await progress.flush(force=True)
+
+        try:
+            try:
+                result = await _mongodump(tmp_path, progress)
+            except FileNotFoundError:
+                # mongodump binary yok — Python fallback
+                logger.warning("mongodump bulunamadı, Python fallback kullanılıyor")
+                result = await _python_bson_backup(tmp_path, progress)
+        except Exception as e:
+            logger.exception("Backup failed")
+            result = {"success": False, "error": str(e)}
+
+        if not result["success"]:
+            await asyncio.to_thread(tmp_path.unlink, True)
+            progress.state.update(running=False, phase="failed", error=result.get("error"),
+                                  finished_at=datetime.now(timezone.utc).isoformat())
+            await progress.flush(force=True)
+            return result
+
+        await asyncio.to_thread(os.replace, tmp_path, out_path)
+        size_mb = round(out_path.stat().st_size / 1024 / 1024, 2)
+        await asyncio.to_thread(cleanup_old)
+
+        response = {"success": True, "filename": filename, "size_mb": size_mb,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "method": progress.state["method"]}
+
+        if upload_drive:
+            # Sadece Drive yapılandırması varsa upload denenir
+            svc, _ = await asyncio.to_thread(_drive_service)
+            if svc is not None:
+                progress.state["phase"] = "uploading"
+                await progress.flush(force=True)
+                response["drive"] = await asyncio.to_thread(upload_to_drive, out_path)
+
+        progress.state.update(running=False, phase="done", size_mb=size_mb,
+                              finished_at=datetime.now(timezone.utc).isoformat())
+        await progress.flush(force=True)
+        return response
@@ -0,0 +1,188 @@
+"""
+Broadcast Bus — WebSocket yayınlarını tüm uvicorn worker'larına dağıtan pub/sub omurgası.
+
+Servis `uvicorn --workers N` ile çalışır; her worker kendi WebSocket bağlantı listesini
+tutar. Bir route `ws_manager.broadcast(...)` çağırdığında mesaj bus'a yayınlanır ve
+her worker kendi yerel istemcilerine iletir.
+
+Backend'ler (BROADCAST_BUS env):
+  - "mongo"  (varsayılan): capped collection `broadcast_events` + tailable await cursor.
+             Yayınlayan worker mesajı anında yerel olarak teslim eder; diğer worker'lar
+             cursor'dan okur (origin = kendi WORKER_ID olan kayıtlar atlanır).
+  - "memory" : tek süreç içi teslim (testler ve tek worker'lı geliştirme ortamı).
+
+Kullanım:
+    bus = get_bus()
+    bus.subscribe("ws:all", handler)      # async def handler(message: dict)
+    await bus.publish("ws:all", {...})
+    await bus.start() / await bus.stop()  # server.py startup/shutdown
+"""
+import asyncio
+import logging
+import os
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+EVENTS_COLLECTION = "broadcast_events"
+CAPPED_SIZE_BYTES = int(os.environ.get("BROADCAST_BUS_CAPPED_BYTES", str(16 * 1024 * 1024)))
+CAPPED_MAX_DOCS = int(os.environ.get("BROADCAST_BUS_CAPPED_DOCS", "20000"))
+
+# Her worker süreci için benzersiz kimlik — kendi yayınlarını cursor'da atlamak için
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class InMemoryBroadcastBus:
+    """Süreç içi bus — publish doğrudan yerel abonelere teslim eder."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+
+    def subscribe(self, channel: str, handler: Handler):
+        if handler not in self._handlers[channel]:
+            self._handlers[channel].append(handler)
+
+    def unsubscribe(self, channel: str, handler: Handler):
+        if handler in self._handlers.get(channel, []):
+            self._handlers[channel].remove(handler)
+
+    async def _dispatch(self, channel: str, message: dict):
+        for handler in list(self._handlers.get(channel, [])):
+            try:
+                await handler(message)
+            except Exception as e:
+                logger.error(f"Broadcast handler error ({channel}): {e}")
+
+    async def publish(self, channel: str, message: dict):
+        await self._dispatch(channel, message)
+
+    async def start(self):
+        return None
+
+    async def stop(self):
+        return None
+
+
+class MongoBroadcastBus(InMemoryBroadcastBus):
+    """Capped collection + tailable cursor ile worker'lar arası bus."""
+
+    name = "mongo"
+
+    def __init__(self, collection: str = EVENTS_COLLECTION):
+        super().__init__()
+        self.collection = collection
+        self._task: Optional[asyncio.Task] = None
+        # Cursor yeniden açılırken son görülen created_at'in biraz gerisinden devam edilir
+        # (worker saatleri/ObjectId'ler kesin sıralı değil), tekrarlar _seen ile elenir.
+        # Filtre sorguya konmaz: hiçbir kayıtla eşleşmeyen tailable cursor anında ölür.
+        self._last_ts: Optional[str] = None
+        self._seen = deque(maxlen=1000)
+
+    async def _ensure_collection(self):
+        try:
+            await db.create_collection(
+                self.collection, capped=True, size=CAPPED_SIZE_BYTES, max=CAPPED_MAX_DOCS
+            )
+            # Boş capped collection üzerinde tailable cursor anında ölür — başlangıç kaydı
+            await db[self.collection].insert_one({
+                "channel": "_init", "origin": WORKER_ID,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            })
+        except CollectionInvalid:
+            pass
+
+    async def publish(self, channel: str, message: dict):
+        # Yerel istemciler cursor turunu beklemez
+        await self._dispatch(channel, message)
+        try:
+            await db[self.collection].insert_one({
+                "channel": channel, "message": message, "origin": WORKER_ID,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            })
+        except Exception as e:
+            logger.error(f"Broadcast publish error ({channel}): {e}")
+
+    async def _tail(self):
+        backoff = 0.5
+        while True:
+            try:
+                query = {}
+                if self._last_ts:
+                    resume_from = (datetime.fromisoformat(self._last_ts) - timedelta(seconds=2)).isoformat()
+                    query = {"created_at": {"$gte": resume_from}}
+                cursor = db[self.collection].find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for doc in cursor:
+                        if doc["_id"] in self._seen:
+                            continue
+                        self._seen.append(doc["_id"])
+                        self._last_ts = max(self._last_ts or "", doc.get("created_at") or "")
+                        if doc.get("origin") == WORKER_ID or doc.get("channel") == "_init":
+                            continue
+                        await self._dispatch(doc["channel"], doc.get("message") or {})
+                    await asyncio.sleep(0.05)
+                backoff = 0.5
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Broadcast tail cursor error: {e} — {backoff}s sonra yeniden")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10)
+            else:
+                await asyncio.sleep(0.2)
+
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        await self._ensure_collection()
+        # Sadece başlangıçtan sonraki olaylar — geçmiş yayınlar yeniden oynatılmaz
+        self._last_ts = datetime.now(timezone.utc).isoformat()
+        self._task = asyncio.create_task(self._tail())
+        logger.info(f"Broadcast bus started (mongo, worker={WORKER_ID})")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+_BACKENDS = {
+    "mongo": MongoBroadcastBus,
+    "memory": InMemoryBroadcastBus,
+}
+
+_bus = None
+
+
+def get_bus():
+    """Süreç genelinde tek bus örneği (BROADCAST_BUS env ile seçilir)."""
+    global _bus
+    if _bus is None:
+        kind = os.environ.get("BROADCAST_BUS", "mongo").lower()
+        if kind not in _BACKENDS:
+            logger.warning(f"Bilinmeyen BROADCAST_BUS={kind}, mongo kullanılıyor")
+            kind = "mongo"
+        _bus = _BACKENDS[kind]()
+    return _bus
+
+
+def set_bus(bus):
+    """Bus'ı değiştir (testler için InMemoryBroadcastBus enjekte etmek)."""
+    global _bus
+    _bus = bus
@@ -0,0 +1,117 @@
+"""
+Değişiklik Akışı — jobs / machines / machine_messages / pallets için monoton sıra numaralı değişiklik günlüğü.
+
+İstemciler neyin değiştiğini bulmak için tüm listeyi yeniden indiriyordu. Artık:
+
+  - Bu koleksiyonlara yazan her yol yazmadan SONRA `record_change(koleksiyon, ids)` çağırır
+    (silmede deleted=True). Standalone MongoDB'de change stream yok; sıra numarası
+    `change_seq` sayacından ($inc, tek round-trip) alınır, `change_log`'a
+    {seq, collection, doc_id, op: upsert|delete, at} yazılır. Koleksiyon sürümü de artar
+    (services/collection_versions.py).
+  - GET /api/sync?since=<seq> (routes/sync.py) since'ten sonraki kayıtları okur, doküman
+    başına son işlemi alır ve upsert edilenlerin GÜNCEL halini tek `$in` sorgusuyla döner;
+    bulunamayan doküman silinmiş sayılır. Maliyet O(değişiklik).
+  - Sıra numarası yazmadan sonra alındığı için iki eşzamanlı yazıcının günlük kayıtları
+    sırasız düşebilir: imleç sadece kesintisiz öneki geçer. Boşluk GAP_GRACE_SECONDS'tan
+    eskiyse (yazıcı öldü) atlanır.
+  - Günlük RETENTION_DAYS sonra TTL ile silinir; imleç günlüğün gerisinde kalmışsa
+    (veya since=0) yanıt `reset: true` — istemci listeleri tam yükleyip dönen seq'ten devam eder.
+
+Kapsam dışı: başlangıç migration'ları (görsel taşıma) günlüğe yazmaz; görsel alanları
+sync yanıtında zaten yok.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument
+
+from database import db
+from services.collection_versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+CHANGE_LOG = "change_log"
+COUNTER = "change_seq"
+RETENTION_DAYS = 7
+GAP_GRACE_SECONDS = 10
+SYNC_PAGE_MAX = 500
+
+# Senkronize edilen koleksiyonlar ve yanıt projeksiyonları (liste endpoint'leriyle aynı)
+SYNC_COLLECTIONS: Dict[str, dict] = {
+    "jobs": {"_id": 0, "image_url": 0},
+    "machines": {"_id": 0},
+    "machine_messages": {"_id": 0},
+    "pallets": {"_id": 0},
+}
+
+
+async def record_change(collection: str, ids: Iterable[str], deleted: bool = False):
+    """Yazılan dokümanları günlüğe ekle. Hata yazma yolunu düşürmez, loglanır."""
+    ids = [i for i in dict.fromkeys(ids) if i]
+    if not ids:
+        return
+    try:
+        counter = await db[COUNTER].find_one_and_update(
+            {"_id": "seq"}, {"$inc": {"seq": len(ids)}}, upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        first = counter["seq"] - len(ids) + 1
+        now = datetime.now(timezone.utc)
+        op = "delete" if deleted else "upsert"
+        await db[CHANGE_LOG].insert_many([
+            {"seq": first + n, "collection": collection, "doc_id": doc_id, "op": op, "at": now}
+            for n, doc_id in enumerate(ids)
+        ], ordered=False)
+    except Exception as e:
+        logger.error(f"Change log write failed ({collection}, {len(ids)} kayıt): {e}")
+    await bump_version(collection)
+
+
+async def current_seq() -> int:
+    doc = await db[COUNTER].find_one({"_id": "seq"})
+    return int(doc["seq"]) if doc else 0
+
+
+def _age_seconds(at: datetime) -> float:
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - at).total_seconds()
+
+
+async def changes_since(since: int, collections: Optional[List[str]] = None, limit: int = SYNC_PAGE_MAX) -> dict:
+    """since'ten sonraki değişiklikler.
+
+    Dönüş: {seq, reset, has_more, changes: {koleksiyon: {upserted: [doküman], deleted: [id]}}}
+    """
+    names = [c for c in (collections or SYNC_COLLECTIONS) if c in SYNC_COLLECTIONS]
+    latest = await current_seq()
+    oldest = await db[CHANGE_LOG].find_one({}, {"seq": 1}, sort=[("seq", 1)])
+    behind = since < (oldest["seq"] - 1 if oldest else latest)
+    if since <= 0 or since > latest or behind:
+        return {"seq": latest, "reset": True, "has_more": False, "changes": {}}
+
+    entries = await db[CHANGE_LOG].find(
+        {"seq": {"$gt": since}}, {"_id": 0}
+    ).sort("seq", 1).limit(limit).to_list(limit)
+
+    cursor = since
+    last_op: Dict[str, Dict[str, str]] = {name: {} for name in names}
+    for entry in entries:
+        if entry["seq"] != cursor + 1 and _age_seconds(entry["at"]) < GAP_GRACE_SECONDS:
+            break  # önceki sıra numarası henüz yazılmadı — sonraki yoklamada
+        cursor = entry["seq"]
+        if entry["collection"] in last_op:
+            last_op[entry["collection"]][entry["doc_id"]] = entry["op"]
+
+    changes = {}
+    for name, ops in last_op.items():
+        if not ops:
+            continue
+        upsert_ids = [doc_id for doc_id, op in ops.items() if op == "upsert"]
+        docs = await db[name].find({"id": {"$in": upsert_ids}}, SYNC_COLLECTIONS[name]).to_list(None) if upsert_ids else []
+        found = {d["id"] for d in docs}
+        changes[name] = {
+            "upserted": docs,
+            "deleted": [doc_id for doc_id, op in ops.items() if op == "delete" or doc_id not in found],
+        }
+    return {"seq": cursor, "reset": False, "has_more": cursor < latest and len(entries) == limit, "changes": changes}
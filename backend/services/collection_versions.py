@@ -0,0 +1,54 @@
+"""
+Koleksiyon Sürümleri — okuma ağırlıklı listeler için koleksiyon başına değişiklik sayacı.
+
+`collection_versions` dokümanı: {_id: koleksiyon adı, version: int, updated_at}
+
+  - Sürümlü koleksiyona yazan her yol yazmadan SONRA `bump_version(ad)` çağırır.
+  - middleware/conditional_get.py GET isteğinde sürümleri handler'dan ÖNCE okur ve ETag'i
+    bunlardan üretir: If-None-Match tutarsa handler hiç çalışmaz (sorgu, serialize,
+    sıkıştırma yok). Okuma yazmadan önce yapıldığı için eski gövde yeni ETag ile etiketlenmez.
+  - Sayacı atlanan bir yazı istemcinin eski listeyi 304 ile tutmasına yol açar: yeni bir
+    yazma yolu eklerken bump unutulmamalı. Elle veri düzeltmesi / restore sonrası:
+
+        python -m services.collection_versions machines paints
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "collection_versions"
+
+
+async def bump_version(*collections: str):
+    """Koleksiyon(lar)ın sürümünü artır. Hata yazma yolunu düşürmez, loglanır."""
+    now = datetime.now(timezone.utc).isoformat()
+    try:
+        await asyncio.gather(*(
+            db[COLLECTION].update_one({"_id": name}, {"$inc": {"version": 1}, "$set": {"updated_at": now}}, upsert=True)
+            for name in set(collections)
+        ))
+    except Exception as e:
+        logger.error(f"Collection version bump failed ({', '.join(collections)}): {e}")
+
+
+async def get_versions(collections: Iterable[str]) -> Dict[str, int]:
+    """{ad: sürüm} — hiç yazılmamış koleksiyon 0."""
+    names = list(collections)
+    versions = {name: 0 for name in names}
+    async for doc in db[COLLECTION].find({"_id": {"$in": names}}):
+        versions[doc["_id"]] = int(doc.get("version", 0))
+    return versions
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        sys.exit("Kullanım: python -m services.collection_versions <koleksiyon> [<koleksiyon> ...]")
+    asyncio.run(bump_version(*sys.argv[1:]))
+    print(f"Sürüm artırıldı: {', '.join(sys.argv[1:])}")
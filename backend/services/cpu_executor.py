@@ -0,0 +1,52 @@
+"""
+CPU Executor — event loop'u bloklayan senkron işler için ortak havuz.
+
+bcrypt (hash/verify), Excel kaydetme gibi CPU-yoğun çağrılar async handler içinde
+doğrudan çalışırsa tüm worker'ın event loop'u 100-300 ms donar. Bu modül süreç başına
+tek bir ThreadPoolExecutor tutar; `run_cpu` ile çağrılan iş havuzda çalışır, loop
+diğer istekleri işlemeye devam eder.
+
+Thread havuzu yeterlidir: bcrypt hesap sırasında GIL'i bırakır, yani birden fazla
+login gerçekten paralel çalışır. Havuz boyutu CPU_EXECUTOR_WORKERS env ile ayarlanır
+(varsayılan: çekirdek sayısı, en az 2) — uvicorn her worker için ayrı havuz açar.
+
+Kullanım:
+    from services.cpu_executor import run_cpu
+    ok = await run_cpu(bcrypt.checkpw, plain, hashed)
+"""
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CPU_EXECUTOR_WORKERS = int(os.environ.get("CPU_EXECUTOR_WORKERS", str(max(2, os.cpu_count() or 2))))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=CPU_EXECUTOR_WORKERS, thread_name_prefix="cpu")
+        logger.info(f"CPU executor started ({CPU_EXECUTOR_WORKERS} threads)")
+    return _executor
+
+
+async def run_cpu(func: Callable[..., T], *args, **kwargs) -> T:
+    """Senkron `func`'u CPU havuzunda çalıştır ve sonucunu bekle."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executor():
+    """Uygulama kapanışında havuzu kapat (server.py shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,308 @@
+"""
+Canlı Pano Snapshot'ı — /dashboard/live verisi bellekte tutulur, değişiklik WS ile diff olarak gider.
+
+Duvardaki her pano ekranı GET /dashboard/live'ı 15 sn'de bir çağırıyordu; her çağrı
+live_sources aggregate'ini + makine/iş eşleştirmesini yeniden yapıyordu. N ekran = N hesap.
+Artık:
+
+  - Snapshot worker başına bellekte tutulur; HTTP isteği bellekten döner.
+  - İş / makine / rollup yazıları `mark_dashboard_dirty()` çağırır (job_queue.bump_queue_version,
+    production_rollup, makine bakım durumu, vardiya uçları). DEBOUNCE_SECONDS içindeki
+    olaylar tek bir `dashboard:dirty` bus mesajına toplanır, her worker snapshot'ını
+    bayat işaretler.
+  - Worker'a bağlı pano WS istemcisi varsa snapshot hemen yeniden hesaplanır ve önceki
+    sürüme göre diff (`dashboard_diff`) yayınlanır; yoksa ilk HTTP isteğinde hesaplanır.
+    Eşzamanlı istekler tek hesabı bekler (lock). Hesap sürerken gelen dirty kaybolmaz:
+    hesap bitince snapshot hemen bir kez daha hesaplanır.
+  - Kaçan olaylar ve gün dönümü için snapshot en fazla MAX_AGE_SECONDS eski kalır.
+
+WS protokolü (/api/ws/dashboard?token=...):
+    ← {"type": "dashboard_snapshot", "version": v, "data": {...}}        bağlanınca / "snapshot" isteğiyle
+    ← {"type": "dashboard_diff", "version": v, "base": v-1, "changes": {...}}
+       changes: değişen üst seviye alanlar; makine listesi aynı sıradaysa sadece
+       değişen satırlar `machines_patch` {index: makine} olarak gelir.
+    İstemci base kendi sürümüyle uyuşmazsa "snapshot" gönderip tam veriyi ister.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from services.analytics_queries import live_sources, daily_totals, operator_totals
+from services.broadcast_bus import get_bus
+from websocket_manager import ws_manager, ROLE_DASHBOARD
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_DASHBOARD_DIRTY = "dashboard:dirty"
+DEBOUNCE_SECONDS = int(os.environ.get("DASHBOARD_DEBOUNCE_MS", "500")) / 1000
+MAX_AGE_SECONDS = float(os.environ.get("DASHBOARD_MAX_AGE_SECONDS", "30"))
+
+
+async def build_live_dashboard() -> dict:
+    """Canlı üretim panosu verisi (tam hesap)."""
+    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+    week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+
+    # Tek round-trip: makineler + aktif kuyruk + production_daily rollup'ı
+    # (üretim rakamlarında çifte sayım düzeltmesi yazma anında yapıldı)
+    sources = await live_sources(week_ago[:10])
+    all_machines = sources["machines"]
+    active_jobs = sources["active_jobs"]
+    pending_jobs = sources["pending_jobs"]
+    paused_jobs = sources["paused_jobs"]
+    rollup_rows = sources["rollup"]
+
+    today_key = today_start[:10]
+    today_rows = [r for r in rollup_rows if r["date"] == today_key]
+
+    koli_today = sum(max(0, r.get("koli", 0)) for r in today_rows)
+    completed_today = sum(r.get("completed_jobs", 0) for r in today_rows)
+
+    active_by_machine = {}
+    for j in active_jobs:
+        active_by_machine.setdefault(j.get("machine_id"), j)
+    pending_by_machine = {}
+    for j in pending_jobs:
+        pending_by_machine[j.get("machine_id")] = pending_by_machine.get(j.get("machine_id"), 0) + 1
+
+    machine_data = []
+    for m in all_machines:
+        active_job = active_by_machine.get(m.get("id"))
+        machine_data.append({
+            "name": m["name"],
+            "status": m.get("status", "idle"),
+            "active_job": {
+                "name": active_job["name"],
+                "koli_count": active_job.get("koli_count", 0),
+                "operator_name": active_job.get("operator_name", ""),
+                "started_at": active_job.get("started_at", "")
+            } if active_job else None,
+            "pending_jobs": pending_by_machine.get(m.get("id"), 0)
+        })
+
+    # Operator siralamasi: tamamlanan + bugunku kismi uretim
+    op_today = operator_totals(today_rows)
+    operator_ranking = [{"name": k, "jobs": v["jobs"], "koli": v["koli"]}
+                        for k, v in sorted(op_today.items(), key=lambda x: x[1]["koli"], reverse=True)]
+
+    # 7 gunluk gunluk veri: tamamlanan + kismi uretim
+    daily_data = {date: day["total_koli"] for date, day in daily_totals(rollup_rows).items()}
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "summary": {
+            "total_machines": len(all_machines),
+            "working": sum(1 for m in all_machines if m.get("status") == "working"),
+            "idle": sum(1 for m in all_machines if m.get("status") == "idle"),
+            "maintenance": sum(1 for m in all_machines if m.get("status") == "maintenance"),
+            "koli_today": koli_today,
+            "completed_today": completed_today,
+            "pending_total": len(pending_jobs),
+            "expected_summary": _build_expected_summary(active_jobs + pending_jobs + paused_jobs)
+        },
+        "machines": machine_data,
+        "operator_ranking": operator_ranking,
+        "daily_koli": [{"date": k, "koli": v} for k, v in sorted(daily_data.items())]
+    }
+
+
+def _build_expected_summary(jobs: list) -> dict:
+    """Aktif kuyruktaki işler için beklenen koli özeti."""
+    total_target = 0
+    total_completed = 0
+    total_remaining = 0
+    by_machine = {}
+    for j in jobs:
+        target = int(j.get("koli_count", 0) or 0)
+        completed = int(j.get("completed_koli", 0) or 0)
+        remaining = max(0, target - completed)
+        total_target += target
+        total_completed += min(completed, target)
+        total_remaining += remaining
+        mid = j.get("machine_id") or ""
+        mname = j.get("machine_name") or "—"
+        if mid not in by_machine:
+            by_machine[mid] = {
+                "machine_id": mid, "machine_name": mname,
+                "remaining_koli": 0, "target_koli": 0,
+                "completed_koli": 0, "jobs_count": 0,
+            }
+        by_machine[mid]["remaining_koli"] += remaining
+        by_machine[mid]["target_koli"] += target
+        by_machine[mid]["completed_koli"] += min(completed, target)
+        by_machine[mid]["jobs_count"] += 1
+    pct = round((total_completed / total_target) * 100, 1) if total_target > 0 else 0.0
+    machines_list = sorted(by_machine.values(), key=lambda x: x["remaining_koli"], reverse=True)
+    for m in machines_list:
+        m["completion_pct"] = round((m["completed_koli"] / m["target_koli"]) * 100, 1) if m["target_koli"] > 0 else 0.0
+    return {
+        "total_remaining_koli": total_remaining,
+        "total_target_koli": total_target,
+        "total_completed_koli": total_completed,
+        "total_jobs": len(jobs),
+        "completion_pct": pct,
+        "by_machine": machines_list,
+    }
+
+
+def diff_snapshots(old: dict, new: dict) -> dict:
+    """new'i old'dan üretmek için gereken değişiklikler (timestamp hariç)."""
+    changes = {k: v for k, v in new.items() if k not in ("timestamp", "machines") and old.get(k) != v}
+    old_machines, new_machines = old.get("machines", []), new.get("machines", [])
+    if [m["name"] for m in old_machines] != [m["name"] for m in new_machines]:
+        changes["machines"] = new_machines
+    else:
+        patch = {str(i): m for i, (a, m) in enumerate(zip(old_machines, new_machines)) if a != m}
+        if patch:
+            changes["machines_patch"] = patch
+    return changes
+
+
+class DashboardSnapshot:
+    def __init__(self, debounce_seconds: float = DEBOUNCE_SECONDS, max_age_seconds: float = MAX_AGE_SECONDS):
+        self.debounce = debounce_seconds
+        self.max_age = max_age_seconds
+        self.data: Optional[dict] = None
+        self.version = 0
+        self.stale = True
+        self.computed_at = 0.0
+        self.computations = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self._publish_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._rerun = False
+        self._ticker: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._ticker is not None and not self._ticker.done()
+
+    def has_subscribers(self) -> bool:
+        return bool(ws_manager.topics.get(ROLE_DASHBOARD))
+
+    def mark_dirty(self):
+        """Yazma sonrası: debounce sonunda tüm worker'lara tek `dashboard:dirty` yayınla."""
+        if not self.running or (self._publish_task and not self._publish_task.done()):
+            return
+        self._publish_task = asyncio.create_task(self._publish_dirty())
+
+    async def _publish_dirty(self):
+        await asyncio.sleep(self.debounce)
+        try:
+            await get_bus().publish(CHANNEL_DASHBOARD_DIRTY, {})
+        except Exception as e:
+            logger.error(f"Dashboard dirty publish error: {e}")
+
+    async def on_dirty(self, message: dict):
+        """Bus handler — bu worker'ın snapshot'ı bayat; izleyen varsa hemen yenile."""
+        self.stale = True
+        if not self.has_subscribers():
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            # Süren hesap bu değişikliği görmemiş olabilir — bitince tekrar hesaplanır
+            self._rerun = True
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_until_clean())
+
+    async def _refresh_until_clean(self):
+        while True:
+            self._rerun = False
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Dashboard snapshot refresh error: {e}")
+                return
+            if not self._rerun:
+                return
+
+    def _fresh(self) -> bool:
+        return self.data is not None and not self.stale and time.monotonic() - self.computed_at < self.max_age
+
+    async def get(self) -> dict:
+        if not self._fresh():
+            await self.refresh()
+        return self.data
+
+    async def snapshot_message(self) -> dict:
+        data = await self.get()
+        return {"type": "dashboard_snapshot", "version": self.version, "data": data}
+
+    async def refresh(self):
+        """Snapshot'ı yeniden hesapla; değiştiyse pano istemcilerine diff gönder."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        requested = time.monotonic()
+        async with self._lock:
+            # Beklerken başka bir çağrı hesapladıysa onu kullan
+            if self.computed_at >= requested and self._fresh():
+                return
+            self.stale = False
+            try:
+                new = await build_live_dashboard()
+            except Exception:
+                self.stale = True
+                raise
+            self.computations += 1
+            self.computed_at = time.monotonic()
+            old, self.data = self.data, new
+            if old is None:
+                self.version += 1
+                return
+            changes = diff_snapshots(old, new)
+            if not changes:
+                return
+            self.version += 1
+            changes["timestamp"] = new["timestamp"]
+            await ws_manager.broadcast_local({
+                "topics": [ROLE_DASHBOARD],
+                "message": {"type": "dashboard_diff", "version": self.version,
+                            "base": self.version - 1, "changes": changes},
+            })
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.max_age)
+            if not self.has_subscribers():
+                continue
+            try:
+                self.stale = True
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Dashboard snapshot refresh error: {e}")
+
+    def start(self):
+        if self.running:
+            return
+        get_bus().subscribe(CHANNEL_DASHBOARD_DIRTY, self.on_dirty)
+        self._ticker = asyncio.create_task(self._tick(), name="dashboard-snapshot")
+        logger.info(f"Dashboard snapshot started (debounce {int(self.debounce * 1000)} ms, max age {self.max_age:g} s)")
+
+    async def stop(self):
+        get_bus().unsubscribe(CHANNEL_DASHBOARD_DIRTY, self.on_dirty)
+        tasks = [t for t in (self._ticker, self._publish_task, self._refresh_task) if t and not t.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._ticker = None
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "computations": self.computations,
+            "stale": self.stale,
+            "age_seconds": round(time.monotonic() - self.computed_at, 1) if self.data else None,
+            "subscribers": len(ws_manager.topics.get(ROLE_DASHBOARD, ())),
+        }
+
+
+dashboard_snapshot = DashboardSnapshot()
+
+
+def mark_dashboard_dirty():
+    """Pano verisini etkileyen her yazmadan sonra çağrılır (beklemeden döner)."""
+    dashboard_snapshot.mark_dirty()
@@ -0,0 +1,86 @@
+"""
+FCM Token Kaydı — cihaz token'ları, kullanıcı/makine eşleşmesi ve ölü token temizliği.
+
+`fcm_tokens` dokümanı:
+    {token, user_type, user_id, device_id, platform, machine_ids: [...], updated_at}
+
+  - Operatör cihazı makine seçince token'ı machine_id ile yeniden kaydeder;
+    send_notification_to_operators(machine_id=X) sadece machine_ids içinde X olan
+    operatör cihazlarına gider. Makine bilgisi göndermeyen (eski) istemciler
+    machine_ids = [] ile kalır ve tüm makine bildirimlerini almaya devam eder.
+  - Hedef kitle (user_types, machine_id) başına token listesi süreç içinde TOKEN_CACHE_SECONDS
+    cache'lenir; kayıt/silme yerel cache'i hemen temizler (diğer worker'lar en geç TTL sonunda görür).
+  - FCM'in unregistered / sender-id-mismatch döndürdüğü token'lar prune_tokens ile silinir,
+    fan-out sınırsız büyümez.
+"""
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "fcm_tokens"
+TOKEN_CACHE_SECONDS = 60
+
+_cache: Dict[Tuple, Tuple[float, List[str]]] = {}
+
+
+def _audience_key(user_types: Iterable[str], machine_id: Optional[str]) -> Tuple:
+    return tuple(sorted(user_types)), machine_id or None
+
+
+def invalidate_cache():
+    _cache.clear()
+
+
+async def register_token(token: str, user_type: str, user_id: str = "", device_id: str = "",
+                         platform: str = "", machine_ids: Optional[List[str]] = None):
+    """Token'ı kaydet/güncelle. machine_ids None → mevcut makine eşleşmesi korunur."""
+    update = {
+        "token": token, "user_type": user_type, "user_id": user_id,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if device_id:
+        update["device_id"] = device_id
+    if platform:
+        update["platform"] = platform
+    ops = {"$set": update}
+    if machine_ids is not None:
+        update["machine_ids"] = sorted(set(m for m in machine_ids if m))
+    else:
+        ops["$setOnInsert"] = {"machine_ids": []}
+    await db[COLLECTION].update_one({"token": token}, ops, upsert=True)
+    invalidate_cache()
+
+
+async def tokens_for(user_types: Iterable[str], machine_id: Optional[str] = None) -> List[str]:
+    """Hedef kitlenin token'ları. machine_id verilirse: o makineye bağlı + makinesiz cihazlar."""
+    key = _audience_key(user_types, machine_id)
+    cached = _cache.get(key)
+    if cached and time.monotonic() - cached[0] < TOKEN_CACHE_SECONDS:
+        return cached[1]
+
+    query = {"user_type": {"$in": list(key[0])}}
+    if machine_id:
+        query["$or"] = [
+            {"machine_ids": machine_id},
+            {"machine_ids": {"$size": 0}},
+            {"machine_ids": {"$exists": False}},
+        ]
+    tokens = [doc["token"] async for doc in db[COLLECTION].find(query, {"token": 1, "_id": 0})]
+    _cache[key] = (time.monotonic(), tokens)
+    return tokens
+
+
+async def prune_tokens(tokens: Iterable[str]) -> int:
+    """FCM'in kalıcı olarak reddettiği token'ları sil."""
+    tokens = list(set(tokens))
+    if not tokens:
+        return 0
+    result = await db[COLLECTION].delete_many({"token": {"$in": tokens}})
+    invalidate_cache()
+    logger.info(f"FCM: {result.deleted_count} ölü token silindi")
+    return result.deleted_count
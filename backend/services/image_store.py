@@ -0,0 +1,277 @@
+"""
+Görsel Deposu — içerik adresli (SHA-256) disk blob store.
+
+Eskiden yüklenen görsel base64 data URL olarak hem `images` hem `jobs.image_url`
+içinde tutuluyor, quick_transfer ile bölünen her işe kopyalanıyordu. Artık:
+
+  - Dosya IMAGE_STORE_DIR/<sha[:2]>/<sha> altında bir kez saklanır; aynı içerik
+    tekrar yüklenirse yeni dosya yazılmaz (dedupe).
+  - Meta veri `image_blobs` koleksiyonunda: {_id: sha, size, mime_type, filename, created_at}
+  - İş dokümanı sadece kısa referans taşır: image_url = "/api/images/<sha>"
+    (frontend "/" ile başlayan URL'lere host ekler, <img> doğrudan kullanabilir).
+  - Yükleme parça parça diske akıtılır ve aynı anda hash'lenir (tüm dosya bellekte tutulmaz).
+
+Not: Görseller MongoDB dump'ına girmez — IMAGE_STORE_DIR dosya seviyesinde yedeklenmeli
+(deploy/backup.sh).
+"""
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import re
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from starlette.responses import Response, StreamingResponse
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent.parent
+IMAGE_STORE_DIR = Path(os.environ.get("IMAGE_STORE_DIR", str(ROOT_DIR / "image_store")))
+TMP_DIR = IMAGE_STORE_DIR / "tmp"
+TMP_DIR.mkdir(parents=True, exist_ok=True)
+
+META_COLLECTION = "image_blobs"
+URL_PREFIX = "/api/images/"
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+
+_SHA_RE = re.compile(r"^[0-9a-f]{64}$")
+_DATA_URL_RE = re.compile(r"^data:([^;,]*)(;base64)?,", re.IGNORECASE)
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+def is_sha(value: str) -> bool:
+    return bool(value) and bool(_SHA_RE.match(value))
+
+
+def blob_path(sha: str) -> Path:
+    return IMAGE_STORE_DIR / sha[:2] / sha
+
+
+def url_for(sha: str) -> str:
+    return f"{URL_PREFIX}{sha}"
+
+
+def sha_from_url(url: Optional[str]) -> Optional[str]:
+    """'/api/images/<sha>' referansından sha; başka bir şeyse None."""
+    if url and url.startswith(URL_PREFIX):
+        sha = url[len(URL_PREFIX):].split("?", 1)[0]
+        if is_sha(sha):
+            return sha
+    return None
+
+
+def _write_chunk(fh, chunk: bytes):
+    fh.write(chunk)
+
+
+async def _commit(tmp: Path, sha: str, size: int, mime_type: str, filename: str) -> dict:
+    """Geçici dosyayı içerik adresine taşı (varsa sil) ve meta veriyi upsert et."""
+    final = blob_path(sha)
+
+    def move():
+        if final.exists():
+            tmp.unlink(missing_ok=True)
+            return False
+        final.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, final)
+        return True
+
+    created = await asyncio.to_thread(move)
+    await db[META_COLLECTION].update_one(
+        {"_id": sha},
+        {"$setOnInsert": {
+            "size": size, "mime_type": mime_type, "filename": filename,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }},
+        upsert=True,
+    )
+    return {"sha256": sha, "size": size, "mime_type": mime_type, "url": url_for(sha), "created": created}
+
+
+async def save_stream(read: Callable[[int], Awaitable[bytes]], mime_type: str, filename: str = "",
+                      max_bytes: int = MAX_IMAGE_BYTES) -> dict:
+    """Async okuyucudan (ör. UploadFile.read) parça parça diske yaz + SHA-256 hesapla."""
+    tmp = TMP_DIR / uuid.uuid4().hex
+    digest = hashlib.sha256()
+    size = 0
+    fh = await asyncio.to_thread(open, tmp, "wb")
+    try:
+        while True:
+            chunk = await read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise ImageTooLarge()
+            digest.update(chunk)
+            await asyncio.to_thread(_write_chunk, fh, chunk)
+    except BaseException:
+        await asyncio.to_thread(fh.close)
+        await asyncio.to_thread(tmp.unlink, True)
+        raise
+    await asyncio.to_thread(fh.close)
+    return await _commit(tmp, digest.hexdigest(), size, mime_type, filename)
+
+
+async def save_bytes(data: bytes, mime_type: str, filename: str = "") -> dict:
+    """Bellekteki içeriği depoya yaz (migration / eski data URL'ler için)."""
+    tmp = TMP_DIR / uuid.uuid4().hex
+
+    def write():
+        tmp.write_bytes(data)
+        return hashlib.sha256(data).hexdigest()
+
+    sha = await asyncio.to_thread(write)
+    return await _commit(tmp, sha, len(data), mime_type, filename)
+
+
+def decode_data_url(url: str) -> Optional[tuple]:
+    """'data:<mime>;base64,<...>' → (mime_type, bytes); data URL değilse None."""
+    m = _DATA_URL_RE.match(url or "")
+    if not m or not m.group(2):
+        return None
+    return (m.group(1) or "application/octet-stream"), base64.b64decode(url[m.end():])
+
+
+async def normalize_image_url(url: Optional[str]) -> Optional[str]:
+    """Eski istemcilerden gelen data URL'yi depoya taşıyıp referansa çevir."""
+    if not url or not url.startswith("data:"):
+        return url
+    decoded = await asyncio.to_thread(decode_data_url, url)
+    if not decoded:
+        return url
+    mime_type, data = decoded
+    return (await save_bytes(data, mime_type))["url"]
+
+
+async def get_meta(sha: str) -> Optional[dict]:
+    if not is_sha(sha):
+        return None
+    meta = await db[META_COLLECTION].find_one({"_id": sha})
+    if meta and blob_path(sha).exists():
+        return meta
+    return None
+
+
+IMAGE_FIELDS = ("image_url", "has_image", "image_size", "image_sha256")
+
+
+async def image_fields(url: Optional[str]) -> dict:
+    """İş dokümanında image_url ile birlikte tutulan alanlar.
+
+    image_url'u set eden her yol (create/update/clone/quick-transfer) bunu kullanır;
+    liste endpoint'leri has_image için ayrı sorgu atmaz. Data URL önce depoya taşınır.
+    """
+    ref = await normalize_image_url(url)
+    sha = sha_from_url(ref)
+    meta = await get_meta(sha) if sha else None
+    return {
+        "image_url": ref or None,
+        "has_image": bool(ref),
+        "image_size": meta["size"] if meta else None,
+        "image_sha256": sha,
+    }
+
+
+def copy_image_fields(job: dict) -> dict:
+    """Mevcut işin görsel alanlarını (yeniden hesaplamadan) yeni işe kopyalamak için."""
+    return {f: job.get(f) for f in IMAGE_FIELDS}
+
+
+async def migrate_job_images(batch_size: int = 50) -> int:
+    """Tek seferlik: data URL'leri depoya taşı ve has_image/image_size/image_sha256 doldur.
+
+    Görselsiz işler tek update_many ile işaretlenir; sadece görselli ve alanları
+    eksik (veya hâlâ data URL taşıyan) işler tek tek işlenir.
+    """
+    await db.jobs.update_many(
+        {"has_image": {"$exists": False}, "$or": [{"image_url": {"$exists": False}}, {"image_url": {"$in": [None, ""]}}]},
+        {"$set": {"has_image": False, "image_size": None, "image_sha256": None}},
+    )
+    migrated = 0
+    cursor = db.jobs.find(
+        {"$or": [{"has_image": {"$exists": False}}, {"image_url": {"$regex": "^data:"}}]},
+        {"_id": 0, "id": 1, "image_url": 1},
+        batch_size=batch_size,
+    )
+    async for job in cursor:
+        try:
+            await db.jobs.update_one({"id": job["id"]}, {"$set": await image_fields(job.get("image_url"))})
+            migrated += 1
+        except Exception as e:
+            logger.error(f"Job image migration failed ({job.get('id')}): {e}")
+    return migrated
+
+
+# ==================== HTTP SERVİS ====================
+
+def _parse_range(header: Optional[str], size: int) -> Optional[tuple]:
+    """'bytes=start-end' → (start, end) dahil; geçersiz/çoklu aralıkta None."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_s, _, end_s = header[6:].strip().partition("-")
+    try:
+        if start_s == "":
+            length = int(end_s)
+            if length <= 0:
+                return None
+            return max(0, size - length), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def file_response(request, path: Path, size: int, media_type: str, etag: str, cache_control: str,
+                  extra_headers: Optional[dict] = None):
+    """ETag / If-None-Match (304) / Range (206) destekli dosya yanıtı."""
+    quoted = f'"{etag}"'
+    headers = {"ETag": quoted, "Cache-Control": cache_control, "Accept-Ranges": "bytes", **(extra_headers or {})}
+    inm = request.headers.get("if-none-match")
+    if inm and (inm.strip() == "*" or quoted in [t.strip() for t in inm.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    start, end, status = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if range_header and size > 0:
+        if_range = request.headers.get("if-range")
+        if not if_range or if_range.strip() == quoted:
+            rng = _parse_range(range_header, size)
+            if rng is None:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            start, end = rng
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    def read_part(fh, n):
+        return fh.read(n)
+
+    async def body():
+        fh = await asyncio.to_thread(open, path, "rb")
+        try:
+            await asyncio.to_thread(fh.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(read_part, fh, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(fh.close)
+
+    return StreamingResponse(body(), status_code=status, media_type=media_type, headers=headers)
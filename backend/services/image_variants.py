@@ -0,0 +1,210 @@
+"""
+Görsel Varyantları — istek anında küçültülmüş (thumbnail) WebP/JPEG kopyalar.
+
+Operatör tabletleri ve plan paneli iş görsellerini küçük gösteriyor; orijinal (10MB'a
+kadar) yerine `?w=320` ile sadece gereken boyut indirilir:
+
+  - İstenen genişlik sabit kovalara yuvarlanır (WIDTH_BUCKETS) — sınırlı sayıda varyant,
+    yüksek cache isabeti. Orijinal zaten daha darsa orijinal döner.
+  - Format Accept'e göre: image/webp destekleniyorsa WebP, değilse JPEG (Vary: Accept).
+  - İlk istekte CPU havuzunda (services/cpu_executor.py) üretilir, IMAGE_STORE_DIR/thumbs
+    altına yazılır; aynı varyant için eşzamanlı istekler tek üretimi bekler.
+  - Disk cache LRU: toplam boyut THUMB_CACHE_MAX_MB'ı aşınca en uzun süredir
+    kullanılmayan varyantlar silinir (mtime = son erişim). Varyantlar her an yeniden
+    üretilebilir, yedeklenmez.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from PIL import Image, ImageOps
+
+from services.cpu_executor import run_cpu
+from services.image_store import IMAGE_STORE_DIR, TMP_DIR, blob_path, file_response
+
+logger = logging.getLogger(__name__)
+
+THUMB_DIR = IMAGE_STORE_DIR / "thumbs"
+WIDTH_BUCKETS = (160, 320, 640, 1280)
+THUMB_CACHE_MAX_BYTES = int(os.environ.get("THUMB_CACHE_MAX_MB", "512")) * 1024 * 1024
+WEBP_QUALITY = 78
+JPEG_QUALITY = 82
+# Erişimde mtime en fazla bu sıklıkla güncellenir (her isabette syscall olmasın)
+TOUCH_INTERVAL_SECONDS = 3600
+
+# Pillow'un açamadığı / küçültmenin anlamsız olduğu türler → orijinal döner
+_PASSTHROUGH_TYPES = {"image/svg+xml", "image/heic", "image/heif", "image/heic-sequence", "image/heif-sequence"}
+
+_inflight: Dict[Tuple[str, int, str], asyncio.Task] = {}
+# Orijinali kovadan zaten dar görseller — tekrar denenmez (süreç içi)
+_passthrough: Set[Tuple[str, int]] = set()
+
+
+def bucket_for(width: int) -> int:
+    """İstenen genişliği ilk büyük-eşit kovaya yuvarla (en büyük kovayla sınırlı)."""
+    for b in WIDTH_BUCKETS:
+        if width <= b:
+            return b
+    return WIDTH_BUCKETS[-1]
+
+
+def pick_format(accept: str) -> str:
+    return "webp" if "image/webp" in (accept or "") else "jpeg"
+
+
+def variant_path(sha: str, width: int, fmt: str) -> Path:
+    return THUMB_DIR / sha[:2] / f"{sha}_{width}.{fmt}"
+
+
+def _render(src: Path, dst: Path, width: int, fmt: str) -> Optional[int]:
+    """Varyantı üret ve dst'ye yaz; orijinal zaten dar ise None. (CPU havuzunda çalışır)"""
+    with Image.open(src) as im:
+        if im.format == "JPEG":
+            # JPEG'i DCT ölçeğinde küçük decode et — büyük fotoğraflarda çok daha hızlı
+            im.draft("RGB", (width, width))
+        im = ImageOps.exif_transpose(im)
+        if im.width <= width:
+            return None
+        has_alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+        im = im.convert("RGBA" if has_alpha else "RGB")
+        im.thumbnail((width, im.height), Image.LANCZOS, reducing_gap=3.0)
+
+        tmp = TMP_DIR / uuid.uuid4().hex
+        try:
+            if fmt == "webp":
+                im.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+            else:
+                if has_alpha:
+                    bg = Image.new("RGB", im.size, (255, 255, 255))
+                    bg.paste(im, mask=im.getchannel("A"))
+                    im = bg
+                im.save(tmp, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, dst)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return dst.stat().st_size
+
+
+class _DiskLRU:
+    """thumbs/ dizininin toplam boyutunu izler, sınır aşılınca en eski varyantları siler."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.total: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    def _scan(self):
+        files = []
+        for p in self.root.rglob("*_*.*"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        return files
+
+    def _evict(self) -> int:
+        files = self._scan()
+        total = sum(f[1] for f in files)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, p in sorted(files, key=lambda f: f[0]):
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+                removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.info(f"Thumbnail cache: {removed} varyant silindi (toplam {total // 1024 // 1024} MB)")
+        return total
+
+    async def added(self, size: int):
+        async with self._lock:
+            if self.total is None:
+                self.total = sum(f[1] for f in await asyncio.to_thread(self._scan))
+            else:
+                self.total += size
+            if self.total > self.max_bytes:
+                self.total = await asyncio.to_thread(self._evict)
+
+    @staticmethod
+    def _touch(path: Path) -> Optional[int]:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - st.st_mtime > TOUCH_INTERVAL_SECONDS:
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:
+                return None
+        return st.st_size
+
+    async def hit(self, path: Path) -> Optional[int]:
+        """Varyant diskteyse erişim zamanını güncelle ve boyutunu döndür."""
+        return await asyncio.to_thread(self._touch, path)
+
+
+_lru = _DiskLRU(THUMB_DIR, THUMB_CACHE_MAX_BYTES)
+
+
+async def _generate(sha: str, path: Path, width: int, fmt: str) -> Optional[int]:
+    try:
+        size = await run_cpu(_render, blob_path(sha), path, width, fmt)
+    except Exception as e:
+        # Geçici hata (disk, worker havuzu ...) hatırlanmaz — sonraki istek yeniden dener
+        logger.warning(f"Thumbnail üretilemedi ({sha[:12]} w={width}): {e}")
+        return None
+    finally:
+        _inflight.pop((sha, width, path.suffix[1:]), None)
+    if size is None:
+        _passthrough.add((sha, width))
+    else:
+        await _lru.added(size)
+    return size
+
+
+async def get_variant(sha: str, mime_type: str, width: int, fmt: str) -> Optional[Tuple[Path, int]]:
+    """(path, size) döndür; varyant anlamsızsa / üretilemezse None (orijinal kullanılır)."""
+    width = bucket_for(width)
+    if mime_type in _PASSTHROUGH_TYPES or (sha, width) in _passthrough:
+        return None
+    path = variant_path(sha, width, fmt)
+    size = await _lru.hit(path)
+    if size is not None:
+        return path, size
+
+    # Üretim ayrı task: istemci koparsa iptal olmaz, bekleyen diğer istekler sonucu alır
+    key = (sha, width, fmt)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_generate(sha, path, width, fmt))
+        _inflight[key] = task
+    size = await asyncio.shield(task)
+    return (path, size) if size is not None else None
+
+
+async def image_response(request, meta: dict, width: Optional[int], cache_control: str):
+    """Orijinal veya `width` varyantı için ETag/Range destekli yanıt."""
+    sha = meta["_id"]
+    mime_type = meta.get("mime_type") or "application/octet-stream"
+    if width:
+        fmt = pick_format(request.headers.get("accept", ""))
+        variant = await get_variant(sha, mime_type, width, fmt)
+        if variant:
+            path, size = variant
+            return file_response(
+                request, path, size, f"image/{fmt}", etag=f"{sha}-w{bucket_for(width)}.{fmt}",
+                cache_control=cache_control, extra_headers={"Vary": "Accept"},
+            )
+    return file_response(request, blob_path(sha), meta["size"], mime_type, etag=sha, cache_control=cache_control)
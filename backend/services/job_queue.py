@@ -0,0 +1,219 @@
+"""
+Makine Kuyruğu — iş sırası değişiklikleri için makine başına sürüm (optimistic locking).
+
+Plan panelinde iki planlamacı aynı makinenin kuyruğunu aynı anda sürükleyebilir.
+Her makine için `queue_versions` koleksiyonunda bir sayaç tutulur:
+    {_id: machine_id, version: int, updated_at}
+
+  - bump_queue_version(m)              : kuyruğu değiştiren her yazma sonrası +1
+  - bump_queue_version(m, expected=v)  : sadece sürüm hâlâ v ise +1 (compare-and-set);
+    değilse QueueVersionConflict — istemci listeyi yeniden çekmeden çakışmayı anlar.
+  - apply_reorder(...)                 : toplu sıralamayı tek bir ordered bulk_write ile yazar.
+  - machine_queue(m)                   : operatör ekranı için aktif iş + kuyruk başı + özet/ETA,
+    (machine_id, status, order, queued_at) index'i üzerinden tek aggregate ile.
+
+Sürüm önce alınır, sonra yazılır: iki eşzamanlı sürüklemeden biri 409 alır,
+yazmalar iç içe geçmez.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterable, List, Optional, Union
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from services.change_feed import record_change
+from services.dashboard_snapshot import mark_dashboard_dirty
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "queue_versions"
+
+
+class QueueVersionConflict(Exception):
+    def __init__(self, machine_id: str, expected: int, current: int):
+        super().__init__(f"Kuyruk sürümü değişmiş ({machine_id}: beklenen {expected}, güncel {current})")
+        self.machine_id = machine_id
+        self.expected = expected
+        self.current = current
+
+
+async def get_queue_version(machine_id: str) -> int:
+    doc = await db[COLLECTION].find_one({"_id": machine_id}, {"version": 1})
+    return int(doc["version"]) if doc else 0
+
+
+async def get_queue_versions(machine_ids: Iterable[str]) -> Dict[str, int]:
+    ids = list(set(machine_ids))
+    docs = await db[COLLECTION].find({"_id": {"$in": ids}}, {"version": 1}).to_list(len(ids) or 1)
+    versions = {m: 0 for m in ids}
+    versions.update({d["_id"]: int(d["version"]) for d in docs})
+    return versions
+
+
+async def bump_queue_version(machine_id: Optional[str], expected: Optional[int] = None) -> Optional[int]:
+    """Sürümü artır ve yenisini döndür. expected verilip eşleşmezse QueueVersionConflict."""
+    # Kuyruğu değiştiren her yazma canlı panoyu da etkiler
+    mark_dashboard_dirty()
+    if not machine_id:
+        return None
+    query = {"_id": machine_id}
+    if expected is not None:
+        query["version"] = expected
+    try:
+        doc = await db[COLLECTION].find_one_and_update(
+            query,
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+            # Kayıt yoksa sürüm 0 kabul edilir: expected=0 ile ilk yazma kaydı oluşturur
+            upsert=expected is None or expected == 0,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        doc = None
+    if doc is None:
+        raise QueueVersionConflict(machine_id, expected, await get_queue_version(machine_id))
+    return int(doc["version"])
+
+
+async def _release_version(machine_id: str, version: int):
+    """apply_reorder'ın aldığı sürümü geri al (arada başka bump olduysa dokunma)."""
+    await db[COLLECTION].update_one({"_id": machine_id, "version": version}, {"$inc": {"version": -1}})
+
+
+async def apply_reorder(items: List[dict], expected: Union[int, Dict[str, int], None] = None) -> Dict[str, int]:
+    """[{job_id, order}] listesini tek bulk_write ile uygula; makine başına yeni sürümleri döndür.
+
+    expected: tek sayı (batch'teki her makine için) veya {machine_id: sürüm}. Verilen
+    sürümlerin hepsi önce tek sorguyla kontrol edilir, sonra makine makine CAS ile alınır;
+    biri bile tutmazsa hiçbir sıra yazılmaz ve o ana kadar alınan sürümler geri verilir —
+    diğer makinelerin doğru sürümle gelen sonraki isteği boşuna 409 almaz.
+    """
+    ids = [item["job_id"] for item in items]
+    jobs = await db.jobs.find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "machine_id": 1}).to_list(len(ids) or 1)
+    machine_of = {j["id"]: j.get("machine_id") for j in jobs}
+    machines = sorted({m for m in machine_of.values() if m})
+
+    wanted = {m: expected.get(m) if isinstance(expected, dict) else expected for m in machines}
+    checked = {m: v for m, v in wanted.items() if v is not None}
+    if checked:
+        current = await get_queue_versions(checked)
+        for machine_id, want in checked.items():
+            if current[machine_id] != want:
+                raise QueueVersionConflict(machine_id, want, current[machine_id])
+
+    versions = {}
+    try:
+        for machine_id in machines:
+            versions[machine_id] = await bump_queue_version(machine_id, wanted[machine_id])
+    except QueueVersionConflict:
+        # Kontrolden sonra araya yazma girdi — bu istekle alınan sürümleri geri ver
+        await asyncio.gather(*(_release_version(m, v) for m, v in versions.items()), return_exceptions=True)
+        raise
+
+    ops = [
+        UpdateOne({"id": item["job_id"]}, {"$set": {"order": item["order"]}})
+        for item in items if item["job_id"] in machine_of
+    ]
+    if ops:
+        await db.jobs.bulk_write(ops, ordered=True)
+        await record_change("jobs", machine_of)
+    return versions
+
+
+# ==================== MAKİNE KUYRUĞU ====================
+
+QUEUE_STATUSES = ("in_progress", "pending", "paused")
+QUEUE_JOB_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "koli_count": 1, "completed_koli": 1, "colors": 1,
+    "format": 1, "notes": 1, "status": 1, "order": 1, "queued_at": 1, "created_at": 1,
+    "started_at": 1, "paused_at": 1, "pause_reason": 1, "operator_name": 1,
+    "delivery_date": 1, "has_image": 1, "machine_id": 1, "machine_name": 1,
+}
+RATE_WINDOW_DAYS = 14
+RATE_CACHE_SECONDS = 600
+# Tek işin süresi bundan uzunsa (unutulmuş/gece açık kalmış) hız hesabına katılmaz
+MAX_JOB_HOURS = 24
+
+_rate_cache: Dict[str, tuple] = {}
+
+
+def _remaining(job: dict) -> int:
+    return max(0, int(job.get("koli_count", 0) or 0) - int(job.get("completed_koli", 0) or 0))
+
+
+async def machine_rate(machine_id: str) -> Optional[float]:
+    """Son RATE_WINDOW_DAYS günde tamamlanan işlerden koli/saat (süreç içi cache)."""
+    cached = _rate_cache.get(machine_id)
+    if cached and time.monotonic() - cached[0] < RATE_CACHE_SECONDS:
+        return cached[1]
+    since = (datetime.now(timezone.utc) - timedelta(days=RATE_WINDOW_DAYS)).isoformat()
+    jobs = await db.jobs.find(
+        {"status": "completed", "completed_at": {"$gte": since}, "machine_id": machine_id},
+        {"_id": 0, "started_at": 1, "completed_at": 1, "completed_koli": 1},
+    ).to_list(2000)
+    koli, hours = 0, 0.0
+    for j in jobs:
+        try:
+            start = datetime.fromisoformat(j["started_at"].replace("Z", "+00:00"))
+            end = datetime.fromisoformat(j["completed_at"].replace("Z", "+00:00"))
+        except (KeyError, AttributeError, ValueError):
+            continue
+        h = (end - start).total_seconds() / 3600
+        if 0 < h <= MAX_JOB_HOURS and j.get("completed_koli"):
+            koli += int(j["completed_koli"])
+            hours += h
+    rate = round(koli / hours, 2) if hours > 0 else None
+    _rate_cache[machine_id] = (time.monotonic(), rate)
+    return rate
+
+
+async def machine_queue(machine_id: str, limit: int = 10) -> dict:
+    """Aktif iş, sıradaki işler ve kuyruk özeti — tek indexli aggregate."""
+    pipeline = [
+        {"$match": {"machine_id": machine_id, "status": {"$in": list(QUEUE_STATUSES)}}},
+        {"$sort": {"order": 1, "queued_at": 1}},
+        {"$project": QUEUE_JOB_PROJECTION},
+        {"$facet": {
+            "active": [{"$match": {"status": "in_progress"}}, {"$limit": 1}],
+            "pending": [{"$match": {"status": "pending"}}, {"$limit": limit}],
+            "paused": [{"$match": {"status": "paused"}}, {"$limit": limit}],
+            "summary": [{"$group": {
+                "_id": "$status",
+                "count": {"$sum": 1},
+                "koli": {"$sum": {"$ifNull": ["$koli_count", 0]}},
+                "done": {"$sum": {"$ifNull": ["$completed_koli", 0]}},
+            }}],
+        }},
+    ]
+    (result,), version, rate = await asyncio.gather(
+        db.jobs.aggregate(pipeline).to_list(1),
+        get_queue_version(machine_id),
+        machine_rate(machine_id),
+    )
+    by_status = {row["_id"]: row for row in result["summary"]}
+    pending = by_status.get("pending", {})
+    active = result["active"][0] if result["active"] else None
+
+    remaining_koli = max(0, int(pending.get("koli", 0)) - int(pending.get("done", 0)))
+    active_remaining = _remaining(active) if active else 0
+    total_remaining = remaining_koli + active_remaining
+    eta_minutes = round(total_remaining / rate * 60) if rate and total_remaining else None
+    return {
+        "machine_id": machine_id,
+        "version": version,
+        "active": active,
+        "next": result["pending"][0] if result["pending"] else None,
+        "pending": result["pending"],
+        "paused": result["paused"],
+        "summary": {
+            "pending_count": int(pending.get("count", 0)),
+            "paused_count": int(by_status.get("paused", {}).get("count", 0)),
+            "pending_remaining_koli": remaining_koli,
+            "active_remaining_koli": active_remaining,
+            "rate_koli_per_hour": rate,
+            "eta_minutes": eta_minutes,
+        },
+    }
@@ -0,0 +1,181 @@
+"""
+İş Durum Makinesi — start/complete/pause/resume/quick-transfer geçişleri tek yerden.
+
+Eskiden her geçiş find_one + ayrı update_one'lar (iş + makine) ile yapılıyordu:
+3-5 round-trip ve read-modify-write yarışı — operatör iki kez dokununca iş iki kez
+tamamlanabiliyor, rollup'a iki kez yazılabiliyordu. Artık:
+
+  - Her geçiş TRANSITIONS'ta tanımlı: hangi durumlardan, hangi duruma, makineye ne yazılır.
+  - İş tek bir find_one_and_update ile güncellenir; filtrede durum ön koşulu var
+    (`status $in from_statuses`). Eşzamanlı ikinci istek eşleşme bulamaz → TransitionError.
+  - Makine güncellemesi (ve split'te yeni iş) replica set / mongos'ta aynı transaction
+    içinde yazılır. Standalone MongoDB transaction desteklemez: o zaman iş güncellemesi
+    kilit noktasıdır, makine yazısı hemen arkasından gelir (en fazla 2 round-trip).
+  - `exclusive` geçişlerde (resume) makinede başka aktif iş varsa geçiş geri alınır
+    (transaction'da abort, standalone'da telafi yazısı).
+
+transition() (before, after) döndürür; after ayrıca okunmaz, yerelde hesaplanır.
+"""
+import logging
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure, PyMongoError
+
+from database import client, db
+from services.change_feed import record_change
+from services.job_queue import bump_queue_version
+
+logger = logging.getLogger(__name__)
+
+TXN_RETRIES = 3
+
+
+class Transition(NamedTuple):
+    from_statuses: Tuple[str, ...]
+    to_status: str
+    machine_status: Optional[str] = None  # None → makine dokümanına dokunulmaz
+    exclusive: bool = False  # makinede tek in_progress iş
+
+
+TRANSITIONS: Dict[str, Transition] = {
+    "start": Transition(("pending", "paused"), "in_progress", "working"),
+    "resume": Transition(("paused",), "in_progress", "working", exclusive=True),
+    "pause": Transition(("in_progress",), "paused", "idle"),
+    "complete": Transition(("pending", "in_progress", "paused"), "completed", "idle"),
+    "transfer": Transition(("pending", "paused"), "pending"),
+    "transfer_complete": Transition(("pending", "paused"), "completed"),
+}
+
+
+class TransitionError(Exception):
+    """Ön koşul tutmadı. status None → iş yok."""
+
+    def __init__(self, job_id: str, action: str, status: Optional[str]):
+        super().__init__(f"Geçersiz geçiş: {action} ({job_id}, durum: {status})")
+        self.job_id = job_id
+        self.action = action
+        self.status = status
+
+
+class MachineBusy(TransitionError):
+    """Makinede başka in_progress iş var; `before` geri alma için geçiş öncesi doküman."""
+
+    def __init__(self, job_id: str, action: str, before: dict):
+        super().__init__(job_id, action, before.get("status"))
+        self.before = before
+
+
+_txn_supported: Optional[bool] = None
+
+
+async def transactions_supported() -> bool:
+    """Replica set veya mongos mu? (sonuç süreç boyunca cache'lenir)"""
+    global _txn_supported
+    if _txn_supported is None:
+        try:
+            hello = await client.admin.command("hello")
+            _txn_supported = bool(hello.get("setName") or hello.get("msg") == "isdbgrid")
+        except Exception:
+            _txn_supported = False
+        logger.info(f"Job transitions: {'transaction' if _txn_supported else 'conditional update (standalone)'}")
+    return _txn_supported
+
+
+async def _apply(job_id: str, action: str, t: Transition, fields: dict, copy_fields: dict,
+                 insert: Optional[dict], expect: dict, session=None) -> Tuple[dict, dict]:
+    update = {"status": t.to_status, **fields}
+    stage = {k: {"$literal": v} for k, v in update.items()}
+    stage.update({k: f"${src}" for k, src in copy_fields.items()})
+    before = await db.jobs.find_one_and_update(
+        {**expect, "id": job_id, "status": {"$in": list(t.from_statuses)}},
+        [{"$set": stage}],
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE,
+        session=session,
+    )
+    if before is None:
+        current = await db.jobs.find_one({"id": job_id}, {"_id": 0, "status": 1}, session=session)
+        raise TransitionError(job_id, action, current.get("status") if current else None)
+
+    after = {**before, **update, **{k: before.get(src) for k, src in copy_fields.items()}}
+    machine_id = after.get("machine_id")
+    if t.exclusive and machine_id:
+        other = await db.jobs.find_one(
+            {"machine_id": machine_id, "status": "in_progress", "id": {"$ne": job_id}},
+            {"_id": 0, "id": 1}, session=session,
+        )
+        if other:
+            raise MachineBusy(job_id, action, before)
+
+    if t.machine_status and machine_id:
+        if t.machine_status == "working":
+            await db.machines.update_one(
+                {"id": machine_id}, {"$set": {"status": "working", "current_job_id": job_id}}, session=session,
+            )
+        else:
+            # Makine bu işte değilse (ör. bekleyen iş doğrudan tamamlandı) çalışan makine boşa düşmesin
+            await db.machines.update_one(
+                {"id": machine_id, "current_job_id": {"$in": [job_id, None]}},
+                {"$set": {"status": t.machine_status, "current_job_id": None}}, session=session,
+            )
+    if insert is not None:
+        await db.jobs.insert_one(insert, session=session)
+    return before, after
+
+
+async def _revert(job_id: str, t: Transition, before: dict, fields: dict, copy_fields: dict):
+    """Standalone modda exclusive ihlalinde iş dokümanını eski haline getir."""
+    changed = {"status", *fields, *copy_fields}
+    await db.jobs.update_one(
+        {"id": job_id, "status": t.to_status}, {"$set": {k: before.get(k) for k in changed}},
+    )
+
+
+async def transition(job_id: str, action: str, fields: Optional[dict] = None,
+                     copy_fields: Optional[Dict[str, str]] = None,
+                     insert: Optional[dict] = None, expect: Optional[dict] = None) -> Tuple[dict, dict]:
+    """İşi `action` geçişiyle güncelle; (önceki, yeni) dokümanları döndür.
+
+    fields      : status dışında yazılacak alanlar (literal).
+    copy_fields : {hedef: kaynak} — değer aynı dokümandaki alandan alınır
+                  (ör. completed_koli verilmediyse koli_count).
+    insert      : aynı geçişte eklenecek yeni iş dokümanı (quick-transfer split).
+    expect      : ek ön koşul alanları — çağıran önce okuyup karar verdiyse (quick-transfer)
+                  okunan değerler hâlâ geçerli mi.
+    """
+    t = TRANSITIONS[action]
+    fields = fields or {}
+    copy_fields = copy_fields or {}
+    expect = expect or {}
+
+    if await transactions_supported():
+        for attempt in range(TXN_RETRIES):
+            try:
+                async with await client.start_session() as s:
+                    async with s.start_transaction():
+                        before, after = await _apply(job_id, action, t, fields, copy_fields, insert, expect, s)
+                break
+            except OperationFailure as e:
+                # WriteConflict: eşzamanlı geçiş — yeniden dene, ön koşul artık tutmayabilir
+                if not e.has_error_label("TransientTransactionError") or attempt == TXN_RETRIES - 1:
+                    raise
+    else:
+        try:
+            before, after = await _apply(job_id, action, t, fields, copy_fields, None, expect)
+        except MachineBusy as e:
+            await _revert(job_id, t, e.before, fields, copy_fields)
+            raise
+        if insert is not None:
+            await db.jobs.insert_one(insert)
+
+    await record_change("jobs", [job_id, (insert or {}).get("id")])
+    if t.machine_status and after.get("machine_id"):
+        await record_change("machines", [after["machine_id"]])
+    try:
+        await bump_queue_version(after.get("machine_id"))
+        if before.get("machine_id") != after.get("machine_id"):
+            await bump_queue_version(before.get("machine_id"))
+    except PyMongoError as e:
+        logger.warning(f"Queue version bump failed ({job_id}): {e}")
+    return before, after
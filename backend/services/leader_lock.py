@@ -0,0 +1,182 @@
+"""
+Lider Kilidi — MongoDB lease tabanlı, worker'lar arası tek-çalıştırma.
+
+`uvicorn --workers N` ile her worker aynı startup görevlerini ve APScheduler
+işlerini çalıştırır. Bu modül `leases` koleksiyonunda (her kilit için tek kayıt,
+_id = kilit adı) süreli sahiplik tutar:
+
+  - acquire_lease / release_lease : ham primitive. Süresi dolmuş veya zaten bizim
+    olan kilit tek bir find_one_and_update(upsert) ile alınır; başkasındaysa upsert
+    DuplicateKeyError verir → alınamadı.
+  - lease(name, ttl)              : async context manager; tutulduğu sürece arka
+    planda yenilenir (ttl/3'te bir). `async with lease("x") as held: if held: ...`
+  - run_once(name, fn, cooldown)  : görev bir worker'da çalışır; BAŞARIYLA bittikten sonra
+    kilit `cooldown` saniye daha tutulur, böylece birkaç saniye geç başlayan diğer worker
+    aynı görevi tekrar çalıştırmaz. fn hata verirse kilit hemen bırakılır (yeniden denenir).
+    Mongo geçici erişilemezse kilit ACQUIRE_RETRIES kez beklenerek yeniden denenir.
+  - cluster_once(name)            : startup görevleri için decorator. Kilit adı açılışa
+    (BOOT_ID) özeldir: aynı açılışın worker'ları görevi bir kez çalıştırır, yeni deploy /
+    restart cooldown'u beklemeden yeniden çalıştırır. Hata loglanır, startup devam eder.
+"""
+import asyncio
+import functools
+import logging
+import os
+import socket
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "leases"
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+ACQUIRE_RETRIES = 3  # 1, 2, 4 sn bekleyerek
+
+
+def _process_start(pid: int) -> str:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[19]  # alan 22: starttime
+    except (OSError, IndexError):
+        return "0"
+
+
+def _boot_id() -> str:
+    """Aynı açılışın worker'larında ortak, her restart'ta farklı kimlik.
+
+    `uvicorn --workers N`: worker'ların ebeveyni master süreçtir (pid + başlama zamanı).
+    Tek süreçte (ebeveyn uvicorn/gunicorn değilse) sürecin kendisi kullanılır.
+    Deploy betiği BOOT_ID ortam değişkeniyle bunu ezebilir.
+    """
+    if os.environ.get("BOOT_ID"):
+        return os.environ["BOOT_ID"]
+    pid = os.getppid()
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            cmdline = f.read()
+        if b"uvicorn" not in cmdline and b"gunicorn" not in cmdline:
+            pid = os.getpid()
+    except OSError:
+        pid = os.getpid()
+    return f"{socket.gethostname()}:{pid}:{_process_start(pid)}"
+
+
+BOOT_ID = _boot_id()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def acquire_lease(name: str, ttl_seconds: float) -> bool:
+    """Kilidi al veya (zaten bizimse) süresini uzat. Alınamazsa False."""
+    now = _now()
+    try:
+        await db[COLLECTION].find_one_and_update(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"owner": OWNER_ID}]},
+            {"$set": {
+                "owner": OWNER_ID,
+                "expires_at": now + timedelta(seconds=ttl_seconds),
+                "renewed_at": now,
+            }, "$setOnInsert": {"created_at": now}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def release_lease(name: str, hold_seconds: float = 0):
+    """Kilidi bırak; hold_seconds > 0 ise o kadar süre daha tutulur (cooldown).
+
+    Cooldown sırasında sahiplik "<owner>:done" olur — aynı worker da yeniden alamaz.
+    """
+    update = {"expires_at": _now() + timedelta(seconds=hold_seconds)}
+    if hold_seconds > 0:
+        update["owner"] = f"{OWNER_ID}:done"
+    try:
+        await db[COLLECTION].update_one({"_id": name, "owner": OWNER_ID}, {"$set": update})
+    except Exception as e:
+        logger.warning(f"Lease release failed ({name}): {e}")
+
+
+async def _renew_loop(name: str, ttl_seconds: float):
+    while True:
+        await asyncio.sleep(ttl_seconds / 3)
+        try:
+            if not await acquire_lease(name, ttl_seconds):
+                logger.warning(f"Lease kaybedildi: {name}")
+                return
+        except Exception as e:
+            logger.warning(f"Lease renew failed ({name}): {e}")
+
+
+async def _acquire_with_retry(name: str, ttl_seconds: float) -> bool:
+    for attempt in range(ACQUIRE_RETRIES + 1):
+        try:
+            return await acquire_lease(name, ttl_seconds)
+        except Exception as e:
+            if attempt == ACQUIRE_RETRIES:
+                logger.error(f"Lease acquire failed ({name}), {attempt + 1} deneme: {e}")
+                return False
+            logger.warning(f"Lease acquire failed ({name}), yeniden denenecek: {e}")
+            await asyncio.sleep(2 ** attempt)
+    return False
+
+
+@asynccontextmanager
+async def lease(name: str, ttl_seconds: float = 60, hold_seconds: float = 0):
+    """Kilit tutulduğu sürece yenilenen context manager; `held` False ise başkasında.
+
+    hold_seconds sadece blok hatasız biterse uygulanır; hata olursa kilit hemen bırakılır.
+    """
+    held = await _acquire_with_retry(name, ttl_seconds)
+    renew: Optional[asyncio.Task] = None
+    if held:
+        renew = asyncio.create_task(_renew_loop(name, ttl_seconds))
+    succeeded = False
+    try:
+        yield held
+        succeeded = True
+    finally:
+        if renew:
+            renew.cancel()
+            try:
+                await renew
+            except asyncio.CancelledError:
+                pass
+            await release_lease(name, hold_seconds if succeeded else 0)
+
+
+async def run_once(name: str, fn: Callable[[], Awaitable], cooldown_seconds: float = 600,
+                   ttl_seconds: float = 60):
+    """fn'i kümede tek bir worker'da çalıştır; diğerleri atlar (None döner)."""
+    async with lease(name, ttl_seconds, hold_seconds=cooldown_seconds) as held:
+        if not held:
+            logger.info(f"'{name}' başka bir worker'da çalışıyor/çalıştı — atlandı")
+            return None
+        return await fn()
+
+
+def cluster_once(name: str, cooldown_seconds: float = 600):
+    """Decorator: startup görevini bu açılışta kümede bir kez çalıştır (kilit: name@BOOT_ID).
+
+    Görev hata verirse loglanır ve None döner (startup durmaz); kilit cooldown'suz
+    bırakıldığı için geç başlayan worker veya sonraki açılış yeniden dener.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await run_once(f"{name}@{BOOT_ID}", lambda: fn(*args, **kwargs), cooldown_seconds)
+            except Exception as e:
+                logger.warning(f"'{name}' başarısız — kilit bırakıldı, sonraki worker/açılış yeniden dener: {e}")
+                return None
+        return wrapper
+    return decorator
@@ -0,0 +1,231 @@
+"""
+Bildirim Outbox'ı — FCM / WhatsApp gönderimleri için kalıcı kuyruk + arka plan worker'ları.
+
+Eskiden route'lar bildirimi kendi içinde gönderiyordu: firebase_admin'in bloklayan
+`send_each_for_multicast` çağrısı event loop'ta çalışıyor, Twilio varsayılan
+executor'da bekleniyordu — create_job / send_message gecikmesi Google ve Twilio'ya
+bağlıydı, başarısız gönderim kayboluyordu. Artık:
+
+  - Route'lar sadece `enqueue(channel, payload, dedupe_key)` çağırır (tek insert).
+  - `notification_outbox` koleksiyonu:
+        {_id, channel, payload, status: pending|sending|sent|failed, attempts,
+         next_attempt_at, locked_by, locked_until, dedupe_key?, last_error, result,
+         created_at, sent_at, expires_at}
+  - Her uvicorn worker'ında kanal başına `concurrency` kadar worker task çalışır. Kayıt
+    find_one_and_update ile sahiplenilir (status → sending, LEASE_SECONDS kira); süreç
+    ölürse kira dolunca başka worker yeniden alır.
+  - Hata → üstel geri çekilme (BACKOFF_BASE_SECONDS * 2^n, en fazla BACKOFF_MAX_SECONDS),
+    MAX_ATTEMPTS sonra failed. Gönderici RetryLater(payload=...) ile sadece kalan kısmı
+    (ör. geçici hata alan FCM token'ları) yeniden denetebilir; PermanentFailure → failed.
+  - dedupe_key benzersiz (partial index): aynı olay iki kez kuyruğa girmez.
+  - Kanal başına token-bucket hız sınırı (süreç başına; toplam = worker sayısı × sınır).
+  - Kayıtlar RETENTION_DAYS sonra TTL index ile silinir.
+
+Kanallar gönderici modülde kaydedilir (services/notifications.py):
+    register_channel("fcm", deliver, concurrency=2, rate_per_second=10)
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "notification_outbox"
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 600
+LEASE_SECONDS = 120
+POLL_SECONDS = 2
+RETENTION_DAYS = 7
+
+
+class RetryLater(Exception):
+    """Geçici hata; payload verilirse sonraki denemede payload bununla güncellenir."""
+
+    def __init__(self, message: str, payload: Optional[dict] = None):
+        super().__init__(message)
+        self.payload = payload
+
+
+class PermanentFailure(Exception):
+    """Tekrar denemenin anlamı yok (yapılandırma eksik, geçersiz alıcı...)."""
+
+
+class _RateLimiter:
+    """Basit token bucket; rate 0 → sınırsız."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Channel(NamedTuple):
+    deliver: Callable[[dict], Awaitable[Optional[dict]]]
+    concurrency: int
+    limiter: _RateLimiter
+
+
+_channels: Dict[str, Channel] = {}
+_wakeups: Dict[str, asyncio.Event] = {}
+_tasks: List[asyncio.Task] = []
+
+
+def register_channel(name: str, deliver: Callable[[dict], Awaitable[Optional[dict]]],
+                     concurrency: int = 1, rate_per_second: float = 0):
+    """deliver(payload) → result dict (kayda yazılır); hata → yeniden deneme."""
+    _channels[name] = Channel(deliver, concurrency, _RateLimiter(rate_per_second))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def enqueue(channel: str, payload: dict, dedupe_key: Optional[str] = None) -> Optional[str]:
+    """Bildirimi kuyruğa ekle; aynı dedupe_key zaten varsa None."""
+    now = _now()
+    doc = {
+        "_id": str(uuid.uuid4()),
+        "channel": channel,
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now.isoformat(),
+        "expires_at": now + timedelta(days=RETENTION_DAYS),
+    }
+    if dedupe_key:
+        doc["dedupe_key"] = dedupe_key
+    try:
+        await db[COLLECTION].insert_one(doc)
+    except DuplicateKeyError:
+        logger.info(f"Outbox dedupe: {dedupe_key} zaten kuyrukta")
+        return None
+    event = _wakeups.get(channel)
+    if event:
+        event.set()
+    return doc["_id"]
+
+
+async def _claim(channel: str) -> Optional[dict]:
+    now = _now()
+    return await db[COLLECTION].find_one_and_update(
+        {"channel": channel, "$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "locked_until": {"$lt": now}},
+        ]},
+        {"$set": {"status": "sending", "locked_by": OWNER_ID,
+                  "locked_until": now + timedelta(seconds=LEASE_SECONDS)},
+         "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _process(doc: dict, channel: Channel):
+    mine = {"_id": doc["_id"], "locked_by": OWNER_ID, "status": "sending"}
+    try:
+        result = await channel.deliver(doc["payload"])
+    except Exception as e:
+        attempts = doc.get("attempts", 1)
+        update = {"last_error": str(e)[:500], "locked_by": None, "locked_until": None}
+        if isinstance(e, RetryLater) and e.payload:
+            update.update({f"payload.{k}": v for k, v in e.payload.items()})
+        if isinstance(e, PermanentFailure) or attempts >= MAX_ATTEMPTS:
+            update["status"] = "failed"
+            logger.error(f"Outbox {doc['channel']} {doc['_id'][:8]} başarısız ({attempts}. deneme): {e}")
+        else:
+            update["status"] = "pending"
+            update["next_attempt_at"] = _now() + timedelta(seconds=_backoff(attempts))
+            logger.warning(f"Outbox {doc['channel']} {doc['_id'][:8]} tekrar denenecek ({attempts}. deneme): {e}")
+        await db[COLLECTION].update_one(mine, {"$set": update})
+        return
+    await db[COLLECTION].update_one(mine, {"$set": {
+        "status": "sent", "sent_at": _now().isoformat(), "result": result,
+        "locked_by": None, "locked_until": None, "last_error": None,
+    }})
+
+
+async def _worker(name: str, channel: Channel):
+    event = _wakeups[name]
+    while True:
+        try:
+            event.clear()
+            doc = await _claim(name)
+            if doc is None:
+                try:
+                    await asyncio.wait_for(event.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await channel.limiter.acquire()
+            await _process(doc, channel)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Outbox worker error ({name}): {e}")
+            await asyncio.sleep(POLL_SECONDS)
+
+
+def start_outbox_workers():
+    """server.py startup: kayıtlı her kanal için worker task'ları başlat."""
+    if _tasks:
+        return
+    for name, channel in _channels.items():
+        _wakeups[name] = asyncio.Event()
+        for i in range(channel.concurrency):
+            _tasks.append(asyncio.create_task(_worker(name, channel), name=f"outbox:{name}:{i}"))
+    logger.info(f"Notification outbox workers started: {', '.join(f'{n}x{c.concurrency}' for n, c in _channels.items())}")
+
+
+async def stop_outbox_workers():
+    """server.py shutdown: task'ları iptal et. Yarıda kalan kayıt kira dolunca yeniden alınır."""
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    _wakeups.clear()
+
+
+async def outbox_stats() -> dict:
+    """Kanal/durum bazında kayıt sayıları."""
+    rows = await db[COLLECTION].aggregate([
+        {"$group": {"_id": {"channel": "$channel", "status": "$status"}, "count": {"$sum": 1}}},
+    ]).to_list(None)
+    stats: Dict[str, Dict[str, int]] = {}
+    for row in rows:
+        stats.setdefault(row["_id"]["channel"], {})[row["_id"]["status"]] = row["count"]
+    return stats
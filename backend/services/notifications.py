@@ -1,9 +1,20 @@
+"""
+Bildirimler — FCM (push) ve Twilio WhatsApp.
+
+send_* fonksiyonları gönderimi beklemez: services/notification_outbox.py kuyruğuna
+yazar, teslimat arka plandaki outbox worker'larında deliver_fcm / deliver_whatsapp ile
+yapılır. Alıcı token'ları teslim anında services/fcm_registry.py'den çözülür (kuyrukta
+bekleyen bildirim yeni kaydolan cihaza da gider); FCM'in reddettiği token'lar silinir.
+"""
 import os
 import logging
 import asyncio
-from typing import List
+from typing import List, Optional
 from pathlib import Path
 
+from services.fcm_registry import tokens_for, prune_tokens
+from services.notification_outbox import enqueue, register_channel, RetryLater, PermanentFailure
+
 logger = logging.getLogger(__name__)
 
 # Firebase Admin SDK Setup
@@ -42,129 +53,166 @@ except Exception as e:
     logger.warning(f"Twilio initialization failed: {e}")
 
 
-async def send_fcm_notification(tokens: List[str], title: str, body: str, data: dict = None):
-    """Firebase Cloud Messaging ile bildirim gönder"""
+FCM_BATCH_SIZE = 500  # send_each_for_multicast üst sınırı
+FCM_RATE_PER_SECOND = float(os.environ.get("OUTBOX_FCM_RATE", "10"))
+WHATSAPP_RATE_PER_SECOND = float(os.environ.get("OUTBOX_WHATSAPP_RATE", "1"))
+# Bu hatalarda token sonraki denemede yeniden gönderilir
+_FCM_RETRYABLE_CODES = {"UNAVAILABLE", "INTERNAL", "RESOURCE_EXHAUSTED", "DEADLINE_EXCEEDED", "UNKNOWN"}
+# Token artık geçersiz (uygulama silindi / token yenilendi / başka projeye ait) → kayıttan silinir
+_FCM_DEAD_ERRORS = {"UnregisteredError", "SenderIdMismatchError"}
+_FCM_DEAD_CODES = {"NOT_FOUND", "UNREGISTERED"}
+
+
+def _fcm_message(tokens: List[str], title: str, body: str, data: dict):
+    from firebase_admin import messaging as fb_messaging
+    return fb_messaging.MulticastMessage(
+        notification=fb_messaging.Notification(title=title, body=body),
+        data=data or {},
+        tokens=tokens,
+        android=fb_messaging.AndroidConfig(
+            priority='high',
+            notification=fb_messaging.AndroidNotification(
+                sound='default', priority='high', channel_id='job_notifications'
+            )
+        ),
+        webpush=fb_messaging.WebpushConfig(
+            notification=fb_messaging.WebpushNotification(
+                icon='/logo192.png', badge='/logo192.png',
+                vibrate=[200, 100, 200], require_interaction=True
+            )
+        )
+    )
+
+
+def _send_fcm_chunk(tokens: List[str], title: str, body: str, data: dict):
+    """Bloklayan firebase_admin çağrısı — thread'de çalışır. (başarılı, tekrar, ölü, diğer hata)"""
+    from firebase_admin import messaging as fb_messaging
+    response = fb_messaging.send_each_for_multicast(_fcm_message(tokens, title, body, data))
+    retry, dead, failed = [], [], 0
+    for token, resp in zip(tokens, response.responses):
+        if resp.success:
+            continue
+        code = str(getattr(resp.exception, "code", "") or "").upper().replace("-", "_")
+        if type(resp.exception).__name__ in _FCM_DEAD_ERRORS or code in _FCM_DEAD_CODES:
+            dead.append(token)
+        elif code in _FCM_RETRYABLE_CODES:
+            retry.append(token)
+        else:
+            failed += 1
+    return response.success_count, retry, dead, failed
+
+
+async def deliver_fcm(payload: dict) -> dict:
+    """Outbox teslimatı: token'ları 500'lük parçalar halinde gönder."""
+    if not firebase_app:
+        raise PermanentFailure("Firebase Admin SDK not initialized")
+    tokens = payload.get("tokens")
+    if tokens is None:
+        audience = payload.get("audience") or {}
+        tokens = await tokens_for(audience.get("user_types", []), audience.get("machine_id"))
     if not tokens:
-        logger.warning("No FCM tokens to send notification")
-        return False
+        return {"success": 0, "tokens": 0}
 
-    try:
-        from firebase_admin import messaging as fb_messaging
-        message = fb_messaging.MulticastMessage(
-            notification=fb_messaging.Notification(title=title, body=body),
-            data=data or {},
-            tokens=tokens,
-            android=fb_messaging.AndroidConfig(
-                priority='high',
-                notification=fb_messaging.AndroidNotification(
-                    sound='default', priority='high', channel_id='job_notifications'
-                )
-            ),
-            webpush=fb_messaging.WebpushConfig(
-                notification=fb_messaging.WebpushNotification(
-                    icon='/logo192.png', badge='/logo192.png',
-                    vibrate=[200, 100, 200], require_interaction=True
-                )
+    success, retry, dead, failed = 0, [], [], 0
+    for i in range(0, len(tokens), FCM_BATCH_SIZE):
+        chunk = tokens[i:i + FCM_BATCH_SIZE]
+        try:
+            ok, r, d, f = await asyncio.to_thread(
+                _send_fcm_chunk, chunk, payload["title"], payload["body"], payload.get("data") or {},
             )
-        )
-        response = fb_messaging.send_each_for_multicast(message)
-        logger.info(f"FCM notification sent: {response.success_count} success, {response.failure_count} failed")
-        return True
-    except Exception as e:
-        logger.error(f"FCM notification error: {e}")
-        return False
+        except Exception as e:
+            logger.error(f"FCM notification error: {e}")
+            retry.extend(chunk)
+            continue
+        success += ok
+        retry.extend(r)
+        dead.extend(d)
+        failed += f
+    if dead:
+        try:
+            await prune_tokens(dead)
+        except Exception as e:
+            logger.warning(f"FCM token prune failed: {e}")
+    logger.info(f"FCM notification sent: {success} success, {len(retry)} retry, {len(dead)} dead, {failed} failed")
+    if retry:
+        raise RetryLater(f"{len(retry)} FCM token geçici hata", payload={"tokens": retry})
+    return {"success": success, "tokens": len(tokens), "pruned": len(dead), "failed": failed}
 
 
-async def send_whatsapp_notification(message: str):
-    """WhatsApp bildirimi gönder"""
+async def deliver_whatsapp(payload: dict) -> dict:
+    """Outbox teslimatı: Twilio WhatsApp mesajı (bloklayan istemci thread'de)."""
     if not twilio_client:
-        logger.warning("Twilio client not available")
-        return False
+        raise PermanentFailure("Twilio client not available")
+    whatsapp_from = os.environ.get('TWILIO_WHATSAPP_FROM', 'whatsapp:+14155238886')
+    whatsapp_to = os.environ.get('WHATSAPP_NOTIFY_NUMBER')
+    if not whatsapp_to:
+        raise PermanentFailure("WHATSAPP_NOTIFY_NUMBER not set")
+    if not whatsapp_to.startswith('whatsapp:'):
+        whatsapp_to = f"whatsapp:{whatsapp_to}"
 
-    try:
-        whatsapp_from = os.environ.get('TWILIO_WHATSAPP_FROM', 'whatsapp:+14155238886')
-        whatsapp_to = os.environ.get('WHATSAPP_NOTIFY_NUMBER')
+    msg = await asyncio.to_thread(
+        twilio_client.messages.create, body=payload["message"], from_=whatsapp_from, to=whatsapp_to,
+    )
+    logger.info(f"WhatsApp message sent: {msg.sid}")
+    return {"sid": msg.sid}
 
-        if not whatsapp_to:
-            logger.warning("WHATSAPP_NOTIFY_NUMBER not set")
-            return False
 
-        if not whatsapp_to.startswith('whatsapp:'):
-            whatsapp_to = f"whatsapp:{whatsapp_to}"
+register_channel("fcm", deliver_fcm, concurrency=2, rate_per_second=FCM_RATE_PER_SECOND)
+register_channel("whatsapp", deliver_whatsapp, concurrency=1, rate_per_second=WHATSAPP_RATE_PER_SECOND)
 
-        logger.info(f"Sending WhatsApp to {whatsapp_to}")
 
-        loop = asyncio.get_event_loop()
-        msg = await loop.run_in_executor(
-            None,
-            lambda: twilio_client.messages.create(
-                body=message, from_=whatsapp_from, to=whatsapp_to
-            )
-        )
-        logger.info(f"WhatsApp message sent: {msg.sid}")
-        return True
-    except Exception as e:
-        logger.error(f"WhatsApp send failed: {e}")
+async def send_fcm_notification(tokens: List[str], title: str, body: str, data: dict = None,
+                                dedupe_key: Optional[str] = None):
+    """Belirli token'lara FCM bildirimi (kuyruğa ekler)"""
+    if not tokens:
+        logger.warning("No FCM tokens to send notification")
         return False
+    await enqueue("fcm", {"tokens": list(tokens), "title": title, "body": body, "data": data or {}}, dedupe_key)
+    return True
+
 
+async def send_whatsapp_notification(message: str, dedupe_key: Optional[str] = None):
+    """WhatsApp bildirimi (kuyruğa ekler)"""
+    await enqueue("whatsapp", {"message": message}, dedupe_key)
+    return True
 
-from database import db
 
+async def _notify(user_types: List[str], title: str, body: str, data: dict = None,
+                  dedupe_key: Optional[str] = None, **audience):
+    await enqueue("fcm", {
+        "audience": {"user_types": user_types, **audience},
+        "title": title, "body": body, "data": data or {},
+    }, dedupe_key)
 
-async def send_notification_to_managers(title: str, body: str, data: dict = None):
+
+async def send_notification_to_managers(title: str, body: str, data: dict = None, dedupe_key: Optional[str] = None):
     """Tüm kayıtlı yöneticilere FCM bildirimi gönder"""
     try:
-        tokens_cursor = db.fcm_tokens.find({"user_type": "manager"}, {"token": 1, "_id": 0})
-        tokens = [doc["token"] async for doc in tokens_cursor]
-        if tokens:
-            await send_fcm_notification(tokens, title, body, data)
-            logger.info(f"Notification sent to {len(tokens)} managers")
-        else:
-            logger.warning("No manager FCM tokens found")
+        await _notify(["manager"], title, body, data, dedupe_key)
     except Exception as e:
         logger.error(f"Error sending notification to managers: {e}")
 
 
-async def send_notification_to_operators(machine_id: str, title: str, body: str, data: dict = None):
+async def send_notification_to_operators(machine_id: str, title: str, body: str, data: dict = None,
+                                         dedupe_key: Optional[str] = None):
     """Belirli bir makinedeki operatörlere FCM bildirimi gönder"""
     try:
-        tokens_cursor = db.fcm_tokens.find({"user_type": "operator"}, {"token": 1, "_id": 0})
-        tokens = [doc["token"] async for doc in tokens_cursor]
-        if tokens:
-            await send_fcm_notification(tokens, title, body, data)
-            logger.info(f"Notification sent to {len(tokens)} operators for machine {machine_id}")
-        else:
-            logger.warning("No operator FCM tokens found")
+        await _notify(["operator"], title, body, data, dedupe_key, machine_id=machine_id)
     except Exception as e:
         logger.error(f"Error sending notification to operators: {e}")
 
 
-async def send_notification_to_plan_users(title: str, body: str, data: dict = None):
+async def send_notification_to_plan_users(title: str, body: str, data: dict = None, dedupe_key: Optional[str] = None):
     """Tüm kayıtlı Plan kullanıcılarına FCM bildirimi gönder"""
     try:
-        tokens_cursor = db.fcm_tokens.find({"user_type": "plan"}, {"token": 1, "_id": 0})
-        tokens = [doc["token"] async for doc in tokens_cursor]
-        if tokens:
-            await send_fcm_notification(tokens, title, body, data)
-            logger.info(f"Notification sent to {len(tokens)} plan users")
-        else:
-            logger.warning("No plan FCM tokens found")
+        await _notify(["plan"], title, body, data, dedupe_key)
     except Exception as e:
         logger.error(f"Error sending notification to plan users: {e}")
 
 
-async def send_notification_to_all_workers(title: str, body: str, data: dict = None):
+async def send_notification_to_all_workers(title: str, body: str, data: dict = None, dedupe_key: Optional[str] = None):
     """Tüm operatör ve plan kullanıcılarına FCM bildirimi gönder"""
     try:
-        tokens_cursor = db.fcm_tokens.find(
-            {"user_type": {"$in": ["operator", "plan"]}},
-            {"token": 1, "_id": 0}
-        )
-        tokens = [doc["token"] async for doc in tokens_cursor]
-        if tokens:
-            await send_fcm_notification(tokens, title, body, data)
-            logger.info(f"Notification sent to {len(tokens)} workers")
-        else:
-            logger.warning("No worker FCM tokens found")
+        await _notify(["operator", "plan"], title, body, data, dedupe_key)
     except Exception as e:
         logger.error(f"Error sending notification to all workers: {e}")
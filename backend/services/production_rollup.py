@@ -0,0 +1,241 @@
+"""
+Günlük Üretim Özeti (production_daily) — analitik endpoint'leri için materialize rollup.
+
+Her satırın anahtarı (date, machine_id, operator_name):
+  - koli            : o gün o makine/operatöre yazılan toplam koli (çifte sayım düzeltilmiş)
+  - partial_koli    : vardiya sonu raporlarından gelen kısmi üretim (koli'nin alt kümesi)
+  - completed_jobs  : o gün tamamlanan iş sayısı
+
+Kredi kuralı (routes/analytics.py'deki eski Python hesabıyla aynı net sonuç):
+  1. Her shift_end_report kendi gününe produced_koli kadar yazılır.
+  2. Bir iş tamamlandığında: completed_koli - (o işe ait tüm shift_end_report toplamı).
+     Kısmi üretimler zaten (1) ile yazıldığı için çifte sayılmaz.
+
+Operatör her yolda job.operator_name'dir (kredi anındaki değer); vardiya raporları bu
+değeri kendi operator_name alanında saklar, yeniden hesaplama da onu okur.
+
+Satırlar yazma anında ($inc + upsert) artımlı güncellenir:
+complete_job, quick_transfer_job, end_shift_with_report; vardiya onayı (services/
+shift_approval.py) record_batch ile tek bulk_write yapar. Tamamlanmış bir işin
+düzenlenmesi / silinmesi record_job_change ile eski krediyi geri alır, yenisini yazar.
+Okuma tarafı services/analytics_queries.py'dedir. Tutarsızlık olursa
+`rebuild_production_daily` ham veriden (analytics_queries.production_rows) yeniden hesaplar:
+
+    python -m services.production_rollup --rebuild [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReplaceOne, UpdateOne
+
+from database import db
+from services.analytics_queries import production_rows
+from services.dashboard_snapshot import mark_dashboard_dirty
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "production_daily"
+
+
+def day_of(iso_ts: Optional[str]) -> str:
+    """ISO timestamp'ten UTC gün anahtarı (YYYY-MM-DD)."""
+    if iso_ts:
+        return iso_ts[:10]
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _completed_credit_koli(job: dict, completed_koli: Optional[int] = None) -> int:
+    if completed_koli is None:
+        completed_koli = job.get("completed_koli")
+    if completed_koli is None:
+        completed_koli = job.get("koli_count", 0)
+    return int(completed_koli or 0)
+
+
+def _inc_spec(date: str, machine_id: str, machine_name: str, operator_name: str,
+              koli: int = 0, partial_koli: int = 0, completed_jobs: int = 0) -> Tuple[dict, dict]:
+    return (
+        {"date": date, "machine_id": machine_id or "", "operator_name": operator_name or ""},
+        {
+            "$inc": {"koli": koli, "partial_koli": partial_koli, "completed_jobs": completed_jobs},
+            "$set": {"machine_name": machine_name or "", "updated_at": datetime.now(timezone.utc).isoformat()},
+        },
+    )
+
+
+async def _inc(date: str, machine_id: str, machine_name: str, operator_name: str,
+               koli: int = 0, partial_koli: int = 0, completed_jobs: int = 0):
+    await db[COLLECTION].update_one(
+        *_inc_spec(date, machine_id, machine_name, operator_name, koli, partial_koli, completed_jobs),
+        upsert=True,
+    )
+    mark_dashboard_dirty()
+
+
+async def _reported_koli(job_id: str) -> int:
+    """Bir işe ait tüm vardiya sonu raporlarındaki produced_koli toplamı."""
+    pipeline = [
+        {"$match": {"job_id": job_id}},
+        {"$group": {"_id": None, "total": {"$sum": "$produced_koli"}}},
+    ]
+    async for doc in db.shift_end_reports.aggregate(pipeline):
+        return int(doc.get("total") or 0)
+    return 0
+
+
+async def record_job_completion(job: dict, completed_koli: Optional[int] = None,
+                                completed_at: Optional[str] = None, operator_name: Optional[str] = None):
+    """İş tamamlandığında rollup'a kalan (kısmi raporlarda yazılmamış) krediyi ekle."""
+    try:
+        koli = _completed_credit_koli(job, completed_koli)
+        prior = await _reported_koli(job["id"])
+        await _inc(
+            day_of(completed_at),
+            job.get("machine_id", ""), job.get("machine_name", ""),
+            operator_name if operator_name is not None else job.get("operator_name", ""),
+            koli=max(0, koli - prior), completed_jobs=1,
+        )
+    except Exception as e:
+        logger.error(f"production_daily completion update failed: {e}")
+
+
+def _completion_credit(job: Optional[dict], prior: int) -> Optional[tuple]:
+    """Tamamlanmış işin rollup'taki kredisi: ((date, machine_id, operator_name), machine_name, koli)."""
+    if not job or job.get("status") != "completed":
+        return None
+    key = (day_of(job.get("completed_at")), job.get("machine_id") or "", job.get("operator_name") or "")
+    return key, job.get("machine_name") or "", max(0, _completed_credit_koli(job) - prior)
+
+
+async def record_job_change(before: dict, after: Optional[dict]):
+    """İş düzenlendi (after) veya silindi (after=None): tamamlanma kredisi değiştiyse
+    eskisini ters $inc ile geri al, yenisini yaz. Vardiya raporu kredileri raporda kalır."""
+    if not any(j and j.get("status") == "completed" for j in (before, after)):
+        return
+    try:
+        prior = await _reported_koli(before["id"])
+        old, new = _completion_credit(before, prior), _completion_credit(after, prior)
+        if old == new:
+            return
+        ops = []
+        if old:
+            (date, machine_id, operator_name), machine_name, koli = old
+            ops.append(UpdateOne(*_inc_spec(date, machine_id, machine_name, operator_name,
+                                            koli=-koli, completed_jobs=-1), upsert=True))
+        if new:
+            (date, machine_id, operator_name), machine_name, koli = new
+            ops.append(UpdateOne(*_inc_spec(date, machine_id, machine_name, operator_name,
+                                            koli=koli, completed_jobs=1), upsert=True))
+        await db[COLLECTION].bulk_write(ops)
+        mark_dashboard_dirty()
+    except Exception as e:
+        logger.error(f"production_daily job change update failed: {e}")
+
+
+async def _reported_koli_many(job_ids: Iterable[str]) -> Dict[str, int]:
+    pipeline = [
+        {"$match": {"job_id": {"$in": list(job_ids)}}},
+        {"$group": {"_id": "$job_id", "total": {"$sum": "$produced_koli"}}},
+    ]
+    return {doc["_id"]: int(doc.get("total") or 0) async for doc in db.shift_end_reports.aggregate(pipeline)}
+
+
+async def record_batch(completions: List[Tuple[dict, int, str, str]],
+                       shift_reports: List[Tuple[dict, str]]):
+    """Toplu onay için: completions [(job, completed_koli, completed_at, operator_name)],
+    shift_reports [(report, operator_name)]. Satırlar bellekte birleştirilip tek bulk_write.
+
+    Kısmi raporlar shift_end_reports'a önceden yazılmış olmalı (tekli yolla aynı sıra).
+    """
+    try:
+        rows: Dict[tuple, list] = {}
+
+        def add(date, machine_id, machine_name, operator_name, koli=0, partial=0, jobs=0):
+            row = rows.setdefault((date, machine_id or "", operator_name or ""), [machine_name, 0, 0, 0])
+            row[1] += koli
+            row[2] += partial
+            row[3] += jobs
+
+        for report, operator_name in shift_reports:
+            produced = max(0, int(report.get("produced_koli", 0) or 0))
+            if produced > 0:
+                add(day_of(report.get("created_at")), report.get("machine_id", ""),
+                    report.get("machine_name", ""), operator_name, koli=produced, partial=produced)
+        if completions:
+            prior = await _reported_koli_many(job["id"] for job, *_ in completions)
+            for job, completed_koli, completed_at, operator_name in completions:
+                koli = _completed_credit_koli(job, completed_koli)
+                add(day_of(completed_at), job.get("machine_id", ""), job.get("machine_name", ""),
+                    operator_name, koli=max(0, koli - prior.get(job["id"], 0)), jobs=1)
+
+        ops = [UpdateOne(*_inc_spec(date, machine_id, row[0], operator_name, row[1], row[2], row[3]), upsert=True)
+               for (date, machine_id, operator_name), row in rows.items()]
+        if ops:
+            await db[COLLECTION].bulk_write(ops, ordered=False)
+            mark_dashboard_dirty()
+    except Exception as e:
+        logger.error(f"production_daily batch update failed: {e}")
+
+
+async def record_shift_report(report: dict, operator_name: str = ""):
+    """Vardiya sonu raporu (kısmi üretim) kaydedildiğinde rollup'a yaz."""
+    try:
+        produced = max(0, int(report.get("produced_koli", 0) or 0))
+        if produced <= 0:
+            return
+        await _inc(
+            day_of(report.get("created_at")),
+            report.get("machine_id", ""), report.get("machine_name", ""), operator_name,
+            koli=produced, partial_koli=produced,
+        )
+    except Exception as e:
+        logger.error(f"production_daily shift report update failed: {e}")
+
+
+# ==================== YENİDEN HESAPLAMA ====================
+
+async def rebuild_production_daily(start_date: Optional[str] = None, end_date: Optional[str] = None) -> dict:
+    """Aralıktaki rollup satırlarını ham veriden yeniden yaz.
+
+    Silip yeniden eklemek yerine her anahtar ReplaceOne(upsert) ile yerinde değiştirilir,
+    ardından aralıkta üretilmeyen eski anahtarlar silinir. Böylece rebuild sırasında
+    gelen $inc upsert'leri unique index'e (date, machine_id, operator_name) takılmaz;
+    rebuild başladıktan sonra yazılan satırlar (updated_at >= now) silinmez.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    rows = await production_rows(start_date, end_date)
+    for r in rows:
+        r["updated_at"] = now
+
+    range_q = {}
+    if start_date or end_date:
+        range_q["date"] = {}
+        if start_date:
+            range_q["date"]["$gte"] = start_date
+        if end_date:
+            range_q["date"]["$lt"] = end_date
+
+    if rows:
+        await db[COLLECTION].bulk_write([
+            ReplaceOne({k: r[k] for k in ("date", "machine_id", "operator_name")}, r, upsert=True)
+            for r in rows
+        ], ordered=False)
+    deleted = await db[COLLECTION].delete_many({**range_q, "updated_at": {"$lt": now}})
+    mark_dashboard_dirty()
+    logger.info(f"production_daily rebuilt: {len(rows)} rows ({start_date or '-'} .. {end_date or '-'})")
+    return {"rows": len(rows), "deleted": deleted.deleted_count, "start": start_date, "end": end_date}
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="production_daily rollup backfill/rebuild")
+    parser.add_argument("--rebuild", action="store_true", help="Rollup'ı ham veriden yeniden oluştur")
+    parser.add_argument("--start", help="Başlangıç günü (YYYY-MM-DD, dahil)")
+    parser.add_argument("--end", help="Bitiş günü (YYYY-MM-DD, hariç)")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.error("--rebuild gerekli")
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(rebuild_production_daily(args.start, args.end)))
@@ -0,0 +1,245 @@
+"""
+Arama İndeksi — Türkçe normalize edilmiş token/önek araması.
+
+Eskiden `get_jobs(search=)` ve `/pallets/search` büyük/küçük harf duyarsız, başı
+sabitlenmemiş `$regex` kullanıyordu: her arama tüm koleksiyonu tarıyor, geçmiş
+büyüdükçe yavaşlıyordu. Artık:
+
+  - Aranabilir alanlar normalize edilir: Türkçe küçük harf (I→ı, İ→i), aksan/
+    şapka temizliği (ç→c, ğ→g, ı→i, ö→o, ş→s, ü→u, â→a ...), harf/rakam dışı → boşluk.
+  - Her belge için `search_index` koleksiyonunda tek kayıt tutulur:
+        {_id: "<koleksiyon>:<id>", collection, ref_id, prefixes: [...], sort_key}
+    `prefixes` her token'ın 1..MAX_PREFIX_LEN uzunluktaki önekleri (multikey index).
+    Kaynak dokümanlara alan eklenmez — mevcut `{"_id": 0}` okumaları şişmez.
+  - Arama: sorgu token'larının hepsi önek olarak eşleşmeli (`$all`, indexli).
+    Adaylar yeni kayıt önce CANDIDATE_LIMIT'lik sayfalarla (keyset: sort_key, _id)
+    okunur; çağıranın filtreleri (status, machine_id ...) her sayfaya uygulanır ve
+    `limit` sonuç birikene kadar sonraki sayfaya geçilir — filtre aday kesiminden
+    SONRA uygulandığı için eşleşme kaybolmaz. Toplam MAX_CANDIDATE_PAGES sayfa ve
+    SEARCH_MAX_TIME_MS ile sınırlı. Sonuçlar tam token eşleşmesi > önek eşleşmesi ve
+    alan ağırlığına göre sıralanır, eşitlikte yeni kayıt önce.
+
+Yeni koleksiyon eklemek: SPECS'e alanları/ağırlıkları yaz, yazma yollarında
+`index_document` / `remove_document` çağır; startup backfill eksikleri doldurur.
+
+Not: Önek araması kelime ortasını bulmaz ("niz" → "Deniz" eşleşmez); bu, index
+kullanmanın bilinçli karşılığıdır.
+"""
+import logging
+import re
+import time
+import unicodedata
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import ExecutionTimeout
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "search_index"
+MAX_PREFIX_LEN = 12
+CANDIDATE_LIMIT = 1000  # aday sayfası
+MAX_CANDIDATE_PAGES = 20
+SEARCH_MAX_TIME_MS = 2000
+BACKFILL_BATCH = 500
+
+
+class SearchSpec(NamedTuple):
+    fields: Tuple[Tuple[str, float], ...]  # (alan, ağırlık)
+    sort_fields: Tuple[str, ...] = ("created_at",)  # ilk dolu alan sort_key olur
+
+
+SPECS: Dict[str, SearchSpec] = {
+    "jobs": SearchSpec(fields=(("name", 3.0), ("colors", 1.0))),
+    # PalletScan dokümanlarında created_at yok, zaman scanned_at'te
+    "pallets": SearchSpec(fields=(("code", 3.0), ("pallet_code", 3.0), ("job_name", 2.0)),
+                          sort_fields=("created_at", "scanned_at")),
+    "bobins": SearchSpec(fields=(("brand", 3.0), ("barcode", 3.0), ("color", 1.0), ("supplier", 1.0))),
+    "brand_stock": SearchSpec(fields=(("brand", 3.0), ("machine", 1.0), ("color", 1.0))),
+}
+
+_TR_FOLD = str.maketrans({
+    "ç": "c", "ğ": "g", "ı": "i", "ö": "o", "ş": "s", "ü": "u",
+    "â": "a", "î": "i", "û": "u",
+})
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text) -> str:
+    """Türkçe casefold + aksan temizliği; harf/rakam dışı karakterler boşluk olur."""
+    if text is None:
+        return ""
+    s = str(text).replace("I", "ı").replace("İ", "i").lower().translate(_TR_FOLD)
+    s = "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", s).strip()
+
+
+def tokenize(text) -> List[str]:
+    return normalize(text).split()
+
+
+def prefixes_for(tokens: List[str]) -> List[str]:
+    out = set()
+    for tok in tokens:
+        for n in range(1, min(len(tok), MAX_PREFIX_LEN) + 1):
+            out.add(tok[:n])
+    return sorted(out)
+
+
+def _entry(collection: str, doc: dict) -> dict:
+    spec = SPECS[collection]
+    tokens = []
+    for field, _ in spec.fields:
+        tokens += tokenize(doc.get(field))
+    return {
+        "collection": collection,
+        "ref_id": doc["id"],
+        "prefixes": prefixes_for(tokens),
+        "sort_key": next((doc[f] for f in spec.sort_fields if doc.get(f)), ""),
+    }
+
+
+async def index_document(collection: str, doc: dict):
+    """Belgenin arama kaydını yaz/güncelle. Hata ana yazmayı bozmaz (backfill onarır)."""
+    try:
+        await db[COLLECTION].replace_one(
+            {"_id": f"{collection}:{doc['id']}"}, _entry(collection, doc), upsert=True,
+        )
+    except Exception as e:
+        logger.warning(f"Search index write failed ({collection}:{doc.get('id')}): {e}")
+
+
+async def remove_document(collection: str, ref_id: str):
+    try:
+        await db[COLLECTION].delete_one({"_id": f"{collection}:{ref_id}"})
+    except Exception as e:
+        logger.warning(f"Search index delete failed ({collection}:{ref_id}): {e}")
+
+
+def _score(spec: SearchSpec, doc: dict, query_tokens: List[str]) -> float:
+    """Her sorgu token'ı için en iyi alan eşleşmesi; biri bile eşleşmezse 0."""
+    field_tokens = [(weight, tokenize(doc.get(field))) for field, weight in spec.fields]
+    total = 0.0
+    for q in query_tokens:
+        best = 0.0
+        for weight, toks in field_tokens:
+            for t in toks:
+                if t == q:
+                    best = max(best, 2 * weight)
+                elif t.startswith(q):
+                    best = max(best, weight)
+        if best == 0:
+            return 0.0
+        total += best
+    return total
+
+
+async def _candidate_pages(collection: str, keys: List[str], q: str) -> AsyncIterator[List[dict]]:
+    """Önek eşleşen kayıtlar, yeni kayıt önce, CANDIDATE_LIMIT'lik sayfalar halinde."""
+    base = {"collection": collection, "prefixes": {"$all": keys}}
+    query = base
+    deadline = time.monotonic() + SEARCH_MAX_TIME_MS / 1000
+    for _ in range(MAX_CANDIDATE_PAGES):
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            logger.warning(f"Search time budget exhausted ({collection}, q={q!r})")
+            return
+        try:
+            page = await db[COLLECTION].find(query, {"ref_id": 1, "sort_key": 1}).sort(
+                [("sort_key", -1), ("_id", -1)]
+            ).limit(CANDIDATE_LIMIT).max_time_ms(remaining_ms).to_list(CANDIDATE_LIMIT)
+        except ExecutionTimeout:
+            logger.warning(f"Search timed out ({collection}, q={q!r})")
+            return
+        if page:
+            yield page
+        if len(page) < CANDIDATE_LIMIT:
+            return
+        last = page[-1]
+        query = {**base, "$or": [
+            {"sort_key": {"$lt": last["sort_key"]}},
+            {"sort_key": last["sort_key"], "_id": {"$lt": last["_id"]}},
+        ]}
+
+
+async def search_documents(collection: str, q: str, filters: Optional[dict] = None,
+                           projection: Optional[dict] = None, limit: int = 50) -> List[dict]:
+    """Sıralı arama sonucu. Boş/anlamsız sorgu → []."""
+    spec = SPECS[collection]
+    query_tokens = tokenize(q)
+    if not query_tokens:
+        return []
+    keys = sorted({t[:MAX_PREFIX_LEN] for t in query_tokens})
+
+    proj = dict(projection or {"_id": 0})
+    added = []
+    if any(v for k, v in proj.items() if k != "_id"):
+        # Dahil-etme projeksiyonu: puanlama alanları da gelsin, sonra çıkarılır
+        for field in [f for f, _ in spec.fields] + ["id"]:
+            if field not in proj:
+                proj[field] = 1
+                added.append(field)
+
+    scored = []
+    seen = 0
+    async for page in _candidate_pages(collection, keys, q):
+        recency = {c["ref_id"]: seen + i for i, c in enumerate(page)}
+        seen += len(page)
+        query = {"id": {"$in": list(recency)}}
+        if filters:
+            query = {"$and": [filters, query]}
+        for d in await db[collection].find(query, proj).to_list(len(recency)):
+            s = _score(spec, d, query_tokens)
+            if s > 0:
+                scored.append((-s, recency.get(d.get("id"), seen), d))
+        if len(scored) >= limit:
+            break
+    scored.sort(key=lambda x: (x[0], x[1]))
+    results = [d for _, _, d in scored[:limit]]
+    for d in results:
+        for field in added:
+            d.pop(field, None)
+    return results
+
+
+async def backfill_search_index() -> Dict[str, int]:
+    """Kaydı eksik koleksiyonları yeniden indeksle (startup, tek worker).
+
+    Kayıt sayısı belge sayısından farklıysa ya da sort_fields değiştiyse (`spec:<koleksiyon>`
+    kaydı) koleksiyonun tamamı toplu upsert edilir; artık olmayan belgelerin kayıtları silinir.
+    """
+    result = {}
+    for collection, spec in SPECS.items():
+        docs = await db[collection].count_documents({})
+        entries = await db[COLLECTION].count_documents({"collection": collection})
+        meta = await db[COLLECTION].find_one({"_id": f"spec:{collection}"})
+        if entries == docs and meta and meta.get("sort_fields") == list(spec.sort_fields):
+            continue
+        fields = {f: 1 for f, _ in spec.fields}
+        projection = {"_id": 0, "id": 1, **{f: 1 for f in spec.sort_fields}, **fields}
+        seen = set()
+        ops = []
+        async for doc in db[collection].find({"id": {"$exists": True}}, projection):
+            seen.add(doc["id"])
+            ops.append(UpdateOne(
+                {"_id": f"{collection}:{doc['id']}"}, {"$set": _entry(collection, doc)}, upsert=True,
+            ))
+            if len(ops) >= BACKFILL_BATCH:
+                await db[COLLECTION].bulk_write(ops, ordered=False)
+                ops = []
+        stale = [
+            DeleteOne({"_id": e["_id"]})
+            async for e in db[COLLECTION].find({"collection": collection}, {"_id": 1, "ref_id": 1})
+            if e["ref_id"] not in seen
+        ]
+        ops += stale
+        if ops:
+            await db[COLLECTION].bulk_write(ops, ordered=False)
+        await db[COLLECTION].replace_one(
+            {"_id": f"spec:{collection}"}, {"sort_fields": list(spec.sort_fields)}, upsert=True,
+        )
+        result[collection] = len(seen)
+        logger.info(f"Search index backfilled: {collection} ({len(seen)} belge, {len(stale)} eski kayıt silindi)")
+    return result
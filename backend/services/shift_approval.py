@@ -0,0 +1,171 @@
+"""
+Vardiya Onayı — operatör raporlarının (shift_operator_reports) toplu onayı.
+
+Eskiden approve-all her rapor için approve_operator_report'u çağırıyordu: rapor başına
+4-7 ardışık MongoDB işlemi + tamamlanan işlerde senkron WhatsApp gönderimi. Vardiya
+değişiminde 20 rapor saniyeler sürüyordu. Artık tekli ve toplu onay aynı yoldan geçer:
+
+  1. Raporlar tek update_many ile sahiplenilir (status pending → approved,
+     approval_batch = <uuid>). Eşzamanlı iki onay aynı raporu iki kez işleyemez.
+  2. Sahiplenilen raporlar ve işleri iki sorguyla okunur (`approval_batch`, `id $in`).
+  3. İş/makine/defo/vardiya raporu değişiklikleri bellekte hesaplanır (aynı işe ait
+     birden fazla rapor sırayla uygulanır), sonra bulk_write / update_many /
+     insert_many ile paralel yazılır; rollup tek bulk_write (record_batch).
+     Tamamlama ise job_state.transition("complete") ile koşullu yazılır: zaten
+     tamamlanmış işe gelen rapor (veya aynı partide ikinci tamamlama) atlanır, kredi
+     yalnızca geçişi gerçekten yapan iş için verilir.
+  4. WhatsApp bildirimleri outbox'a yazılır (services/notification_outbox.py) — yanıt
+     Twilio'yu beklemez.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Dict
+
+from pymongo import UpdateOne
+
+from database import db
+from models import ShiftEndReport, DefectLog
+from services.change_feed import record_change
+from services.collection_versions import bump_version
+from services.job_queue import bump_queue_version
+from services.job_state import TransitionError, transition
+from services.notifications import send_whatsapp_notification
+from services.production_rollup import record_batch
+
+logger = logging.getLogger(__name__)
+
+
+async def approve_reports(query: dict, approved_by: str) -> dict:
+    """`query` ile eşleşen bekleyen raporları onayla ve etkilerini uygula.
+
+    Dönüş: {approved, completed_jobs, partial_reports} — approved 0 ise hiçbir şey yazılmadı.
+    """
+    batch_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc).isoformat()
+    today = now[:10]
+
+    claimed = await db.shift_operator_reports.update_many(
+        {**query, "status": "pending"},
+        {"$set": {"status": "approved", "approved_at": now, "approved_by": approved_by, "approval_batch": batch_id}},
+    )
+    if claimed.modified_count == 0:
+        return {"approved": 0, "completed_jobs": 0, "partial_reports": 0}
+
+    reports = await db.shift_operator_reports.find(
+        {"approval_batch": batch_id}, {"_id": 0}
+    ).sort("created_at", 1).to_list(None)
+    job_ids = list({r["job_id"] for r in reports if r.get("job_id")})
+    jobs: Dict[str, dict] = {
+        j["id"]: j for j in await db.jobs.find({"id": {"$in": job_ids}}, {"_id": 0}).to_list(None)
+    } if job_ids else {}
+
+    job_sets: Dict[str, dict] = {}
+    idle_machines = set()
+    completing: Dict[str, int] = {}  # job_id → completed_koli
+    rollup_reports, end_reports, defect_logs, messages = [], [], [], []
+
+    def apply(job: dict, update: dict):
+        job.update(update)
+        job_sets.setdefault(job["id"], {}).update(update)
+
+    for report in reports:
+        job = jobs.get(report.get("job_id"))
+        if report.get("is_completed"):
+            if not job:
+                continue
+            if job.get("status") == "completed":
+                # Zaten tamamlanmış (veya bu partide tamamlandı) — ikinci kez kredi verilmez
+                logger.info(f"Tamamlama raporu atlandı, iş zaten tamamlanmış: {job['id']}")
+                continue
+            completed_koli = report.get("target_koli", job.get("koli_count", 0))
+            completing[job["id"]] = completed_koli
+            apply(job, {"status": "completed", "completed_at": now, "completed_koli": completed_koli})
+            idle_machines.add(report["machine_id"])
+            messages.append((job["id"], (
+                f"Is Tamamlandi!\n\nIs: {job['name']}\nMakine: {job['machine_name']}\n"
+                f"Koli: {completed_koli}\nOperator: {report.get('operator_name', '-')}"
+            )))
+            continue
+
+        shift_report = ShiftEndReport(
+            shift_id=report["shift_id"],
+            machine_id=report["machine_id"],
+            machine_name=report["machine_name"],
+            job_id=report.get("job_id"),
+            job_name=report.get("job_name"),
+            target_koli=report.get("target_koli", 0),
+            produced_koli=report.get("produced_koli", 0),
+            remaining_koli=report.get("target_koli", 0) - report.get("produced_koli", 0),
+            defect_kg=report.get("defect_kg", 0),
+            operator_name=(job or {}).get("operator_name", ""),
+        ).model_dump()
+        end_reports.append(shift_report)
+        rollup_reports.append((shift_report, shift_report["operator_name"]))
+
+        if job and job.get("status") != "completed":
+            total_completed = job.get("completed_koli", 0) + report.get("produced_koli", 0)
+            remaining = job.get("koli_count", 0) - total_completed
+            apply(job, {
+                "remaining_koli": remaining if remaining > 0 else 0,
+                "completed_koli": total_completed,
+                "status": "pending"
+            })
+
+        if report.get("defect_kg", 0) > 0:
+            defect_logs.append(DefectLog(
+                machine_id=report["machine_id"],
+                machine_name=report["machine_name"],
+                shift_id=report["shift_id"],
+                defect_kg=report["defect_kg"],
+                date=today
+            ).model_dump())
+        idle_machines.add(report["machine_id"])
+
+    async def complete(jid: str):
+        fields = {k: v for k, v in job_sets[jid].items() if k != "status"}
+        try:
+            before, _ = await transition(jid, "complete", fields=fields)
+        except TransitionError as e:
+            logger.warning(f"Shift approval: {e}")
+            return None
+        return before
+
+    writes = []
+    plain = [UpdateOne({"id": jid}, {"$set": update}) for jid, update in job_sets.items() if jid not in completing]
+    if plain:
+        writes.append(db.jobs.bulk_write(plain, ordered=False))
+    if idle_machines:
+        writes.append(db.machines.update_many(
+            {"id": {"$in": list(idle_machines)}}, {"$set": {"status": "idle", "current_job_id": None}},
+        ))
+    if end_reports:
+        # insert_many dokümanlara _id ekler — yanıtta dönmediği için sorun değil
+        writes.append(db.shift_end_reports.insert_many(end_reports, ordered=False))
+    if defect_logs:
+        writes.append(db.defect_logs.insert_many(defect_logs, ordered=False))
+    await asyncio.gather(*writes)
+    completed = [b for b in await asyncio.gather(*(complete(jid) for jid in completing)) if b]
+    completions = [(b, completing[b["id"]], now, b.get("operator_name", "")) for b in completed]
+    done = {b["id"] for b in completed}
+    await bump_version("shift_operator_reports")
+    await record_change("jobs", job_sets)
+    await record_change("machines", idle_machines)
+
+    # Kısmi raporlar yazıldıktan sonra: tamamlanan işlerin kredisi onları düşer
+    await record_batch(completions, rollup_reports)
+
+    machines = {jobs[jid].get("machine_id") for jid in job_sets if jobs[jid].get("machine_id")}
+    await asyncio.gather(*(bump_queue_version(m) for m in machines), return_exceptions=True)
+
+    for job_id, message in messages:
+        if job_id not in done:
+            continue
+        try:
+            await send_whatsapp_notification(message, dedupe_key=f"job_completed:{job_id}:whatsapp")
+        except Exception as e:
+            logger.error(f"WhatsApp enqueue error: {e}")
+
+    logger.info(f"Shift approval batch {batch_id[:8]}: {len(reports)} rapor, {len(completions)} tamamlanan iş")
+    return {"approved": len(reports), "completed_jobs": len(completions), "partial_reports": len(end_reports)}
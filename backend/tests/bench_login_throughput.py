@@ -0,0 +1,121 @@
+"""
+Login throughput benchmark — bcrypt'in event loop'u bloklamasının etkisi.
+
+pytest tarafından toplanmaz (test_ öneki yok); elle çalıştırılır.
+
+1) local: sunucu gerektirmez. Aynı event loop üzerinde N eşzamanlı "login"
+   (bcrypt verify) çalıştırır; senkron çağrı (eski davranış) ile CPU executor
+   (services.cpu_executor.run_cpu) karşılaştırılır. Ayrıca bu sürede loop'un
+   ne kadar geciktiği (heartbeat lag) ölçülür.
+
+    cd backend && python tests/bench_login_throughput.py local --concurrency 32
+
+2) http: çalışan bir backend'e eşzamanlı /api/users/login istekleri atar.
+   Deploy öncesi ve sonrası çalıştırılarak karşılaştırılır.
+
+    REACT_APP_BACKEND_URL=https://... python tests/bench_login_throughput.py http \\
+        --username ali --password 134679 --role operator --concurrency 32 --total 256
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+def _report(label, elapsed, latencies, total):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{label:<12} {total / elapsed:8.1f} login/s   p50 {p50:7.1f} ms   p95 {p95:7.1f} ms")
+
+
+async def _heartbeat(stop: asyncio.Event, lags: list, interval: float = 0.01):
+    """Loop gecikmesi: 10 ms'lik uykunun ne kadar geç uyandığı."""
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - t - interval)
+
+
+async def _run_local(mode: str, hashed: bytes, concurrency: int, total: int):
+    import bcrypt
+    from services.cpu_executor import run_cpu
+
+    latencies, lags = [], []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            t = time.perf_counter()
+            if mode == "sync":
+                bcrypt.checkpw(b"134679", hashed)
+            else:
+                await run_cpu(bcrypt.checkpw, b"134679", hashed)
+            latencies.append(time.perf_counter() - t)
+
+    stop = asyncio.Event()
+    hb = asyncio.create_task(_heartbeat(stop, lags))
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await hb
+    _report(mode, elapsed, latencies, total)
+    if lags:
+        print(f"{'':<12} loop lag max {max(lags) * 1000:7.1f} ms")
+
+
+def bench_local(args):
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "bench")
+    import bcrypt
+    hashed = bcrypt.hashpw(b"134679", bcrypt.gensalt())
+    print(f"local: {args.total} verify, concurrency {args.concurrency}, cpu_count {os.cpu_count()}")
+    asyncio.run(_run_local("sync", hashed, args.concurrency, args.total))
+    asyncio.run(_run_local("executor", hashed, args.concurrency, args.total))
+
+
+def bench_http(args):
+    import requests
+
+    if not BASE_URL:
+        sys.exit("REACT_APP_BACKEND_URL gerekli")
+    payload = {"username": args.username, "password": args.password}
+    if args.role:
+        payload["role"] = args.role
+
+    def one(_):
+        t = time.perf_counter()
+        r = requests.post(f"{BASE_URL}/api/users/login", json=payload, timeout=60)
+        return r.status_code, time.perf_counter() - t
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        t0 = time.perf_counter()
+        results = list(pool.map(one, range(args.total)))
+        elapsed = time.perf_counter() - t0
+    failures = [s for s, _ in results if s != 200]
+    if failures:
+        print(f"Uyarı: {len(failures)} başarısız yanıt (ör. {failures[0]}) — rate limit 120/dk olabilir")
+    _report("http", elapsed, [lat for _, lat in results], args.total)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Eşzamanlı login throughput benchmark")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    p_local = sub.add_parser("local")
+    p_http = sub.add_parser("http")
+    for p in (p_local, p_http):
+        p.add_argument("--concurrency", type=int, default=16)
+        p.add_argument("--total", type=int, default=64)
+    p_http.add_argument("--username", required=True)
+    p_http.add_argument("--password", required=True)
+    p_http.add_argument("--role")
+    args = parser.parse_args()
+    bench_local(args) if args.mode == "local" else bench_http(args)
@@ -0,0 +1,65 @@
+"""
+Audit log sorgu API — GET /api/audit-logs filtreleri, keyset sayfalama ve arşivler.
+
+Covers:
+- entity_type / action filtresi sadece eşleşen kayıtları döndürür
+- `after` ile keyset sayfalama: sayfalar çakışmaz, sıralama (created_at, id) azalan
+- next_after body'de ve X-Next-After header'ında aynı
+- Geçersiz after / archive → 400
+- GET /api/audit-logs/archives listesi
+"""
+import os
+import pytest
+import requests
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="session")
+def mgmt_token():
+    r = requests.post(f"{BASE_URL}/api/management/login", json={"password": "buse11993"}, timeout=15)
+    if r.status_code != 200:
+        pytest.skip(f"Management login failed: {r.status_code} {r.text}")
+    return r.json().get("token")
+
+
+def _h(tok):
+    return {"Authorization": f"Bearer {tok}"}
+
+
+def _get(tok, **params):
+    r = requests.get(f"{BASE_URL}/api/audit-logs", headers=_h(tok), params=params, timeout=15)
+    assert r.status_code == 200, r.text
+    return r
+
+
+class TestAuditQuery:
+    def test_01_filter_by_entity_type(self, mgmt_token):
+        data = _get(mgmt_token, entity_type="job", limit=20).json()
+        assert "total" in data
+        assert all(log["entity_type"] == "job" for log in data["logs"])
+
+    def test_02_keyset_pages_do_not_overlap(self, mgmt_token):
+        first = _get(mgmt_token, limit=3)
+        data = first.json()
+        if not data["next_after"]:
+            pytest.skip("Sayfalama için yeterli audit kaydı yok")
+        assert first.headers.get("X-Next-After") == data["next_after"]
+        second = _get(mgmt_token, limit=3, after=data["next_after"]).json()
+        assert "total" not in second
+        ids = [log["id"] for log in data["logs"]]
+        assert not set(ids) & {log["id"] for log in second["logs"]}
+        keys = [(log["created_at"], log["id"]) for log in data["logs"] + second["logs"]]
+        assert keys == sorted(keys, reverse=True)
+
+    def test_03_invalid_params(self, mgmt_token):
+        r = requests.get(f"{BASE_URL}/api/audit-logs", headers=_h(mgmt_token), params={"after": "x"}, timeout=15)
+        assert r.status_code == 400
+        r = requests.get(f"{BASE_URL}/api/audit-logs", headers=_h(mgmt_token), params={"archive": "2024-13"}, timeout=15)
+        assert r.status_code == 400
+
+    def test_04_archives_listing(self, mgmt_token):
+        r = requests.get(f"{BASE_URL}/api/audit-logs/archives", headers=_h(mgmt_token), timeout=15)
+        assert r.status_code == 200, r.text
+        for archive in r.json()["archives"]:
+            assert len(archive["month"]) == 7 and archive["count"] >= 0
@@ -0,0 +1,136 @@
+"""
+Tamponlu audit sink (services/audit.py) — sunucusuz birim testleri, sahte koleksiyonla.
+
+Covers:
+- flush tamponu batch_size'lık insert_many partilerine böler
+- Tampon queue_max'ta dolar, fazlası `dropped` sayacına yazılır
+- Ağ hatasında parti _id'leriyle tampona geri konur; sunucu yazmışsa retry duplicate
+  key alır ve kayıt çoğalmaz
+- Kısmi BulkWriteError'da sadece duplicate olmayan hatalı kayıtlar geri konur
+- log_audit kaydın _id'sini id ile aynı verir
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+from pymongo.errors import AutoReconnect, BulkWriteError  # noqa: E402
+
+from services import audit  # noqa: E402
+
+
+class FakeCollection:
+    """_id tekilliği olan insert_many; fail_next ile bir sonraki çağrı hatası ayarlanır."""
+
+    def __init__(self):
+        self.docs = {}
+        self.calls = []
+        self.fail_next = None  # "network" | ("reject", {index, ...})
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls.append(len(docs))
+        failure, self.fail_next = self.fail_next, None
+        reject = failure[1] if isinstance(failure, tuple) else set()
+        errors = []
+        for i, doc in enumerate(docs):
+            if i in reject:
+                errors.append({"index": i, "code": 121, "errmsg": "validation"})
+            elif doc["_id"] in self.docs:
+                errors.append({"index": i, "code": 11000, "errmsg": "duplicate key"})
+            else:
+                self.docs[doc["_id"]] = dict(doc)
+        if failure == "network":
+            raise AutoReconnect("connection reset")
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(docs) - len(errors)})
+
+    async def insert_one(self, doc):
+        await self.insert_many([doc])
+
+
+class FakeDB:
+    def __init__(self):
+        self.audit_logs = FakeCollection()
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = FakeDB()
+    monkeypatch.setattr(audit, "db", fake)
+    return fake
+
+
+def _doc(n):
+    return {"_id": f"a{n}", "id": f"a{n}", "user": "test", "action": "update", "entity_type": "job"}
+
+
+def test_flush_batches(fake_db):
+    sink = audit.AuditSink(batch_size=100, queue_max=1000)
+    for n in range(250):
+        sink.submit(_doc(n))
+    asyncio.run(sink.flush())
+    assert fake_db.audit_logs.calls == [100, 100, 50]
+    assert sink.stats()["queue_depth"] == 0
+    assert sink.written == 250
+
+
+def test_overflow_drops(fake_db):
+    sink = audit.AuditSink(batch_size=100, queue_max=5)
+    for n in range(8):
+        sink.submit(_doc(n))
+    stats = sink.stats()
+    assert stats["queue_depth"] == 5
+    assert stats["dropped"] == 3
+
+
+def test_network_error_requeue_is_idempotent(fake_db):
+    sink = audit.AuditSink(batch_size=10, queue_max=100)
+    for n in range(4):
+        sink.submit(_doc(n))
+    # Sunucu yazdı ama yanıt kayboldu
+    fake_db.audit_logs.fail_next = "network"
+    asyncio.run(sink.flush())
+    assert sink.failed_batches == 1
+    assert sink.stats()["queue_depth"] == 4
+    assert all("_id" in d for d in sink._buffer)
+
+    asyncio.run(sink.flush())
+    assert sink.stats()["queue_depth"] == 0
+    assert len(fake_db.audit_logs.docs) == 4
+    assert sink.written == 4
+
+
+def test_partial_bulk_error_requeues_failed_only(fake_db):
+    sink = audit.AuditSink(batch_size=10, queue_max=100)
+    for n in range(5):
+        sink.submit(_doc(n))
+    fake_db.audit_logs.fail_next = ("reject", {1, 3})
+    asyncio.run(sink.flush())
+    assert [d["_id"] for d in sink._buffer] == ["a1", "a3"]
+    assert sink.written == 3
+
+    asyncio.run(sink.flush())
+    assert sorted(fake_db.audit_logs.docs) == ["a0", "a1", "a2", "a3", "a4"]
+    assert sink.stats()["queue_depth"] == 0
+
+
+def test_requeue_respects_queue_max(fake_db):
+    sink = audit.AuditSink(batch_size=4, queue_max=6)
+    for n in range(6):
+        sink.submit(_doc(n))
+    fake_db.audit_logs.fail_next = "network"
+    asyncio.run(sink.flush())
+    # İlk parti (4) geri konur; kalan 2 ile toplam kapasite içinde
+    assert sink.stats()["queue_depth"] == 6
+    assert sink.dropped == 0
+
+
+def test_log_audit_uses_id_as_primary_key(fake_db):
+    asyncio.run(audit.log_audit("test", "create", "job", "X"))
+    (doc,) = fake_db.audit_logs.docs.values()
+    assert doc["_id"] == doc["id"]
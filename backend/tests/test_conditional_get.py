@@ -0,0 +1,68 @@
+"""
+Conditional GET — ETag + If-None-Match → 304 (middleware/conditional_get.py).
+
+Covers:
+- /api/machines (sürüm modu) ETag + Cache-Control döner, aynı ETag ile 304 ve boş gövde
+- Token olmadan If-None-Match 304 vermez (401)
+- Bakım durumu değişince ETag değişir
+- /api/jobs (içerik modu) ETag + 304
+"""
+import os
+import pytest
+import requests
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="session")
+def mgmt_token():
+    r = requests.post(f"{BASE_URL}/api/management/login", json={"password": "buse11993"}, timeout=15)
+    if r.status_code != 200:
+        pytest.skip(f"Management login failed: {r.status_code} {r.text}")
+    return r.json().get("token")
+
+
+def _h(tok, **extra):
+    return {"Authorization": f"Bearer {tok}", **extra}
+
+
+class TestConditionalGet:
+    def test_01_machines_etag_304(self, mgmt_token):
+        r = requests.get(f"{BASE_URL}/api/machines", headers=_h(mgmt_token), timeout=15)
+        assert r.status_code == 200, r.text
+        etag = r.headers.get("ETag")
+        assert etag and etag.startswith('"')
+        assert "no-cache" in r.headers.get("Cache-Control", "")
+        r2 = requests.get(f"{BASE_URL}/api/machines", headers=_h(mgmt_token, **{"If-None-Match": etag}), timeout=15)
+        assert r2.status_code == 304
+        assert r2.content == b""
+        assert r2.headers.get("ETag") == etag
+
+    def test_02_no_token_no_304(self, mgmt_token):
+        etag = requests.get(f"{BASE_URL}/api/machines", headers=_h(mgmt_token), timeout=15).headers["ETag"]
+        r = requests.get(f"{BASE_URL}/api/machines", headers={"If-None-Match": etag}, timeout=15)
+        assert r.status_code in (401, 403)
+
+    def test_03_write_changes_etag(self, mgmt_token):
+        machines = requests.get(f"{BASE_URL}/api/machines", headers=_h(mgmt_token), timeout=15)
+        if not machines.json():
+            pytest.skip("Makine yok")
+        etag = machines.headers["ETag"]
+        machine = machines.json()[0]
+        r = requests.put(f"{BASE_URL}/api/machines/{machine['id']}/maintenance", headers=_h(mgmt_token),
+                         json={"maintenance": bool(machine.get("maintenance"))}, timeout=15)
+        assert r.status_code == 200, r.text
+        r2 = requests.get(f"{BASE_URL}/api/machines", headers=_h(mgmt_token, **{"If-None-Match": etag}), timeout=15)
+        assert r2.status_code == 200
+        assert r2.headers["ETag"] != etag
+
+    def test_04_jobs_content_etag(self, mgmt_token):
+        r = requests.get(f"{BASE_URL}/api/jobs", params={"limit": 5}, headers=_h(mgmt_token), timeout=15)
+        assert r.status_code == 200, r.text
+        etag = r.headers["ETag"]
+        r2 = requests.get(f"{BASE_URL}/api/jobs", params={"limit": 5},
+                          headers=_h(mgmt_token, **{"If-None-Match": etag}), timeout=15)
+        # Arada başka bir test iş yazdıysa 200 de geçerli
+        assert r2.status_code in (200, 304)
+        if r2.status_code == 304:
+            assert r2.content == b""
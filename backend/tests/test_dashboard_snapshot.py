@@ -0,0 +1,68 @@
+"""
+Canlı pano snapshot'ı — GET /api/dashboard/live bellekten döner.
+
+Covers:
+- Ardışık istekler aynı snapshot'ı kullanır (computations artmaz)
+- Pano verisini etkileyen yazma (yeni iş) sonrası snapshot yenilenir
+- /api/dashboard/live/stats metrik alanları
+"""
+import os
+import time
+import uuid
+import pytest
+import requests
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="session")
+def mgmt_token():
+    r = requests.post(f"{BASE_URL}/api/management/login", json={"password": "buse11993"}, timeout=15)
+    if r.status_code != 200:
+        pytest.skip(f"Management login failed: {r.status_code} {r.text}")
+    return r.json().get("token")
+
+
+def _h(tok):
+    return {"Authorization": f"Bearer {tok}"}
+
+
+def _live(tok):
+    r = requests.get(f"{BASE_URL}/api/dashboard/live", headers=_h(tok), timeout=15)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _stats(tok):
+    r = requests.get(f"{BASE_URL}/api/dashboard/live/stats", headers=_h(tok), timeout=15)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+class TestDashboardSnapshot:
+    def test_01_stats_fields(self, mgmt_token):
+        _live(mgmt_token)
+        stats = _stats(mgmt_token)
+        for key in ("version", "computations", "stale", "age_seconds", "subscribers"):
+            assert key in stats
+
+    def test_02_repeated_reads_share_snapshot(self, mgmt_token):
+        first = _live(mgmt_token)
+        second = _live(mgmt_token)
+        # Birden fazla worker varsa istekler farklı worker'lara düşebilir; aynı worker'da timestamp aynı kalır
+        if first["timestamp"] != second["timestamp"]:
+            pytest.skip("İstekler farklı worker'lara düştü")
+        assert first == second
+
+    def test_03_write_refreshes_snapshot(self, mgmt_token):
+        before = _live(mgmt_token)["summary"]["pending_total"]
+        r = requests.post(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), json={
+            "name": f"TEST_DS_{uuid.uuid4().hex[:6]}", "koli_count": 5, "colors": "Mavi",
+        }, timeout=15)
+        assert r.status_code == 200, r.text
+        job_id = r.json()["id"]
+        try:
+            time.sleep(1.5)
+            assert _live(mgmt_token)["summary"]["pending_total"] >= min(before + 1, 200)
+        finally:
+            requests.delete(f"{BASE_URL}/api/jobs/{job_id}", headers=_h(mgmt_token), timeout=15)
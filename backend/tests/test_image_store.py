@@ -0,0 +1,139 @@
+"""
+İçerik adresli görsel deposu — upload artık base64 yerine /api/images/<sha256> referansı döner.
+
+Covers:
+- POST /api/upload/image → url = /api/images/<sha256>, aynı içerik aynı referans (dedupe)
+- GET /api/images/<sha> kimliksiz, immutable Cache-Control + ETag, If-None-Match → 304
+- Range → 206 + Content-Range, geçersiz aralık → 416
+- Eski data URL ile oluşturulan iş referansa çevrilir; has_image/image_size/image_sha256 dokümanda
+- GET /api/jobs/{id}/image: varsayılan JSON, Accept image/* → görselin kendisi
+- ?w=320 küçük varyant: Accept'e göre WebP/JPEG, genişlik kovaya yuvarlanır
+"""
+import base64
+import hashlib
+import io
+import os
+import uuid
+import pytest
+import requests
+from PIL import Image
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="session")
+def mgmt_token():
+    r = requests.post(f"{BASE_URL}/api/management/login", json={"password": "buse11993"}, timeout=15)
+    if r.status_code != 200:
+        pytest.skip(f"Management login failed: {r.status_code} {r.text}")
+    return r.json().get("token")
+
+
+def _h(tok):
+    return {"Authorization": f"Bearer {tok}"}
+
+
+@pytest.fixture(scope="module")
+def png_bytes():
+    return b"\x89PNG\r\n\x1a\n" + os.urandom(4096)
+
+
+@pytest.fixture(scope="module")
+def uploaded(mgmt_token, png_bytes):
+    r = requests.post(f"{BASE_URL}/api/upload/image", headers=_h(mgmt_token),
+                      files={"file": ("TEST_a.png", png_bytes, "image/png")}, timeout=30)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+class TestImageStore:
+    def test_upload_returns_reference(self, uploaded, png_bytes):
+        sha = hashlib.sha256(png_bytes).hexdigest()
+        assert uploaded["sha256"] == sha
+        assert uploaded["url"] == f"/api/images/{sha}"
+
+    def test_upload_dedupe(self, mgmt_token, uploaded, png_bytes):
+        r = requests.post(f"{BASE_URL}/api/upload/image", headers=_h(mgmt_token),
+                          files={"file": ("TEST_b.png", png_bytes, "image/png")}, timeout=30)
+        assert r.status_code == 200
+        assert r.json()["url"] == uploaded["url"]
+
+    def test_public_get_etag_304(self, uploaded, png_bytes):
+        r = requests.get(f"{BASE_URL}{uploaded['url']}", timeout=15)
+        assert r.status_code == 200
+        assert r.content == png_bytes
+        assert "immutable" in r.headers.get("Cache-Control", "")
+        etag = r.headers["ETag"]
+        r2 = requests.get(f"{BASE_URL}{uploaded['url']}", headers={"If-None-Match": etag}, timeout=15)
+        assert r2.status_code == 304
+
+    def test_range(self, uploaded, png_bytes):
+        r = requests.get(f"{BASE_URL}{uploaded['url']}", headers={"Range": "bytes=0-7"}, timeout=15)
+        assert r.status_code == 206
+        assert r.content == png_bytes[:8]
+        assert r.headers["Content-Range"] == f"bytes 0-7/{len(png_bytes)}"
+        r2 = requests.get(f"{BASE_URL}{uploaded['url']}", headers={"Range": "bytes=999999-"}, timeout=15)
+        assert r2.status_code == 416
+
+    def test_unknown_image_404(self):
+        r = requests.get(f"{BASE_URL}/api/images/{'0' * 64}", timeout=15)
+        assert r.status_code == 404
+
+    def test_job_legacy_data_url_normalized(self, mgmt_token, uploaded, png_bytes):
+        data_url = "data:image/png;base64," + base64.b64encode(png_bytes).decode()
+        payload = {
+            "name": f"TEST_IMG_{uuid.uuid4().hex[:6]}", "koli_count": 1, "colors": "Kırmızı",
+            "machine_id": "test-machine", "machine_name": "Test", "image_url": data_url,
+        }
+        r = requests.post(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), json=payload, timeout=15)
+        assert r.status_code == 200, r.text
+        jid = r.json()["id"]
+        try:
+            assert r.json()["image_url"] == uploaded["url"]
+            assert r.json()["has_image"] is True
+            assert r.json()["image_size"] == len(png_bytes)
+            assert r.json()["image_sha256"] == uploaded["sha256"]
+            lr = requests.get(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token),
+                              params={"machine_id": "test-machine", "fields": "has_image"}, timeout=15)
+            assert any(j["id"] == jid and j["has_image"] is True for j in lr.json())
+            ir = requests.get(f"{BASE_URL}/api/jobs/{jid}/image", headers=_h(mgmt_token), timeout=15)
+            assert ir.json()["image_url"] == uploaded["url"]
+            br = requests.get(f"{BASE_URL}/api/jobs/{jid}/image",
+                              headers={**_h(mgmt_token), "Accept": "image/*"}, timeout=15)
+            assert br.status_code == 200
+            assert br.content == png_bytes
+        finally:
+            requests.delete(f"{BASE_URL}/api/jobs/{jid}", headers=_h(mgmt_token), timeout=15)
+
+
+@pytest.fixture(scope="module")
+def uploaded_photo(mgmt_token):
+    buf = io.BytesIO()
+    Image.effect_noise((1600, 1200), 40).convert("RGB").save(buf, "JPEG")
+    r = requests.post(f"{BASE_URL}/api/upload/image", headers=_h(mgmt_token),
+                      files={"file": ("TEST_photo.jpg", buf.getvalue(), "image/jpeg")}, timeout=30)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+class TestImageVariants:
+    def test_webp_thumbnail(self, uploaded_photo):
+        r = requests.get(f"{BASE_URL}{uploaded_photo['url']}?w=300",
+                         headers={"Accept": "image/avif,image/webp,*/*"}, timeout=30)
+        assert r.status_code == 200
+        assert r.headers["Content-Type"] == "image/webp"
+        assert "Accept" in r.headers.get("Vary", "")
+        assert Image.open(io.BytesIO(r.content)).size[0] == 320
+        r2 = requests.get(f"{BASE_URL}{uploaded_photo['url']}?w=300",
+                          headers={"Accept": "image/webp", "If-None-Match": r.headers["ETag"]}, timeout=15)
+        assert r2.status_code == 304
+
+    def test_jpeg_fallback(self, uploaded_photo):
+        r = requests.get(f"{BASE_URL}{uploaded_photo['url']}?w=640", headers={"Accept": "image/*"}, timeout=30)
+        assert r.status_code == 200
+        assert r.headers["Content-Type"] == "image/jpeg"
+        assert Image.open(io.BytesIO(r.content)).size[0] == 640
+
+    def test_invalid_width(self, uploaded_photo):
+        r = requests.get(f"{BASE_URL}{uploaded_photo['url']}?w=0", timeout=15)
+        assert r.status_code == 422
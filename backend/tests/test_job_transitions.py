@@ -0,0 +1,84 @@
+"""
+İş durum geçişleri — services/job_state.py üzerinden koşullu güncellemeler.
+
+Covers:
+- start → pause → resume → complete akışı, yanıtta güncel `job`
+- Çift dokunuş: ikinci start/complete 409, ikinci pause 400 (tek kez uygulanır)
+- Makinede aktif iş varken resume 400 ve iş paused kalır
+- Bekleyen işi doğrudan tamamlamak çalışan makineyi boşa düşürmez
+"""
+import os
+import uuid
+import pytest
+import requests
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="session")
+def mgmt_token():
+    r = requests.post(f"{BASE_URL}/api/management/login", json={"password": "buse11993"}, timeout=15)
+    if r.status_code != 200:
+        pytest.skip(f"Management login failed: {r.status_code} {r.text}")
+    return r.json().get("token")
+
+
+def _h(tok):
+    return {"Authorization": f"Bearer {tok}"}
+
+
+@pytest.fixture
+def machine_jobs(mgmt_token):
+    machine_id = f"TEST_TR_{uuid.uuid4().hex[:6]}"
+    ids = []
+    for i in range(2):
+        r = requests.post(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), json={
+            "name": f"TEST_TR_{i}", "koli_count": 20, "colors": "Mavi",
+            "machine_id": machine_id, "machine_name": "Test",
+        }, timeout=15)
+        assert r.status_code == 200, r.text
+        ids.append(r.json()["id"])
+    yield ids
+    for jid in ids:
+        requests.delete(f"{BASE_URL}/api/jobs/{jid}", headers=_h(mgmt_token), timeout=15)
+
+
+def _put(tok, job_id, action, body=None):
+    return requests.put(f"{BASE_URL}/api/jobs/{job_id}/{action}", headers=_h(tok), json=body or {}, timeout=15)
+
+
+class TestJobTransitions:
+    def test_lifecycle_and_double_taps(self, mgmt_token, machine_jobs):
+        jid = machine_jobs[0]
+        r = _put(mgmt_token, jid, "start", {"operator_name": "TEST_OP"})
+        assert r.status_code == 200, r.text
+        assert r.json()["job"]["status"] == "in_progress"
+        assert _put(mgmt_token, jid, "start", {"operator_name": "TEST_OP"}).status_code == 409
+
+        r = _put(mgmt_token, jid, "pause", {"pause_reason": "test", "produced_koli": 5})
+        assert r.status_code == 200
+        assert r.json()["job"]["status"] == "paused"
+        assert _put(mgmt_token, jid, "pause", {"pause_reason": "test"}).status_code == 400
+
+        r = _put(mgmt_token, jid, "resume", {})
+        assert r.status_code == 200
+        assert r.json()["job"]["operator_name"] == "TEST_OP"
+
+        r = _put(mgmt_token, jid, "complete", {"completed_koli": 12})
+        assert r.status_code == 200
+        assert r.json()["job"]["completed_koli"] == 12
+        assert _put(mgmt_token, jid, "complete").status_code == 409
+
+    def test_resume_blocked_by_active_job(self, mgmt_token, machine_jobs):
+        a, b = machine_jobs
+        assert _put(mgmt_token, a, "start", {"operator_name": "TEST_OP"}).status_code == 200
+        assert _put(mgmt_token, a, "pause", {"pause_reason": "test"}).status_code == 200
+        assert _put(mgmt_token, b, "start", {"operator_name": "TEST_OP"}).status_code == 200
+
+        r = _put(mgmt_token, a, "resume", {})
+        assert r.status_code == 400
+        jobs = requests.get(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), params={"status": "paused"}, timeout=15).json()
+        assert any(j["id"] == a for j in jobs)
+
+    def test_unknown_job(self, mgmt_token):
+        assert _put(mgmt_token, "TEST_NO_SUCH_JOB", "complete").status_code == 404
@@ -0,0 +1,86 @@
+"""
+GET /api/jobs keyset sayfalama ve sparse fieldset.
+
+Covers:
+- limit ile sayfa boyutu; sayfa doluysa X-Next-After header'ı döner
+- after=<created_at,id> ile sayfalar çakışmadan ve sırayı koruyarak ilerler
+- fields=id,name → sadece istenen kolonlar (+ id, created_at)
+- Bilinmeyen alan / bozuk imleç 400, limit=0 422
+- Parametresiz çağrı eskisi gibi liste döner
+"""
+import os
+import uuid
+import pytest
+import requests
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="session")
+def mgmt_token():
+    r = requests.post(f"{BASE_URL}/api/management/login", json={"password": "buse11993"}, timeout=15)
+    if r.status_code != 200:
+        pytest.skip(f"Management login failed: {r.status_code} {r.text}")
+    return r.json().get("token")
+
+
+def _h(tok):
+    return {"Authorization": f"Bearer {tok}"}
+
+
+@pytest.fixture(scope="module")
+def test_jobs(mgmt_token):
+    machine_id = f"TEST_PAGE_{uuid.uuid4().hex[:6]}"
+    ids = []
+    for i in range(5):
+        r = requests.post(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), json={
+            "name": f"TEST_PAGE_{i}", "koli_count": 1, "colors": "Mavi",
+            "machine_id": machine_id, "machine_name": "Test",
+        }, timeout=15)
+        assert r.status_code == 200, r.text
+        ids.append(r.json()["id"])
+    yield machine_id, ids
+    for jid in ids:
+        requests.delete(f"{BASE_URL}/api/jobs/{jid}", headers=_h(mgmt_token), timeout=15)
+
+
+class TestJobsPagination:
+    def test_walk_pages(self, mgmt_token, test_jobs):
+        machine_id, ids = test_jobs
+        seen, after = [], None
+        for _ in range(10):
+            params = {"machine_id": machine_id, "limit": 2}
+            if after:
+                params["after"] = after
+            r = requests.get(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), params=params, timeout=15)
+            assert r.status_code == 200
+            page = r.json()
+            assert len(page) <= 2
+            seen += [j["id"] for j in page]
+            after = r.headers.get("X-Next-After")
+            if not after:
+                break
+        assert sorted(seen) == sorted(ids)
+        assert len(seen) == len(set(seen))
+
+    def test_sparse_fields(self, mgmt_token, test_jobs):
+        machine_id, _ = test_jobs
+        r = requests.get(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token),
+                         params={"machine_id": machine_id, "fields": "name"}, timeout=15)
+        assert r.status_code == 200
+        for j in r.json():
+            assert set(j) == {"id", "name", "created_at"}
+
+    def test_invalid_params(self, mgmt_token):
+        r = requests.get(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), params={"fields": "nope"}, timeout=15)
+        assert r.status_code == 400
+        r = requests.get(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), params={"after": "bozuk"}, timeout=15)
+        assert r.status_code == 400
+        r = requests.get(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), params={"limit": 0}, timeout=15)
+        assert r.status_code == 422
+
+    def test_legacy_list(self, mgmt_token, test_jobs):
+        r = requests.get(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), timeout=30)
+        assert r.status_code == 200
+        assert isinstance(r.json(), list)
+        assert "X-Next-After" not in r.headers
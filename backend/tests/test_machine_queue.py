@@ -0,0 +1,75 @@
+"""
+Makine kuyruğu API — GET /api/machines/{id}/queue.
+
+Covers:
+- Bekleyen işler `order` sırasıyla döner, `next` kuyruğun başıdır
+- Özet: pending_count, pending_remaining_koli, version alanları
+- limit parametresi liste boyunu sınırlar
+- image_url kuyruk payload'ında yok
+- Kimliksiz istek 401/403
+"""
+import os
+import uuid
+import pytest
+import requests
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="session")
+def mgmt_token():
+    r = requests.post(f"{BASE_URL}/api/management/login", json={"password": "buse11993"}, timeout=15)
+    if r.status_code != 200:
+        pytest.skip(f"Management login failed: {r.status_code} {r.text}")
+    return r.json().get("token")
+
+
+def _h(tok):
+    return {"Authorization": f"Bearer {tok}"}
+
+
+@pytest.fixture(scope="module")
+def queue(mgmt_token):
+    machine_id = f"TEST_MQ_{uuid.uuid4().hex[:6]}"
+    ids = []
+    for i in range(3):
+        r = requests.post(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), json={
+            "name": f"TEST_MQ_{i}", "koli_count": 10, "colors": "Mavi",
+            "machine_id": machine_id, "machine_name": "Test",
+        }, timeout=15)
+        assert r.status_code == 200, r.text
+        ids.append(r.json()["id"])
+    # Ters sıraya diz: son oluşturulan başa
+    requests.put(f"{BASE_URL}/api/jobs/reorder-batch", headers=_h(mgmt_token),
+                 json={"jobs": [{"job_id": j, "order": len(ids) - i} for i, j in enumerate(ids)]}, timeout=15)
+    yield machine_id, ids
+    for jid in ids:
+        requests.delete(f"{BASE_URL}/api/jobs/{jid}", headers=_h(mgmt_token), timeout=15)
+
+
+class TestMachineQueue:
+    def test_queue_order_and_summary(self, mgmt_token, queue):
+        machine_id, ids = queue
+        r = requests.get(f"{BASE_URL}/api/machines/{machine_id}/queue", headers=_h(mgmt_token), timeout=15)
+        assert r.status_code == 200, r.text
+        data = r.json()
+        assert [j["id"] for j in data["pending"]] == list(reversed(ids))
+        assert data["next"]["id"] == ids[-1]
+        assert data["active"] is None
+        assert data["summary"]["pending_count"] == 3
+        assert data["summary"]["pending_remaining_koli"] == 30
+        assert isinstance(data["version"], int)
+        assert all("image_url" not in j for j in data["pending"])
+
+    def test_limit(self, mgmt_token, queue):
+        machine_id, _ = queue
+        r = requests.get(f"{BASE_URL}/api/machines/{machine_id}/queue", headers=_h(mgmt_token),
+                         params={"limit": 1}, timeout=15)
+        assert r.status_code == 200
+        assert len(r.json()["pending"]) == 1
+        assert r.json()["summary"]["pending_count"] == 3
+
+    def test_requires_auth(self, queue):
+        machine_id, _ = queue
+        r = requests.get(f"{BASE_URL}/api/machines/{machine_id}/queue", timeout=15)
+        assert r.status_code in (401, 403)
@@ -0,0 +1,144 @@
+"""
+production_daily rollup — analitik endpoint'leri artık ham jobs yerine rollup okur.
+
+Covers:
+- POST /api/admin/analytics/rebuild-rollup (yonetim) rows/deleted döner — testler yalnız
+  bugünü (UTC) yeniden hesaplar, paylaşılan sunucuda tüm rollup'a dokunmaz
+- Geçersiz tarih formatı 400
+- Rebuild öncesi/sonrası /analytics/weekly ve /analytics/daily-by-week aynı sonucu verir
+- complete_job rollup'ı artımlı günceller (daily total_koli iş kadar artar)
+- Tamamlanmış işin completed_koli düzenlemesi ve silinmesi rollup'tan düşülür
+- Operatör kırılımı (/dashboard/live operator_ranking) rebuild sonrası değişmez
+"""
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytest
+import requests
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="session")
+def mgmt_token():
+    r = requests.post(f"{BASE_URL}/api/management/login", json={"password": "buse11993"}, timeout=15)
+    if r.status_code != 200:
+        pytest.skip(f"Management login failed: {r.status_code} {r.text}")
+    return r.json().get("token")
+
+
+def _h(tok):
+    return {"Authorization": f"Bearer {tok}"}
+
+
+def _today_koli(tok):
+    r = requests.get(f"{BASE_URL}/api/analytics/daily", headers=_h(tok), timeout=15)
+    return r.json()["daily_stats"][-1]["total_koli"]
+
+
+def _rebuild(tok):
+    today = datetime.now(timezone.utc).date()
+    r = requests.post(f"{BASE_URL}/api/admin/analytics/rebuild-rollup", headers=_h(tok), timeout=60, params={
+        "start": today.isoformat(), "end": (today + timedelta(days=1)).isoformat(),
+    })
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _ranking(tok):
+    # Pano snapshot'ı dirty debounce'undan sonra yenilenir
+    time.sleep(1.5)
+    r = requests.get(f"{BASE_URL}/api/dashboard/live", headers=_h(tok), timeout=15)
+    assert r.status_code == 200, r.text
+    return {o["name"]: (o["jobs"], o["koli"]) for o in r.json()["operator_ranking"]}
+
+
+def _create_job(tok, koli):
+    machines = requests.get(f"{BASE_URL}/api/machines", headers=_h(tok), timeout=15).json()
+    if not machines:
+        pytest.skip("Makine yok")
+    m = machines[0]
+    return requests.post(f"{BASE_URL}/api/jobs", headers=_h(tok), json={
+        "name": f"TEST_ROLLUP_{uuid.uuid4().hex[:6]}", "koli_count": koli, "colors": "-",
+        "machine_id": m["id"], "machine_name": m["name"],
+    }, timeout=15).json()
+
+
+class TestProductionRollup:
+    def test_rebuild_rollup(self, mgmt_token):
+        data = _rebuild(mgmt_token)
+        assert data["success"] is True
+        assert "rows" in data and "deleted" in data
+
+    def test_rebuild_rollup_invalid_date(self, mgmt_token):
+        r = requests.post(f"{BASE_URL}/api/admin/analytics/rebuild-rollup?start=31-12-2026",
+                          headers=_h(mgmt_token), timeout=15)
+        assert r.status_code == 400
+
+    def test_rebuild_keeps_analytics_stable(self, mgmt_token):
+        before_weekly = requests.get(f"{BASE_URL}/api/analytics/weekly", headers=_h(mgmt_token), timeout=15).json()
+        before_week = requests.get(f"{BASE_URL}/api/analytics/daily-by-week", headers=_h(mgmt_token), timeout=15).json()
+        _rebuild(mgmt_token)
+        after_weekly = requests.get(f"{BASE_URL}/api/analytics/weekly", headers=_h(mgmt_token), timeout=15).json()
+        after_week = requests.get(f"{BASE_URL}/api/analytics/daily-by-week", headers=_h(mgmt_token), timeout=15).json()
+        assert before_weekly == after_weekly
+        assert before_week["daily_stats"] == after_week["daily_stats"]
+
+    def test_complete_job_updates_rollup(self, mgmt_token):
+        machines = requests.get(f"{BASE_URL}/api/machines", headers=_h(mgmt_token), timeout=15).json()
+        if not machines:
+            pytest.skip("Makine yok")
+        m = machines[0]
+        before = requests.get(f"{BASE_URL}/api/analytics/daily", headers=_h(mgmt_token), timeout=15).json()
+        before_today = before["daily_stats"][-1]["total_koli"]
+
+        job = requests.post(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), json={
+            "name": f"TEST_ROLLUP_{uuid.uuid4().hex[:6]}", "koli_count": 7, "colors": "-",
+            "machine_id": m["id"], "machine_name": m["name"],
+        }, timeout=15).json()
+        try:
+            r = requests.put(f"{BASE_URL}/api/jobs/{job['id']}/complete", headers=_h(mgmt_token),
+                             json={"completed_koli": 7}, timeout=15)
+            assert r.status_code == 200, r.text
+            after = requests.get(f"{BASE_URL}/api/analytics/daily", headers=_h(mgmt_token), timeout=15).json()
+            assert after["daily_stats"][-1]["total_koli"] == before_today + 7
+        finally:
+            requests.delete(f"{BASE_URL}/api/jobs/{job['id']}", headers=_h(mgmt_token), timeout=15)
+            _rebuild(mgmt_token)
+
+    def test_edit_and_delete_completed_job(self, mgmt_token):
+        before_today = _today_koli(mgmt_token)
+        job = _create_job(mgmt_token, 9)
+        try:
+            r = requests.put(f"{BASE_URL}/api/jobs/{job['id']}/complete", headers=_h(mgmt_token),
+                             json={"completed_koli": 9}, timeout=15)
+            assert r.status_code == 200, r.text
+            assert _today_koli(mgmt_token) == before_today + 9
+
+            r = requests.put(f"{BASE_URL}/api/jobs/{job['id']}", headers=_h(mgmt_token),
+                             json={"completed_koli": 4}, timeout=15)
+            assert r.status_code == 200, r.text
+            assert _today_koli(mgmt_token) == before_today + 4
+        finally:
+            requests.delete(f"{BASE_URL}/api/jobs/{job['id']}", headers=_h(mgmt_token), timeout=15)
+        assert _today_koli(mgmt_token) == before_today
+
+    def test_operator_breakdown_stable_after_rebuild(self, mgmt_token):
+        operator = f"TEST_OP_{uuid.uuid4().hex[:6]}"
+        job = _create_job(mgmt_token, 5)
+        try:
+            r = requests.put(f"{BASE_URL}/api/jobs/{job['id']}/start", headers=_h(mgmt_token),
+                             json={"operator_name": operator}, timeout=15)
+            if r.status_code != 200:
+                pytest.skip(f"İş başlatılamadı (makine meşgul?): {r.text}")
+            r = requests.put(f"{BASE_URL}/api/jobs/{job['id']}/complete", headers=_h(mgmt_token),
+                             json={"completed_koli": 5}, timeout=15)
+            assert r.status_code == 200, r.text
+
+            incremental = _ranking(mgmt_token)
+            assert incremental.get(operator) == (1, 5)
+            _rebuild(mgmt_token)
+            assert _ranking(mgmt_token) == incremental
+        finally:
+            requests.delete(f"{BASE_URL}/api/jobs/{job['id']}", headers=_h(mgmt_token), timeout=15)
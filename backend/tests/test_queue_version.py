@@ -0,0 +1,89 @@
+"""
+Toplu sıralama — tek bulk_write + makine başına kuyruk sürümü.
+
+Covers:
+- GET /api/jobs/queue-version?machine_id= güncel sürümü döner
+- PUT /api/jobs/reorder-batch expected_version ile başarılı → yeni sürüm, sıralar yazılır
+- Eski sürümle ikinci istek 409 + current_version, sıralar değişmez
+- expected_version'sız çağrı geriye dönük uyumlu (sürüm yine artar)
+- Bozuk öğe 400
+"""
+import os
+import uuid
+import pytest
+import requests
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="session")
+def mgmt_token():
+    r = requests.post(f"{BASE_URL}/api/management/login", json={"password": "buse11993"}, timeout=15)
+    if r.status_code != 200:
+        pytest.skip(f"Management login failed: {r.status_code} {r.text}")
+    return r.json().get("token")
+
+
+def _h(tok):
+    return {"Authorization": f"Bearer {tok}"}
+
+
+@pytest.fixture(scope="module")
+def queue(mgmt_token):
+    machine_id = f"TEST_QUEUE_{uuid.uuid4().hex[:6]}"
+    ids = []
+    for i in range(3):
+        r = requests.post(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), json={
+            "name": f"TEST_Q_{i}", "koli_count": 1, "colors": "Mavi",
+            "machine_id": machine_id, "machine_name": "Test",
+        }, timeout=15)
+        assert r.status_code == 200, r.text
+        ids.append(r.json()["id"])
+    yield machine_id, ids
+    for jid in ids:
+        requests.delete(f"{BASE_URL}/api/jobs/{jid}", headers=_h(mgmt_token), timeout=15)
+
+
+def _version(tok, machine_id):
+    r = requests.get(f"{BASE_URL}/api/jobs/queue-version", headers=_h(tok), params={"machine_id": machine_id}, timeout=15)
+    assert r.status_code == 200
+    return r.json()["version"]
+
+
+def _orders(tok, machine_id):
+    r = requests.get(f"{BASE_URL}/api/jobs", headers=_h(tok), params={"machine_id": machine_id}, timeout=15)
+    return {j["id"]: j["order"] for j in r.json()}
+
+
+class TestReorderBatch:
+    def test_reorder_with_version(self, mgmt_token, queue):
+        machine_id, ids = queue
+        v = _version(mgmt_token, machine_id)
+        payload = {"jobs": [{"job_id": j, "order": len(ids) - i} for i, j in enumerate(ids)], "expected_version": v}
+        r = requests.put(f"{BASE_URL}/api/jobs/reorder-batch", headers=_h(mgmt_token), json=payload, timeout=15)
+        assert r.status_code == 200, r.text
+        assert r.json()["version"] == v + 1
+        assert _orders(mgmt_token, machine_id) == {j: len(ids) - i for i, j in enumerate(ids)}
+
+    def test_stale_version_conflict(self, mgmt_token, queue):
+        machine_id, ids = queue
+        v = _version(mgmt_token, machine_id)
+        before = _orders(mgmt_token, machine_id)
+        r = requests.put(f"{BASE_URL}/api/jobs/reorder-batch", headers=_h(mgmt_token),
+                         json={"jobs": [{"job_id": ids[0], "order": 99}], "expected_version": v - 1}, timeout=15)
+        assert r.status_code == 409
+        assert r.json()["current_version"] == v
+        assert _orders(mgmt_token, machine_id) == before
+
+    def test_without_version_still_works(self, mgmt_token, queue):
+        machine_id, ids = queue
+        v = _version(mgmt_token, machine_id)
+        r = requests.put(f"{BASE_URL}/api/jobs/reorder-batch", headers=_h(mgmt_token),
+                         json={"jobs": [{"job_id": ids[0], "order": 0}]}, timeout=15)
+        assert r.status_code == 200
+        assert r.json()["versions"][machine_id] == v + 1
+
+    def test_bad_item(self, mgmt_token):
+        r = requests.put(f"{BASE_URL}/api/jobs/reorder-batch", headers=_h(mgmt_token),
+                         json={"jobs": [{"job_id": "x"}]}, timeout=15)
+        assert r.status_code == 400
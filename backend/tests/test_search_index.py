@@ -0,0 +1,106 @@
+"""
+Türkçe normalize önek araması — GET /api/jobs?search= ve /api/pallets/search.
+
+Covers:
+- normalize(): Türkçe casefold (I→ı, İ→i) + aksan temizliği (sunucusuz birim testi)
+- "isik" / "IŞIK" aynı işi bulur, önek yeterli ("pec" → "Peçete")
+- Çok kelimeli sorguda tüm kelimeler eşleşmeli
+- İsim güncellenince eski ad bulunmaz, yenisi bulunur; silinen iş sonuçtan çıkar
+- search + after → 400
+- search + status/machine_id filtreleri: eşleşen iş bulunur, filtre dışı kalan bulunmaz
+- Palet kodu öneki ile arama
+"""
+import os
+import sys
+import uuid
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="session")
+def mgmt_token():
+    r = requests.post(f"{BASE_URL}/api/management/login", json={"password": "buse11993"}, timeout=15)
+    if r.status_code != 200:
+        pytest.skip(f"Management login failed: {r.status_code} {r.text}")
+    return r.json().get("token")
+
+
+def _h(tok):
+    return {"Authorization": f"Bearer {tok}"}
+
+
+def test_normalize_turkish():
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "test_database")
+    from services.search_index import normalize, prefixes_for
+    assert normalize("IŞIK Çiğdem-İstanbul") == "isik cigdem istanbul"
+    assert normalize("ÖZEL şûra") == "ozel sura"
+    assert prefixes_for(["pec"]) == ["p", "pe", "pec"]
+
+
+@pytest.fixture(scope="module")
+def search_job(mgmt_token):
+    tag = uuid.uuid4().hex[:6]
+    r = requests.post(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), json={
+        "name": f"Işık Peçete Z{tag}", "koli_count": 1, "colors": "Kırmızı",
+        "machine_id": "test-machine", "machine_name": "Test",
+    }, timeout=15)
+    assert r.status_code == 200, r.text
+    job = r.json()
+    yield job, tag
+    requests.delete(f"{BASE_URL}/api/jobs/{job['id']}", headers=_h(mgmt_token), timeout=15)
+
+
+def _search(tok, q, **params):
+    r = requests.get(f"{BASE_URL}/api/jobs", headers=_h(tok), params={"search": q, **params}, timeout=15)
+    assert r.status_code == 200, r.text
+    return [j["id"] for j in r.json()]
+
+
+class TestJobSearch:
+    def test_casefold_and_prefix(self, mgmt_token, search_job):
+        job, tag = search_job
+        assert job["id"] in _search(mgmt_token, f"isik z{tag}")
+        assert job["id"] in _search(mgmt_token, f"IŞIK Z{tag}")
+        assert job["id"] in _search(mgmt_token, f"pec z{tag[:3]}")
+
+    def test_all_tokens_required(self, mgmt_token, search_job):
+        job, tag = search_job
+        assert job["id"] not in _search(mgmt_token, f"havlu z{tag}")
+
+    def test_rename_and_delete(self, mgmt_token, search_job):
+        job, tag = search_job
+        r = requests.put(f"{BASE_URL}/api/jobs/{job['id']}", headers=_h(mgmt_token),
+                         json={"name": f"Okyanus Havlu Z{tag}"}, timeout=15)
+        assert r.status_code == 200
+        assert job["id"] not in _search(mgmt_token, f"peçete z{tag}")
+        assert job["id"] in _search(mgmt_token, f"okyanus z{tag}")
+
+    def test_search_with_filters(self, mgmt_token, search_job):
+        job, tag = search_job
+        hit = _search(mgmt_token, f"z{tag}", status=job["status"], machine_id="test-machine")
+        assert job["id"] in hit
+        assert job["id"] not in _search(mgmt_token, f"z{tag}", status="completed")
+
+    def test_search_with_after_rejected(self, mgmt_token):
+        r = requests.get(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token),
+                         params={"search": "x", "after": "2026-01-01,abc"}, timeout=15)
+        assert r.status_code == 400
+
+
+class TestPalletSearch:
+    def test_code_prefix(self, mgmt_token):
+        code = f"TESTPLT{uuid.uuid4().hex[:8].upper()}"
+        r = requests.post(f"{BASE_URL}/api/pallets", headers=_h(mgmt_token), json={
+            "code": code, "job_name": "Test İş", "machine_id": "test-machine",
+            "machine_name": "Test", "koli_count": 1, "operator_name": "Test",
+        }, timeout=15)
+        assert r.status_code == 200, r.text
+        sr = requests.get(f"{BASE_URL}/api/pallets/search", headers=_h(mgmt_token),
+                          params={"q": code[:11].lower()}, timeout=15)
+        assert sr.status_code == 200
+        assert any(p.get("code") == code for p in sr.json())
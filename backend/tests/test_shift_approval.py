@@ -309,6 +309,32 @@ class TestPendingReportsDataStructure:
         else:
             print("⚠ Report not found in pending (may have been processed)")
 
+    def test_11_reapprove_is_idempotent(self):
+        """Onaylanmış raporu tekrar onaylamak etkileri ikinci kez uygulamaz"""
+        payload = {
+            "shift_id": self.test_shift_id,
+            "operator_id": self.test_operator_id,
+            "operator_name": "Reapprove Op",
+            "machine_id": self.test_machine_id,
+            "machine_name": "Reapprove Machine",
+            "job_id": f"TEST_JOB_{uuid.uuid4().hex[:8]}",
+            "job_name": "Reapprove Job",
+            "target_koli": 40,
+            "produced_koli": 10,
+            "defect_kg": 0,
+            "is_completed": False
+        }
+        report_id = self.session.post(f"{BASE_URL}/api/shifts/operator-report", json=payload).json()["report_id"]
+
+        first = self.session.post(f"{BASE_URL}/api/shifts/approve-report/{report_id}")
+        assert first.status_code == 200
+        assert first.json().get("message") == "Rapor onaylandı"
+
+        second = self.session.post(f"{BASE_URL}/api/shifts/approve-report/{report_id}")
+        assert second.status_code == 200
+        assert second.json().get("already_approved") is True
+        print("✓ Re-approval is a no-op")
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,97 @@
+"""
+Delta Senkronizasyon — GET /api/sync?since=<seq> (services/change_feed.py).
+
+Covers:
+- since=0 → reset: true ve güncel seq
+- Makine bakım durumu değişince since=<seq> yanıtında makine upserted olarak gelir
+- İş oluşturma → upserted, silme → deleted
+- Bilinmeyen koleksiyon → 400, token olmadan 401/403
+"""
+import os
+import pytest
+import requests
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="session")
+def mgmt_token():
+    r = requests.post(f"{BASE_URL}/api/management/login", json={"password": "buse11993"}, timeout=15)
+    if r.status_code != 200:
+        pytest.skip(f"Management login failed: {r.status_code} {r.text}")
+    return r.json().get("token")
+
+
+def _h(tok):
+    return {"Authorization": f"Bearer {tok}"}
+
+
+def _sync(tok, since, **params):
+    r = requests.get(f"{BASE_URL}/api/sync", params={"since": since, **params}, headers=_h(tok), timeout=15)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _drain(tok, since, **params):
+    """has_more bitene kadar sayfaları birleştir."""
+    upserted, deleted = {}, {}
+    while True:
+        body = _sync(tok, since, **params)
+        assert body["reset"] is False
+        for name, ch in body["changes"].items():
+            upserted.setdefault(name, []).extend(ch["upserted"])
+            deleted.setdefault(name, []).extend(ch["deleted"])
+        since = body["seq"]
+        if not body["has_more"]:
+            return since, upserted, deleted
+
+
+class TestSync:
+    def test_01_reset(self, mgmt_token):
+        body = _sync(mgmt_token, 0)
+        assert body["reset"] is True
+        assert isinstance(body["seq"], int)
+        assert body["changes"] == {}
+
+    def test_02_machine_change(self, mgmt_token):
+        machines = requests.get(f"{BASE_URL}/api/machines", headers=_h(mgmt_token), timeout=15).json()
+        if not machines:
+            pytest.skip("Makine yok")
+        machine = machines[0]
+        seq = _sync(mgmt_token, 0)["seq"]
+        r = requests.put(f"{BASE_URL}/api/machines/{machine['id']}/maintenance", headers=_h(mgmt_token),
+                         json={"maintenance": bool(machine.get("maintenance"))}, timeout=15)
+        assert r.status_code == 200, r.text
+        if seq == 0:
+            pytest.skip("Günlük boştu — since=0 her zaman reset")
+        _, upserted, _ = _drain(mgmt_token, seq, collections="machines")
+        assert machine["id"] in {m["id"] for m in upserted.get("machines", [])}
+
+    def test_03_job_create_delete(self, mgmt_token):
+        machines = requests.get(f"{BASE_URL}/api/machines", headers=_h(mgmt_token), timeout=15).json()
+        if not machines:
+            pytest.skip("Makine yok")
+        seq = _sync(mgmt_token, 0)["seq"]
+        job = requests.post(f"{BASE_URL}/api/jobs", headers=_h(mgmt_token), json={
+            "name": "TEST_SYNC", "koli_count": 1, "colors": "-",
+            "machine_id": machines[0]["id"], "machine_name": machines[0]["name"],
+        }, timeout=15)
+        assert job.status_code == 200, job.text
+        job_id = job.json()["id"]
+        if seq == 0:
+            seq = _sync(mgmt_token, 0)["seq"] - 1
+        seq, upserted, _ = _drain(mgmt_token, seq, collections="jobs")
+        assert job_id in {j["id"] for j in upserted.get("jobs", [])}
+        assert all("image_url" not in j for j in upserted["jobs"])
+
+        r = requests.delete(f"{BASE_URL}/api/jobs/{job_id}", headers=_h(mgmt_token), timeout=15)
+        assert r.status_code == 200, r.text
+        _, _, deleted = _drain(mgmt_token, seq, collections="jobs")
+        assert job_id in deleted.get("jobs", [])
+
+    def test_04_validation(self, mgmt_token):
+        r = requests.get(f"{BASE_URL}/api/sync", params={"since": 1, "collections": "users"},
+                         headers=_h(mgmt_token), timeout=15)
+        assert r.status_code == 400
+        r = requests.get(f"{BASE_URL}/api/sync", params={"since": 1}, timeout=15)
+        assert r.status_code in (401, 403)
@@ -1,63 +1,256 @@
 from fastapi import WebSocket
-from typing import List
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set
+import asyncio
+import json
 import logging
+import os
+
+from services.broadcast_bus import get_bus
+
+# Bus kanalları — her worker aynı kanallara abone olur (bkz. services/broadcast_bus.py)
+CHANNEL_ALL = "ws:all"
+CHANNEL_MANAGERS = "ws:managers"
+
+# Konu (topic) adları — istemci bağlanırken abone olur, yayın sadece ilgili konuya gider
+ROLE_OPERATOR = "role:operator"
+ROLE_WAREHOUSE = "role:warehouse"
+ROLE_DASHBOARD = "role:dashboard"
+
+# Gönderim kuyruğu ayarları — yavaş bir tablet diğer istemcileri ve HTTP isteğini bekletmez
+SEND_QUEUE_SIZE = int(os.environ.get("WS_SEND_QUEUE_SIZE", "100"))
+SEND_TIMEOUT_SECONDS = float(os.environ.get("WS_SEND_TIMEOUT_SECONDS", "5"))
+MAX_DROPPED_FRAMES = int(os.environ.get("WS_MAX_DROPPED_FRAMES", "50"))
+# 1013 = Try Again Later — istemci mevcut yeniden bağlanma mantığıyla geri gelir
+EVICT_CLOSE_CODE = 1013
+
+
+def machine_topic(machine_id: str) -> str:
+    """Makine tabletlerinin abone olduğu konu."""
+    return f"machine:{machine_id}"
+
+
+def encode_frame(message: dict) -> str:
+    """Mesajı bir kez serialize et (starlette send_json ile aynı format)."""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class ClientConnection:
+    """Tek bir WebSocket için sınırlı gönderim kuyruğu + yazıcı task.
+
+    Politikalar:
+      - coalesce: aynı coalesce_key ile bekleyen kare varsa yerinde güncellenir
+        (ör. pano özetleri — sadece en son durum önemli)
+      - drop-oldest: kuyruk doluysa en eski kare atılır
+      - eviction: kuyruk boşalmadan (tek bir gecikme süresince) MAX_DROPPED_FRAMES kare
+        atılırsa veya bir gönderim SEND_TIMEOUT_SECONDS'u aşarsa bağlantı kapatılır.
+        Kuyruk başarıyla boşalınca sayaç sıfırlanır — ara sıra yavaşlayan uzun ömürlü
+        tabletler zamanla birikerek atılmaz (toplam: dropped_total).
+    """
+
+    def __init__(self, websocket: WebSocket, label: str = ""):
+        self.websocket = websocket
+        self.label = label
+        self.pending: deque = deque()
+        self.dropped = 0  # son boşalmadan beri
+        self.dropped_total = 0
+        self.closed = False
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._close_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._writer())
+
+    def offer(self, frame: str, coalesce_key: Optional[str] = None) -> bool:
+        """Kareyi kuyruğa koy; beklemeden döner. Bağlantı düşürüldüyse False."""
+        if self.closed:
+            return False
+        if coalesce_key is not None:
+            for i, (key, _) in enumerate(self.pending):
+                if key == coalesce_key:
+                    self.pending[i] = (coalesce_key, frame)
+                    return True
+        if len(self.pending) >= SEND_QUEUE_SIZE:
+            self.pending.popleft()
+            self.dropped += 1
+            self.dropped_total += 1
+            if self.dropped >= MAX_DROPPED_FRAMES:
+                self.evict(f"{self.dropped} kare düşürüldü")
+                return False
+        self.pending.append((coalesce_key, frame))
+        self._wakeup.set()
+        return True
+
+    async def _writer(self):
+        try:
+            while not self.closed:
+                if not self.pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                _, frame = self.pending.popleft()
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(frame), SEND_TIMEOUT_SECONDS)
+                    if not self.pending:
+                        self.dropped = 0  # yetişti
+                except asyncio.TimeoutError:
+                    self.evict("gönderim zaman aşımı")
+                except Exception as e:
+                    logging.error(f"WebSocket send error: {e}")
+                    self.closed = True
+        except asyncio.CancelledError:
+            pass
+
+    def evict(self, reason: str):
+        """Yavaş tüketiciyi kapat — receive döngüsü disconnect'i tetikler."""
+        if self.closed:
+            return
+        self.closed = True
+        self.pending.clear()
+        self._wakeup.set()
+        logging.warning(f"Slow WebSocket consumer evicted ({self.label}): {reason}")
+        self._close_task = asyncio.create_task(self._close())
+
+    async def _close(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=EVICT_CLOSE_CODE), SEND_TIMEOUT_SECONDS)
+        except Exception:
+            pass
+
+    def stop(self):
+        self.closed = True
+        self._wakeup.set()
+        if self._task and not self._task.done():
+            self._task.cancel()
 
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.topics: Dict[str, Set[WebSocket]] = {}
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, topics: Iterable[str] = ()):
         await websocket.accept()
+        topics = list(topics)
+        client = ClientConnection(websocket, label=",".join(topics))
+        client.start()
+        self.clients[websocket] = client
         self.active_connections.append(websocket)
+        for topic in topics:
+            self.topics.setdefault(topic, set()).add(websocket)
         logging.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        client = self.clients.pop(websocket, None)
+        if client:
+            client.stop()
+        for topic in [t for t, conns in self.topics.items() if websocket in conns]:
+            self.topics[topic].discard(websocket)
+            if not self.topics[topic]:
+                del self.topics[topic]
         logging.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
 
-    async def broadcast(self, message: dict):
-        """Tüm bağlı istemcilere mesaj gönder"""
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logging.error(f"WebSocket send error: {e}")
-                disconnected.append(connection)
-        for conn in disconnected:
-            self.disconnect(conn)
+    def send_text(self, websocket: WebSocket, text: str):
+        """Tek bir istemciye (ör. pong) yazıcı kuyruğu üzerinden gönder."""
+        client = self.clients.get(websocket)
+        if client:
+            client.offer(text)
+
+    async def broadcast(self, message: dict, topics: Optional[Iterable[str]] = None,
+                        coalesce_key: Optional[str] = None):
+        """Mesajı tüm worker'lardaki istemcilere gönder (bus üzerinden).
+
+        topics verilirse sadece o konulara abone bağlantılar alır
+        (ör. [machine_topic(machine_id)]); None ise herkese gider.
+        coalesce_key verilirse istemcinin kuyruğunda bekleyen aynı anahtarlı kare
+        yenisiyle değiştirilir.
+        """
+        await get_bus().publish(CHANNEL_ALL, {
+            "topics": list(topics) if topics is not None else None,
+            "coalesce_key": coalesce_key,
+            "message": message,
+        })
+
+    def _targets(self, topics: Optional[List[str]]) -> List[WebSocket]:
+        if topics is None:
+            return list(self.active_connections)
+        targets: Set[WebSocket] = set()
+        for topic in topics:
+            targets |= self.topics.get(topic, set())
+        return list(targets)
+
+    async def broadcast_local(self, event: dict):
+        """Bu worker'daki hedef istemcilerin kuyruklarına kareyi koy (bus handler'ı).
+
+        Kare bir kez serialize edilir; gönderimi her istemcinin yazıcı task'ı yapar,
+        bu yüzden süre en yavaş istemciden bağımsızdır.
+        """
+        targets = self._targets(event.get("topics"))
+        if not targets:
+            return
+        frame = encode_frame(event.get("message", {}))
+        coalesce_key = event.get("coalesce_key")
+        for connection in targets:
+            client = self.clients.get(connection)
+            if client:
+                client.offer(frame, coalesce_key)
 
 
 class ManagerConnectionManager:
     def __init__(self):
         self.active_connections: dict = {}
+        self.clients: Dict[str, ClientConnection] = {}
 
     async def connect(self, websocket: WebSocket, manager_id: str):
         await websocket.accept()
+        old = self.clients.pop(manager_id, None)
+        if old:
+            old.stop()
+        client = ClientConnection(websocket, label=f"manager:{manager_id}")
+        client.start()
+        self.clients[manager_id] = client
         self.active_connections[manager_id] = websocket
         logging.info(f"Manager WebSocket connected: {manager_id}. Total: {len(self.active_connections)}")
 
     def disconnect(self, manager_id: str):
         if manager_id in self.active_connections:
             del self.active_connections[manager_id]
+        client = self.clients.pop(manager_id, None)
+        if client:
+            client.stop()
         logging.info(f"Manager WebSocket disconnected: {manager_id}. Total: {len(self.active_connections)}")
 
-    async def broadcast_to_managers(self, message: dict):
-        """Tüm yöneticilere mesaj gönder"""
-        disconnected = []
-        for manager_id, connection in self.active_connections.items():
-            try:
-                await connection.send_json(message)
-                logging.info(f"Notification sent to manager: {manager_id}")
-            except Exception as e:
-                logging.error(f"Manager WebSocket send error: {e}")
-                disconnected.append(manager_id)
-        for mgr_id in disconnected:
-            self.disconnect(mgr_id)
+    def send_text(self, manager_id: str, text: str):
+        client = self.clients.get(manager_id)
+        if client:
+            client.offer(text)
+
+    async def broadcast_to_managers(self, message: dict, coalesce_key: Optional[str] = None):
+        """Tüm worker'lardaki yöneticilere mesaj gönder (bus üzerinden)"""
+        await get_bus().publish(CHANNEL_MANAGERS, {"coalesce_key": coalesce_key, "message": message})
+
+    async def broadcast_local(self, event: dict):
+        """Bu worker'a bağlı yöneticilerin kuyruklarına kareyi koy (bus handler'ı)"""
+        if not self.clients:
+            return
+        frame = encode_frame(event.get("message", {}))
+        coalesce_key = event.get("coalesce_key")
+        for client in list(self.clients.values()):
+            client.offer(frame, coalesce_key)
 
 
 # Singleton instances
 ws_manager = ConnectionManager()
 ws_manager_mgmt = ManagerConnectionManager()
+
+
+def attach_bus(bus=None):
+    """Yerel bağlantı yöneticilerini bus kanallarına abone et (startup'ta, bus.start() öncesi)."""
+    bus = bus or get_bus()
+    bus.subscribe(CHANNEL_ALL, ws_manager.broadcast_local)
+    bus.subscribe(CHANNEL_MANAGERS, ws_manager_mgmt.broadcast_local)
+    return bus
@@ -21,6 +21,14 @@ mongodump --uri="mongodb://localhost:27017" --db="$DB_NAME" --gzip --archive="$O
 SIZE=$(du -h "$OUT" | cut -f1)
 echo "[$(date '+%Y-%m-%d %H:%M:%S')] ✓ Yedek alındı: $OUT ($SIZE)"
 
+# Görseller (içerik adresli, değişmez) MongoDB dump'ına girmez — aynaya artımlı kopyala
+IMAGE_STORE_DIR="${IMAGE_STORE_DIR:-$APP_DIR/backend/image_store}"
+if [ -d "$IMAGE_STORE_DIR" ]; then
+    mkdir -p "$BACKUP_DIR/image_store"
+    rsync -a --exclude 'tmp/' --exclude 'thumbs/' "$IMAGE_STORE_DIR/" "$BACKUP_DIR/image_store/"
+    echo "[$(date '+%Y-%m-%d %H:%M:%S')] ✓ Görsel deposu kopyalandı: $BACKUP_DIR/image_store"
+fi
+
 # Eski yedekleri temizle
 DELETED=$(find "$BACKUP_DIR" -name 'backup_*.archive.gz' -mtime +$RETENTION_DAYS -print -delete | wc -l)
 if [ "$DELETED" -gt 0 ]; then
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { motion } from "framer-motion";
 import { Monitor, Activity, Package, Users, Clock, Wrench, ChevronUp, Lock } from "lucide-react";
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from "recharts";
@@ -10,6 +10,17 @@ const _isCanonical = typeof window !== "undefined" &&
 const BACKEND_URL = _isCanonical ? window.location.origin : process.env.REACT_APP_BACKEND_URL;
 const DASHBOARD_API = `${BACKEND_URL}/api`;
 
+// Sunucudan gelen dashboard_diff'i mevcut veriye uygula (services/dashboard_snapshot.py)
+const applyDashboardDiff = (prev, changes) => {
+  const { machines_patch: patch, ...rest } = changes;
+  const next = { ...prev, ...rest };
+  if (patch) {
+    next.machines = [...(next.machines || [])];
+    Object.entries(patch).forEach(([index, machine]) => { next.machines[Number(index)] = machine; });
+  }
+  return next;
+};
+
 const LiveDashboard = () => {
   const [data, setData] = useState(null);
   const [clock, setClock] = useState(new Date());
@@ -26,14 +37,62 @@ const LiveDashboard = () => {
     }
   }, []);
 
+  const wsOpenRef = useRef(false);
+  const versionRef = useRef(0);
+
   useEffect(() => {
     if (!authenticated) return;
     fetchData();
-    const dataInterval = setInterval(fetchData, 15000);
+    // WebSocket açıkken veri push ile gelir; polling sadece bağlantı yokken yedek
+    const dataInterval = setInterval(() => { if (!wsOpenRef.current) fetchData(); }, 15000);
     const clockInterval = setInterval(() => setClock(new Date()), 1000);
     return () => { clearInterval(dataInterval); clearInterval(clockInterval); };
   }, [authenticated]);
 
+  useEffect(() => {
+    if (!authenticated) return;
+    const token = sessionStorage.getItem("dashboard_token");
+    const wsBase = DASHBOARD_API.replace(/^http/, "ws");
+    let ws;
+    let reconnectTimer;
+    let closed = false;
+
+    const connect = () => {
+      ws = new WebSocket(`${wsBase}/ws/dashboard?token=${encodeURIComponent(token || "")}`);
+      ws.onopen = () => { wsOpenRef.current = true; };
+      ws.onmessage = (event) => {
+        let msg;
+        try { msg = JSON.parse(event.data); } catch { return; }
+        if (msg.type === "dashboard_snapshot") {
+          versionRef.current = msg.version;
+          setData(msg.data);
+        } else if (msg.type === "dashboard_diff") {
+          if (msg.version <= versionRef.current) return;
+          if (msg.base !== versionRef.current) {
+            // Arada kare kaçtı — tam snapshot iste
+            ws.send("snapshot");
+            return;
+          }
+          versionRef.current = msg.version;
+          setData((prev) => (prev ? applyDashboardDiff(prev, msg.changes) : prev));
+        }
+      };
+      ws.onclose = () => {
+        wsOpenRef.current = false;
+        if (!closed) reconnectTimer = setTimeout(connect, 5000);
+      };
+    };
+    connect();
+    const pingInterval = setInterval(() => { if (ws?.readyState === WebSocket.OPEN) ws.send("ping"); }, 30000);
+    return () => {
+      closed = true;
+      wsOpenRef.current = false;
+      clearTimeout(reconnectTimer);
+      clearInterval(pingInterval);
+      ws?.close();
+    };
+  }, [authenticated]);
+
   const fetchData = async () => {
     try {
       const token = sessionStorage.getItem("dashboard_token");
@@ -69,6 +69,8 @@ const OperatorFlow = ({ theme, toggleTheme }) => {
   const [sendingReply, setSendingReply] = useState(false);
   const messagesEndRef = useRef(null);
   const prevMessagesLengthRef = useRef(0);
+  // Kayıtlı web FCM token'ı — state: token makine seçiminden sonra gelse de bağlama effect'i yeniden çalışır
+  const [fcmRegistration, setFcmRegistration] = useState(null);
   
   // Sürükle-bırak state'leri
   const [draggedJob, setDraggedJob] = useState(null);
@@ -321,8 +323,10 @@ const OperatorFlow = ({ theme, toggleTheme }) => {
                   token: fcmToken,
                   user_type: "operator",
                   user_id: session.id,
+                  ...(session.machine_id ? { machine_id: session.machine_id } : {}),
                   platform: "web"
                 });
+                setFcmRegistration({ token: fcmToken, userId: session.id });
               }
             }
           } catch (pushError) {
@@ -401,6 +405,18 @@ const OperatorFlow = ({ theme, toggleTheme }) => {
   // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [selectedMachine]);
 
+  // Bildirimler sadece seçili makinenin operatör cihazlarına gitsin
+  useEffect(() => {
+    if (!selectedMachine?.id || !fcmRegistration) return;
+    axios.post(`${API}/notifications/register-token`, {
+      token: fcmRegistration.token,
+      user_type: "operator",
+      user_id: fcmRegistration.userId,
+      machine_id: selectedMachine.id,
+      platform: "web"
+    }).catch((e) => console.error("FCM machine binding error:", e));
+  }, [selectedMachine?.id, fcmRegistration]);
+
   // QR kodla iş başlatma
   useEffect(() => {
     if (!qrStartJobId || !userData || !jobs.length) return;
@@ -736,6 +752,7 @@ const OperatorFlow = ({ theme, toggleTheme }) => {
             user_type: "operator",
             user_id: user.id
           });
+          setFcmRegistration({ token: fcmToken, userId: user.id });
           console.log("Operator FCM token registered");
         }
       } catch (fcmError) {